@@ -78,6 +78,91 @@ CREATE TABLE IF NOT EXISTS analytics.user_activity_daily (
 PARTITION BY toYYYYMM(date)
 ORDER BY (date, user_id);
 
+-- Mergeable daily states (sums, sum+count pairs, uniqCombined sketches):
+-- any date range merges without rescanning raw events
+CREATE TABLE IF NOT EXISTS analytics.content_daily_states (
+    date           Date,
+    content_id     UInt32,
+    content_type   LowCardinality(String),
+    views_count    SimpleAggregateFunction(sum, UInt64),
+    reviews_count  SimpleAggregateFunction(sum, UInt64),
+    rating_sum     SimpleAggregateFunction(sum, Float64),
+    rating_count   SimpleAggregateFunction(sum, UInt64),
+    unique_users   AggregateFunction(uniqCombined, Nullable(UInt32))
+) ENGINE = AggregatingMergeTree()
+PARTITION BY toYYYYMM(date)
+ORDER BY (date, content_id, content_type);
+
+CREATE TABLE IF NOT EXISTS analytics.user_activity_daily_states (
+    date           Date,
+    user_id        UInt32,
+    reviews_count  SimpleAggregateFunction(sum, UInt64),
+    logins_count   SimpleAggregateFunction(sum, UInt64),
+    views_count    SimpleAggregateFunction(sum, UInt64),
+    rating_sum     SimpleAggregateFunction(sum, Float64),
+    rating_count   SimpleAggregateFunction(sum, UInt64),
+    unique_content AggregateFunction(uniqCombined, Nullable(UInt32))
+) ENGINE = AggregatingMergeTree()
+PARTITION BY toYYYYMM(date)
+ORDER BY (date, user_id);
+
+-- Stream rollup inputs: each row (one window and user / content) is folded
+-- into the daily states by a materialized view; the Null tables keep nothing
+CREATE TABLE IF NOT EXISTS analytics.content_daily_states_input (
+    date           Date,
+    content_id     UInt32,
+    content_type   LowCardinality(String),
+    user_id        Nullable(UInt32),
+    views_count    UInt64,
+    reviews_count  UInt64,
+    rating_sum     Float64,
+    rating_count   UInt64
+) ENGINE = Null;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS analytics.content_daily_states_mv
+TO analytics.content_daily_states AS
+SELECT
+    date, content_id, content_type,
+    sum(views_count) as views_count,
+    sum(reviews_count) as reviews_count,
+    sum(rating_sum) as rating_sum,
+    sum(rating_count) as rating_count,
+    uniqCombinedState(user_id) as unique_users
+FROM analytics.content_daily_states_input
+GROUP BY date, content_id, content_type;
+
+CREATE TABLE IF NOT EXISTS analytics.user_activity_daily_states_input (
+    date           Date,
+    user_id        UInt32,
+    content_id     Nullable(UInt32),
+    reviews_count  UInt64,
+    logins_count   UInt64,
+    views_count    UInt64,
+    rating_sum     Float64,
+    rating_count   UInt64
+) ENGINE = Null;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS analytics.user_activity_daily_states_mv
+TO analytics.user_activity_daily_states AS
+SELECT
+    date, user_id,
+    sum(reviews_count) as reviews_count,
+    sum(logins_count) as logins_count,
+    sum(views_count) as views_count,
+    sum(rating_sum) as rating_sum,
+    sum(rating_count) as rating_count,
+    uniqCombinedState(content_id) as unique_content
+FROM analytics.user_activity_daily_states_input
+GROUP BY date, user_id;
+
+-- Progress of the incremental batch jobs (end of the last aggregated range)
+CREATE TABLE IF NOT EXISTS analytics.batch_watermarks (
+    job            LowCardinality(String),
+    watermark      DateTime,
+    updated_at     DateTime DEFAULT now()
+) ENGINE = ReplacingMergeTree(watermark)
+ORDER BY job;
+
 -- Content popularity (trending)
 CREATE TABLE IF NOT EXISTS analytics.content_popularity (
     date           Date,
@@ -86,7 +171,9 @@ CREATE TABLE IF NOT EXISTS analytics.content_popularity (
     popularity_score Float64,
     views_7d       UInt64,
     reviews_7d     UInt64,
-    avg_rating_7d  Float64
+    avg_rating_7d  Float64,
+    rating_sum_7d  Float64 DEFAULT 0,
+    rating_count_7d UInt64 DEFAULT 0
 ) ENGINE = ReplacingMergeTree()
 PARTITION BY toYYYYMM(date)
 ORDER BY (date, content_id);
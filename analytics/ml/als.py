@@ -0,0 +1,150 @@
+import numpy as np
+from scipy import sparse
+
+from scoring import SCORE_DECIMALS, TOP_N, USER_BLOCK_SIZE, top_k
+
+# Implicit-feedback ALS defaults
+ALS_FACTORS = 64
+ALS_ITERATIONS = 15
+ALS_REGULARIZATION = 0.1
+# Confidence of a review: 1 + ALS_CONFIDENCE * rating / max rating
+ALS_CONFIDENCE = 20.0
+# Conjugate gradient steps per factor update (warm-started from the last iteration)
+ALS_CG_STEPS = 3
+
+
+class ALSModel:
+    """User and item factor matrices (float32) of an implicit-feedback factorization.
+
+    The predicted preference of user u for item i is user_factors[u] @
+    item_factors[i], roughly in [0, 1] (1 = would rate it).
+    """
+
+    def __init__(self, user_factors, item_factors):
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+
+    @property
+    def factors(self):
+        return self.item_factors.shape[1]
+
+    @property
+    def nbytes(self):
+        return self.user_factors.nbytes + self.item_factors.nbytes
+
+
+def _confidence(ratings, rated, confidence):
+    """CSR with c - 1 per review, c = 1 + confidence * rating / max rating.
+
+    Built on `rated` so 0-star reviews stay (weak) positives; both matrices
+    come from build_rating_matrix() and share their sparsity structure.
+    """
+    weights = rated.astype(np.float32)
+    values = ratings.data.astype(np.float32)
+    scale = values.max() if len(values) and values.max() > 0 else 1.0
+    weights.data = confidence * values / scale
+    return weights
+
+
+def _cg_update(weights, X, Y, regularization, steps):
+    """Conjugate gradient steps on X for fixed Y, all rows at once.
+
+    Solves (Y'Y + Y' diag(c_u - 1) Y + reg I) x_u = Y' c_u p_u for every row
+    u of `weights` (c - 1 per nonzero) with sparse products only, never
+    forming the per-user factors x factors systems.
+    """
+    rows = np.repeat(np.arange(weights.shape[0]), np.diff(weights.indptr))
+    cols = weights.indices
+    gram = Y.T @ Y + regularization * np.eye(Y.shape[1], dtype=np.float32)
+
+    def matvec(V):
+        dots = np.einsum('ij,ij->i', V[rows], Y[cols]) * weights.data
+        return V @ gram + sparse.csr_matrix((dots, cols, weights.indptr), shape=weights.shape) @ Y
+
+    # p_u is 1 on every review, so Y' c_u p_u = sum over reviews of c * y
+    b = sparse.csr_matrix((weights.data + 1, cols, weights.indptr), shape=weights.shape) @ Y
+    r = b - matvec(X)
+    p = r.copy()
+    rs_old = np.einsum('ij,ij->i', r, r)
+    for _ in range(steps):
+        Ap = matvec(p)
+        denom = np.einsum('ij,ij->i', p, Ap)
+        step = np.divide(rs_old, denom, out=np.zeros_like(rs_old), where=denom > 0)
+        X += step[:, None] * p
+        r -= step[:, None] * Ap
+        rs_new = np.einsum('ij,ij->i', r, r)
+        beta = np.divide(rs_new, rs_old, out=np.zeros_like(rs_new), where=rs_old > 0)
+        p = r + beta[:, None] * p
+        rs_old = rs_new
+    return X
+
+
+def fit_als(ratings, rated, factors=ALS_FACTORS, iterations=ALS_ITERATIONS, regularization=ALS_REGULARIZATION,
+            confidence=ALS_CONFIDENCE, cg_steps=ALS_CG_STEPS, seed=0):
+    """Fits implicit ALS on the users x items `ratings`/`rated` CSR (build_rating_matrix()).
+
+    Every review is a positive preference weighted by its rating; items a
+    user did not review are weak negatives. Memory is O((users + items) *
+    factors) plus the sparse matrix, independent of item co-occurrence.
+    """
+    weights = _confidence(ratings, rated, confidence)
+    weights_t = weights.T.tocsr()
+    rng = np.random.default_rng(seed)
+    n_users, n_items = weights.shape
+    user_factors = (rng.standard_normal((n_users, factors)) * 0.01).astype(np.float32)
+    item_factors = (rng.standard_normal((n_items, factors)) * 0.01).astype(np.float32)
+
+    for _ in range(iterations):
+        user_factors = _cg_update(weights, user_factors, item_factors, regularization, cg_steps)
+        item_factors = _cg_update(weights_t, item_factors, user_factors, regularization, cg_steps)
+    return ALSModel(user_factors, item_factors)
+
+
+def score_users_als(model, ratings, rated, content_sim=None, alpha=1.0,
+                    k=TOP_N, block_size=USER_BLOCK_SIZE):
+    """Top-k items per user from ALS preferences blended with content-based scores.
+
+    score = max_rating * (alpha * clip(u @ V', 0, 1) + (1 - alpha) * content / max_rating)
+    where `content` is the content-only prediction of score_users()
+    (weighted average rating over similar rated items). `content_sim` is
+    an items x items matrix, already masked at the floor: a NeighborLists
+    CSR or a dense symmetric similarity. Each user block is one dense
+    factor product; rated items are excluded.
+
+    Returns (user_rows, item_indices, scores) like score_users().
+    """
+    max_rating = float(ratings.data.max()) if ratings.nnz and ratings.data.max() > 0 else 1.0
+    item_factors_t = np.ascontiguousarray(model.item_factors.T)
+
+    out_users, out_items, out_scores = [], [], []
+    n_users = ratings.shape[0]
+
+    for start in range(0, n_users, block_size):
+        stop = min(start + block_size, n_users)
+        preference = model.user_factors[start:stop] @ item_factors_t
+        np.clip(preference, 0, 1, out=preference)
+        scores = alpha * max_rating * preference.astype(np.float64)
+
+        if content_sim is not None and alpha < 1:
+            weighted = ratings[start:stop] @ content_sim
+            sim_sum = rated[start:stop] @ content_sim
+            weighted = weighted.toarray() if sparse.issparse(weighted) else np.asarray(weighted)
+            sim_sum = sim_sum.toarray() if sparse.issparse(sim_sum) else np.asarray(sim_sum)
+            content = np.zeros(weighted.shape)
+            np.divide(weighted, sim_sum, out=content, where=sim_sum > 0)
+            scores += (1 - alpha) * content
+
+        np.round(scores, SCORE_DECIMALS, out=scores)
+        scores[rated[start:stop].nonzero()] = -np.inf
+
+        for offset, row in enumerate(scores):
+            idx = top_k(row, k)
+            out_users.append(np.full(len(idx), start + offset, dtype=np.int64))
+            out_items.append(idx)
+            out_scores.append(row[idx])
+
+    if not out_users:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0)
+
+    return np.concatenate(out_users), np.concatenate(out_items), np.concatenate(out_scores)
@@ -0,0 +1,184 @@
+"""Content-addressed on-disk cache for recommender artifacts (.npz).
+
+Each artifact is stored as `<name>-<key>.npz`, where the key hashes
+everything the artifact was built from (input rows, feature configuration,
+hybrid weights, ...). A hit loads the arrays back in milliseconds; a changed
+input or config simply produces a new key. Least recently used files are
+evicted once the directory grows past `max_bytes`.
+
+    python artifacts.py inspect
+    python artifacts.py clear
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+# Total size the cache directory may grow to before old artifacts are evicted
+ARTIFACT_CACHE_MAX_BYTES = 1024 * 1024 ** 2
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.recs-cache')
+
+_CONFIG_ARRAY = '_config'
+
+
+def frame_fingerprint(df, columns):
+    """Stable hash of the values of `columns` in `df` (row order included)."""
+    h = hashlib.sha1(f"{len(df)}:{','.join(columns)}".encode())
+    if len(df):
+        h.update(pd.util.hash_pandas_object(df[columns], index=False).to_numpy())
+    return h.hexdigest()
+
+
+def cache_key(**parts):
+    """Key of an artifact built from `parts` (fingerprints, config values)."""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:20]
+
+
+class ArtifactCache:
+    """Directory of `<name>-<key>.npz` files with size-based LRU eviction.
+
+    `directory=None` disables the cache: every lookup misses and nothing is
+    written. Usage:
+
+        cache = ArtifactCache(path)
+        arrays = cache.get_or_build('features', key, lambda: {'features': build()})
+    """
+
+    def __init__(self, directory, max_bytes=ARTIFACT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @property
+    def enabled(self):
+        return self.directory is not None
+
+    def _path(self, name, key):
+        return os.path.join(self.directory, f"{name}-{key}.npz")
+
+    def load(self, name, key):
+        """{array name: ndarray} of a cached artifact, or None on a miss."""
+        if not self.enabled:
+            return None
+        path = self._path(name, key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                arrays = {k: data[k] for k in data.files if k != _CONFIG_ARRAY}
+        except (OSError, ValueError):
+            return None
+        os.utime(path)  # mark as recently used for eviction
+        return arrays
+
+    def save(self, name, key, arrays, config=None):
+        """Stores `arrays` atomically, then evicts down to max_bytes.
+
+        Artifacts larger than the whole cache are not stored at all.
+        """
+        if not self.enabled:
+            return
+        if sum(np.asarray(a).nbytes for a in arrays.values()) > self.max_bytes:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(name, key)
+        tmp = path + '.tmp'
+        extra = {_CONFIG_ARRAY: np.array(json.dumps(config or {}, sort_keys=True, default=str))}
+        with open(tmp, 'wb') as f:
+            np.savez(f, **arrays, **extra)
+        os.replace(tmp, path)
+        self.evict(keep=path)
+
+    def get_or_build(self, name, key, build, config=None):
+        """Cached arrays of `name`/`key`, or build() them and cache the result."""
+        arrays = self.load(name, key)
+        if arrays is not None:
+            print(f"📦 Loaded {name} from cache ({key})")
+            return arrays
+        arrays = build()
+        self.save(name, key, arrays, config)
+        return arrays
+
+    def entries(self):
+        """Cached artifacts, most recently used first."""
+        if not self.enabled or not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.npz'):
+                continue
+            path = os.path.join(self.directory, filename)
+            name, _, key = filename[:-len('.npz')].rpartition('-')
+            stat = os.stat(path)
+            entries.append({
+                'name': name,
+                'key': key,
+                'path': path,
+                'bytes': stat.st_size,
+                'last_used': stat.st_mtime,
+            })
+        return sorted(entries, key=lambda e: e['last_used'], reverse=True)
+
+    def evict(self, keep=None):
+        """Removes least recently used artifacts until the total fits max_bytes."""
+        entries = self.entries()
+        total = sum(e['bytes'] for e in entries)
+        for entry in reversed(entries):
+            if total <= self.max_bytes:
+                break
+            if entry['path'] == keep:
+                continue
+            os.remove(entry['path'])
+            total -= entry['bytes']
+
+    def clear(self):
+        for entry in self.entries():
+            os.remove(entry['path'])
+
+    def config(self, entry):
+        """The config an entry was stored with ({} if unknown)."""
+        try:
+            with np.load(entry['path'], allow_pickle=False) as data:
+                return json.loads(str(data[_CONFIG_ARRAY])) if _CONFIG_ARRAY in data.files else {}
+        except (OSError, ValueError):
+            return {}
+
+
+def _format_mb(n):
+    return f"{n / 1024 ** 2:.1f} MB"
+
+
+def inspect_cache(cache):
+    entries = cache.entries()
+    total = sum(e['bytes'] for e in entries)
+    print(f"Artifact cache {cache.directory}: {len(entries)} files, "
+          f"{_format_mb(total)} of {_format_mb(cache.max_bytes)}")
+    for entry in entries:
+        used = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry['last_used']))
+        print(f"  {entry['name']:<14} {entry['key']}  {_format_mb(entry['bytes']):>10}  last used {used}")
+        config = cache.config(entry)
+        if config:
+            print(f"    {json.dumps(config, sort_keys=True)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear the recommender artifact cache")
+    parser.add_argument("command", choices=["inspect", "clear"])
+    parser.add_argument("--dir", default=os.getenv('RECS_CACHE_DIR') or DEFAULT_CACHE_DIR, help="Cache directory")
+    args = parser.parse_args()
+
+    max_mb = os.getenv('RECS_CACHE_MAX_MB')
+    cache = ArtifactCache(args.dir, int(max_mb) * 1024 ** 2 if max_mb else ARTIFACT_CACHE_MAX_BYTES)
+    if args.command == 'clear':
+        n = len(cache.entries())
+        cache.clear()
+        print(f"Removed {n} cached artifacts from {cache.directory}")
+    else:
+        inspect_cache(cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""End-to-end benchmark of the recommender pipeline on synthetic data.
+
+Generates `content` and `reviews` tables at each scale point, loads them into
+an in-memory or file-backed SQLite database and runs train_recommender()
+against it (full run, artifact cache off). Wall time and peak RSS of every
+stage (load, features, content_sim, collab_sim, hybrid, scoring, save) are
+printed as one JSON object per scale point.
+
+    python bench.py --scales 2000x1000,20000x5000 --out bench.json
+    python bench.py --scales 20000x5000 --baseline bench.json   # exit 1 on a regression
+
+A scale point is USERSxITEMS. --neighbors-k 200 benchmarks the
+top-K neighbor path (a single `neighbors` stage) instead of the full
+similarity matrices.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+import recommender
+from profiling import StageProfiler, peak_rss_bytes
+from synthetic import synthetic_content, synthetic_reviews
+
+# A stage only counts as a regression above this many seconds (timer noise)
+MIN_REGRESSION_SECONDS = 0.05
+
+
+def parse_scales(text):
+    """'2000x1000,20000x5000' -> [(2000, 1000), (20000, 5000)] (users x items)."""
+    scales = []
+    for point in text.split(','):
+        users, items = point.lower().split('x')
+        scales.append((int(users), int(items)))
+    return scales
+
+
+def make_source(kind, directory):
+    """SQLAlchemy engine for the synthetic tables: 'memory' or 'sqlite' (a file)."""
+    if kind == 'memory':
+        # One shared connection, so every query sees the same in-memory database
+        return create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    return create_engine(f"sqlite:///{os.path.join(directory, 'bench.sqlite')}")
+
+
+def populate(db, content_df, reviews_df):
+    """Writes the tables with the columns loader.py reads (reviews get ids and created_at)."""
+    reviews = reviews_df.copy()
+    reviews.insert(0, 'id', np.arange(1, len(reviews) + 1))
+    reviews['created_at'] = pd.Timestamp('2025-01-01') + pd.to_timedelta(reviews['id'], unit='s')
+    content = content_df.astype({'genre': object})
+    with db.begin() as conn:
+        content.to_sql('content', conn, if_exists='replace', index=False, chunksize=10000)
+        reviews.to_sql('reviews', conn, if_exists='replace', index=False, chunksize=10000)
+
+
+def run_point(args, n_users, n_items, workdir):
+    content_df = synthetic_content(
+        n_items, seed=args.seed, key_density=args.key_density, extra_keys=args.extra_keys,
+    )
+    mean_reviews = max(1.0, args.density * n_items)
+    reviews_df = synthetic_reviews(n_users, n_items, seed=args.seed, mean_reviews=mean_reviews, latent=False)
+
+    db = make_source(args.source, workdir)
+    populate(db, content_df, reviews_df)
+
+    profiler = StageProfiler(trace=args.trace)
+    started = time.perf_counter()
+    output = io.StringIO()
+    with contextlib.redirect_stdout(sys.stdout if args.verbose else output):
+        recommender.train_recommender(full=True, engine_name=args.engine, db=db, profiler=profiler)
+    total = time.perf_counter() - started
+    db.dispose()
+
+    return {
+        'users': n_users,
+        'items': n_items,
+        'reviews': len(reviews_df),
+        'density': args.density,
+        'engine': args.engine,
+        'neighbors_k': args.neighbors_k,
+        'source': args.source,
+        'total_seconds': round(total, 4),
+        'peak_rss_bytes': peak_rss_bytes(),
+        'stages': [
+            {**s, 'seconds': round(s['seconds'], 4)} for s in profiler.stages
+        ],
+    }
+
+
+def find_regressions(results, baseline, tolerance):
+    """(scale, stage, before, after) for stages slower than `tolerance` x the baseline.
+
+    Only runs with the same scale, engine, K and source are compared.
+    """
+    def point(r):
+        return r['users'], r['items'], r['engine'], r['neighbors_k'], r['source']
+
+    before = {(*point(r), s['stage']): s['seconds'] for r in baseline for s in r['stages']}
+    slower = []
+    for r in results:
+        for s in r['stages']:
+            old = before.get((*point(r), s['stage']))
+            if old is not None and s['seconds'] > old * tolerance and s['seconds'] - old > MIN_REGRESSION_SECONDS:
+                slower.append((f"{r['users']}x{r['items']}", s['stage'], old, s['seconds']))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark recommender stages on synthetic data")
+    parser.add_argument("--scales", default="2000x1000,10000x5000", help="Comma-separated USERSxITEMS points")
+    parser.add_argument("--density", type=float, default=0.003, help="Mean share of the catalog a user reviews")
+    parser.add_argument("--key-density", type=float, default=0.8, help="Share of known keys present per JSON document")
+    parser.add_argument("--extra-keys", type=int, default=0, help="Ignored keys added to every JSON document")
+    parser.add_argument("--source", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument("--engine", choices=["itemknn", "als"], default="itemknn")
+    parser.add_argument("--neighbors-k", type=int, default=0, help="0 = full similarity matrices")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace", action="store_true", help="Also record tracemalloc peaks (slower)")
+    parser.add_argument("--out", help="Write the results as a JSON array to this file")
+    parser.add_argument("--baseline", help="Earlier --out file to compare stage times against")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="Allowed slowdown factor vs the baseline")
+    parser.add_argument("--verbose", action="store_true", help="Show the recommender's own output")
+    args = parser.parse_args()
+
+    # Benchmark the computation, not the cache or the on-disk side outputs
+    recommender.NEIGHBORS_K = args.neighbors_k
+    recommender.CACHE_DIR = None
+    recommender.MODEL_DIR = None
+    recommender.SIM_DIR = None
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        recommender.STATE_DIR = os.path.join(workdir, 'state')
+        for n_users, n_items in parse_scales(args.scales):
+            result = run_point(args, n_users, n_items, workdir)
+            results.append(result)
+            print(json.dumps(result), flush=True)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        slower = find_regressions(results, baseline, args.tolerance)
+        for scale, stage, old, new in slower:
+            print(f"❌ {scale} {stage}: {old:.3f}s -> {new:.3f}s", file=sys.stderr)
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
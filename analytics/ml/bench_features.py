@@ -0,0 +1,77 @@
+"""Micro-benchmark: legacy per-row feature parsing vs features.build_content_features().
+
+Generates a synthetic content table, checks both pipelines produce the same
+matrix and prints their timings.
+
+    python bench_features.py --items 100000
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+from sklearn.preprocessing import MinMaxScaler, MultiLabelBinarizer
+
+from features import EMOTION_KEYS, PERCEPTION_KEYS, build_content_features
+from synthetic import synthetic_content
+
+
+def parse_json_feature(json_data, keys):
+    """Legacy per-row parser (reference implementation)."""
+    if not isinstance(json_data, (str, dict)) or not json_data:
+        return [0] * len(keys)
+
+    if isinstance(json_data, str):
+        try:
+            data = json.loads(json_data)
+        except ValueError:
+            return [0] * len(keys)
+    else:
+        data = json_data
+
+    return [float(data.get(k, 0)) for k in keys]
+
+
+def legacy_content_features(content_df):
+    """The original recommender.py feature pipeline, row by row."""
+    genre_list = content_df['genre'].astype(object).apply(lambda x: [g.strip() for g in x.split(',')] if isinstance(x, str) and x else [])
+    genre_matrix = MultiLabelBinarizer().fit_transform(genre_list)
+
+    scaler = MinMaxScaler()
+    emotion_matrix = np.array(content_df['emotional_cloud'].apply(lambda x: parse_json_feature(x, EMOTION_KEYS)).tolist())
+    emotion_matrix = scaler.fit_transform(emotion_matrix)
+    perception_matrix = np.array(content_df['perception_map'].apply(lambda x: parse_json_feature(x, PERCEPTION_KEYS)).tolist())
+    perception_matrix = scaler.fit_transform(perception_matrix)
+
+    return np.hstack([genre_matrix, emotion_matrix, perception_matrix]).astype(np.float32)
+
+
+def timed(fn, *args, repeat=3):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark content feature extraction")
+    parser.add_argument("--items", type=int, default=50000, help="Synthetic catalog size")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per pipeline (best is reported)")
+    args = parser.parse_args()
+
+    content_df = synthetic_content(args.items)
+    legacy_time, legacy = timed(legacy_content_features, content_df, repeat=args.repeat)
+    fast_time, fast = timed(build_content_features, content_df, repeat=args.repeat)
+
+    if legacy.shape != fast.shape or not np.allclose(legacy, fast):
+        raise SystemExit(f"❌ Feature matrices differ: {legacy.shape} vs {fast.shape}")
+
+    print(f"items={args.items} features={fast.shape[1]}")
+    print(f"legacy  {legacy_time * 1000:10.1f} ms")
+    print(f"batched {fast_time * 1000:10.1f} ms   ({legacy_time / fast_time:.1f}x faster, identical output)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
 import os
+import sys
 from sqlalchemy import create_engine, inspect
 from dotenv import load_dotenv
 
+from loader import REQUIRED_COLUMNS, missing_columns, review_change_column
+
 # Load environment variables
 basedir = os.path.dirname(os.path.abspath(__file__))
 env_path = os.path.join(basedir, '../../movie-aggregator-backend-nest/.env')
@@ -17,7 +20,19 @@ DB_NAME = os.getenv('DB_NAME', 'warehouse')
 db_url = f"mysql+pymysql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 engine = create_engine(db_url)
 
+# Columns the recommender loads (same check it runs before loading)
+missing = missing_columns(engine)
+for table, required in REQUIRED_COLUMNS.items():
+    status = f"missing {', '.join(missing[table])}" if table in missing else "OK"
+    print(f"Table {table}: {status}")
+if 'reviews' not in missing:
+    print(f"Review change watermark column: {review_change_column(engine) or 'none (every run is full)'}")
+
 inspector = inspect(engine)
-columns = inspector.get_columns('recommendations')
-for column in columns:
-    print(f"Column: {column['name']}, Type: {column['type']}")
+if inspector.has_table('recommendations'):
+    columns = inspector.get_columns('recommendations')
+    for column in columns:
+        print(f"Column: {column['name']}, Type: {column['type']}")
+
+if missing:
+    sys.exit(1)
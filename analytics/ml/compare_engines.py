@@ -0,0 +1,123 @@
+"""Compares the itemknn and als recommender engines on a leave-one-out split.
+
+For every user with at least two reviews one random review is held out;
+both engines are trained on the rest and scored on whether the held-out item
+shows up in the user's top-20 (hit rate, NDCG). Fit time, scoring time and
+peak traced memory are reported per engine.
+
+    python compare_engines.py --users 20000 --items 10000
+    python compare_engines.py --db
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from als import ALS_FACTORS, ALS_ITERATIONS, fit_als, score_users_als
+from features import build_content_features
+from matrices import build_id_index, build_item_user_matrix, build_rating_matrix
+from neighbors import NEIGHBORS_K, build_neighbors
+from profiling import StageProfiler, _format_bytes
+from scoring import TOP_N, score_users_neighbors
+from synthetic import synthetic_content, synthetic_reviews
+
+HYBRID_ALPHA = 0.7
+
+
+def leave_one_out(reviews_df, seed=0):
+    """(train reviews, held-out review per user with at least two reviews)."""
+    shuffled = reviews_df.sample(frac=1, random_state=seed)
+    counts = shuffled.groupby('user_id')['user_id'].transform('size')
+    first = ~shuffled.duplicated('user_id')
+    test_mask = first & (counts >= 2)
+    return shuffled[~test_mask].sort_index(), shuffled[test_mask]
+
+
+def ranking_quality(user_ids, item_ids, user_rows, item_rows, test_df, k=TOP_N):
+    """Hit rate and NDCG at k of the held-out items."""
+    recs = pd.DataFrame({'user_id': user_ids[user_rows], 'content_id': item_ids[item_rows]})
+    recs['rank'] = recs.groupby('user_id').cumcount()
+    hits = test_df[['user_id', 'content_id']].merge(recs, on=['user_id', 'content_id'], how='left')
+    found = hits['rank'].notna() & (hits['rank'] < k)
+    ndcg = np.where(found, 1 / np.log2(hits['rank'].fillna(0).to_numpy() + 2), 0)
+    return found.mean(), ndcg.mean()
+
+
+def _timed(profiler, stage, fn):
+    started = time.perf_counter()
+    with profiler.stage(stage):
+        result = fn()
+    return result, time.perf_counter() - started
+
+
+def run_itemknn(train_df, item_index, features, ratings, rated, profiler):
+    """Hybrid top-K neighbor lists (the recommender with RECS_NEIGHBORS_K > 0)."""
+    def fit():
+        item_user = build_item_user_matrix(train_df, item_index)
+        return build_neighbors(features, item_user, HYBRID_ALPHA, k=NEIGHBORS_K).to_csr()
+
+    neighbor_csr, fit_time = _timed(profiler, 'fit', fit)
+    recs, score_time = _timed(profiler, 'score', lambda: score_users_neighbors(neighbor_csr, ratings, rated))
+    return fit_time, score_time, recs
+
+
+def run_als(train_df, item_index, features, ratings, rated, profiler, factors, iterations):
+    """ALS factors blended with content-only neighbor lists."""
+    def fit():
+        model = fit_als(ratings, rated, factors=factors, iterations=iterations)
+        return model, build_neighbors(features, None, 0.0, k=NEIGHBORS_K).to_csr()
+
+    (model, content_csr), fit_time = _timed(profiler, 'fit', fit)
+    recs, score_time = _timed(
+        profiler, 'score',
+        lambda: score_users_als(model, ratings, rated, content_csr, alpha=HYBRID_ALPHA),
+    )
+    return fit_time, score_time, recs
+
+
+def _load(args):
+    if args.db:
+        from loader import load_content, load_reviews
+        from recommender import engine
+
+        return load_reviews(engine), load_content(engine)
+    return synthetic_reviews(args.users, args.items), synthetic_content(args.items)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare itemknn and als engines (fit time, memory, quality)")
+    parser.add_argument("--users", type=int, default=5000, help="Synthetic users")
+    parser.add_argument("--items", type=int, default=5000, help="Synthetic catalog size")
+    parser.add_argument("--db", action="store_true", help="Use the reviews/content tables instead of synthetic data")
+    parser.add_argument("--factors", type=int, default=ALS_FACTORS)
+    parser.add_argument("--iterations", type=int, default=ALS_ITERATIONS)
+    args = parser.parse_args()
+
+    reviews_df, content_df = _load(args)
+    item_ids = content_df['id'].to_numpy()
+    item_index = build_id_index(item_ids)
+    features = build_content_features(content_df)
+
+    train_df, test_df = leave_one_out(reviews_df)
+    user_ids, ratings, rated = build_rating_matrix(train_df, item_index)
+    print(f"users={len(user_ids)} items={len(item_ids)} train reviews={len(train_df)} held out={len(test_df)}")
+
+    engines = {
+        'itemknn': lambda profiler: run_itemknn(train_df, item_index, features, ratings, rated, profiler),
+        'als': lambda profiler: run_als(train_df, item_index, features, ratings, rated, profiler,
+                                        args.factors, args.iterations),
+    }
+
+    print(f"{'engine':<8} {'fit':>8} {'fit peak':>11} {'score':>8} {'score peak':>11} {'HR@20':>7} {'NDCG@20':>8}")
+    for name, run in engines.items():
+        profiler = StageProfiler()
+        fit_time, score_time, (user_rows, item_rows, _) = run(profiler)
+        hit_rate, ndcg = ranking_quality(user_ids, item_ids, user_rows, item_rows, test_df)
+        peaks = {s['stage']: s['peak_bytes'] for s in profiler.stages}
+        print(f"{name:<8} {fit_time:>7.2f}s {_format_bytes(peaks['fit']):>11} "
+              f"{score_time:>7.2f}s {_format_bytes(peaks['score']):>11} {hit_rate:>7.3f} {ndcg:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
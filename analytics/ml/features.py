@@ -0,0 +1,120 @@
+import json
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.preprocessing import MinMaxScaler
+
+try:
+    import orjson
+
+    _loads = orjson.loads
+    _JSON_ERRORS = (orjson.JSONDecodeError, TypeError)
+except ImportError:  # orjson is optional; stdlib json gives the same result, slower
+    _loads = json.loads
+    _JSON_ERRORS = (ValueError, TypeError)
+
+EMOTION_KEYS = ['joy', 'sadness', 'anger', 'fear', 'surprise', 'disgust', 'anticipation', 'trust', 'awe', 'tension', 'excitement']
+PERCEPTION_KEYS = ['plot', 'acting', 'visuals', 'soundtrack', 'originality', 'pacing', 'atmosphere']
+
+# Content columns the features are built from
+FEATURE_COLUMNS = ['genre', 'emotional_cloud', 'perception_map']
+
+# Everything besides the content rows that changes build_content_features()
+# output; part of the artifact cache key, so bump 'version' on logic changes
+FEATURE_CONFIG = {
+    'version': 1,
+    'emotion_keys': EMOTION_KEYS,
+    'perception_keys': PERCEPTION_KEYS,
+    'scaling': 'minmax',
+    'dtype': 'float32',
+}
+
+
+def _parse_documents(values):
+    """Parses a column of JSON strings/dicts into a list of dicts in one pass.
+
+    All strings are first decoded as a single JSON array; only if that fails
+    (some row is invalid) each string is decoded on its own. Empty, missing,
+    invalid or non-object values become {}.
+    """
+    values = list(values)
+    is_text = [isinstance(v, str) and v != '' for v in values]
+    texts = [v for v, t in zip(values, is_text) if t]
+
+    try:
+        decoded = _loads('[' + ','.join(texts) + ']')
+        if len(decoded) != len(texts):
+            raise ValueError('row count mismatch')
+    except (ValueError, *_JSON_ERRORS):
+        decoded = []
+        for text in texts:
+            try:
+                decoded.append(_loads(text))
+            except _JSON_ERRORS:
+                decoded.append({})
+
+    decoded = iter(decoded)
+    docs = []
+    for value, text in zip(values, is_text):
+        doc = next(decoded) if text else value
+        docs.append(doc if isinstance(doc, dict) else {})
+    return docs
+
+
+def json_key_matrix(values, keys):
+    """items x len(keys) float64 matrix of `keys` read from a JSON column (missing -> 0)."""
+    frame = pd.DataFrame.from_records(_parse_documents(values), columns=keys)
+    frame = frame.apply(pd.to_numeric, errors='coerce')
+    return frame.fillna(0).to_numpy(dtype=np.float64).reshape(len(values), len(keys))
+
+
+def genre_multi_hot(genre):
+    """Sparse items x genres multi-hot matrix and the sorted genre labels.
+
+    Comma-separated labels are split once per distinct genre string (the
+    column's categories), not once per row, then rows are gathered by their
+    category code. Columns are ordered like MultiLabelBinarizer's classes_.
+    """
+    codes_source = genre if isinstance(genre.dtype, pd.CategoricalDtype) else genre.astype('category')
+    categories = list(codes_source.cat.categories)
+    codes = codes_source.cat.codes.to_numpy()
+
+    tokens_per_category = [
+        {g.strip() for g in c.split(',')} if isinstance(c, str) and c else set()
+        for c in categories
+    ]
+    labels = sorted(set().union(*tokens_per_category)) if tokens_per_category else []
+    label_index = {label: i for i, label in enumerate(labels)}
+
+    rows, cols = [], []
+    for category, tokens in enumerate(tokens_per_category):
+        for token in tokens:
+            rows.append(category)
+            cols.append(label_index[token])
+    # Extra all-zero row for NULL/NaN genres (category code -1)
+    per_category = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+        shape=(len(categories) + 1, len(labels)),
+    )
+    codes = np.where(codes < 0, len(categories), codes)
+    return per_category[codes], labels
+
+
+def build_content_features(content_df):
+    """Genre multi-hot + MinMax-scaled emotion and perception vectors, float32.
+
+    Same values as the former per-row parse_json_feature / MultiLabelBinarizer
+    pipeline, produced column-wise.
+    """
+    genre_matrix, _ = genre_multi_hot(content_df['genre'])
+
+    # Normalize emotions and perception (0-1)
+    scaler = MinMaxScaler()
+    emotion_matrix = json_key_matrix(content_df['emotional_cloud'], EMOTION_KEYS)
+    perception_matrix = json_key_matrix(content_df['perception_map'], PERCEPTION_KEYS)
+    if len(content_df) > 0:
+        emotion_matrix = scaler.fit_transform(emotion_matrix)
+        perception_matrix = scaler.fit_transform(perception_matrix)
+
+    return np.hstack([genre_matrix.toarray(), emotion_matrix, perception_matrix]).astype(np.float32)
@@ -0,0 +1,128 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Neighbor similarities closer than this are treated as unchanged between runs
+NEIGHBOR_SIM_TOLERANCE = 1e-6
+
+
+class RunState:
+    """What the previous run saw: review watermark, catalog, neighbors and per-user review counts.
+
+    Stored as `state.json` + `state.npz` in the state directory and replaced
+    only after recommendations were written successfully.
+    """
+
+    def __init__(self, watermark, item_ids, neighbor_indices, neighbor_sims, user_ids, user_counts):
+        self.watermark = watermark
+        self.item_ids = item_ids
+        self.neighbor_indices = neighbor_indices
+        self.neighbor_sims = neighbor_sims
+        self.user_ids = user_ids
+        self.user_counts = user_counts
+
+
+def load_state(state_dir):
+    """Returns the previous RunState or None if there is no usable one."""
+    try:
+        with open(os.path.join(state_dir, 'state.json')) as f:
+            meta = json.load(f)
+        arrays = np.load(os.path.join(state_dir, 'state.npz'))
+    except (OSError, ValueError):
+        return None
+
+    watermark = pd.Timestamp(meta['watermark']) if meta.get('watermark') else None
+    return RunState(
+        watermark,
+        arrays['item_ids'],
+        arrays['neighbor_indices'],
+        arrays['neighbor_sims'],
+        arrays['user_ids'],
+        arrays['user_counts'],
+    )
+
+
+def save_state(state_dir, reviews_df, item_ids, neighbor_lists):
+    """Persists the state of a finished run for the next incremental one."""
+    os.makedirs(state_dir, exist_ok=True)
+    counts = reviews_df.groupby('user_id', sort=False).size()
+    watermark = reviews_df['changed_at'].max() if not reviews_df.empty else None
+
+    # Write the arrays first: a state.json without matching arrays is never loaded
+    tmp_npz = os.path.join(state_dir, 'state.tmp.npz')
+    np.savez(
+        tmp_npz,
+        item_ids=np.asarray(item_ids),
+        neighbor_indices=neighbor_lists.indices,
+        neighbor_sims=neighbor_lists.sims,
+        user_ids=counts.index.to_numpy(),
+        user_counts=counts.to_numpy(),
+    )
+    os.replace(tmp_npz, os.path.join(state_dir, 'state.npz'))
+
+    tmp_json = os.path.join(state_dir, 'state.json.tmp')
+    with open(tmp_json, 'w') as f:
+        json.dump({'watermark': pd.Timestamp(watermark).isoformat() if pd.notna(watermark) else None}, f)
+    os.replace(tmp_json, os.path.join(state_dir, 'state.json'))
+
+
+def clear_state(state_dir):
+    """Forgets the previous run, so the next incremental run rescores everyone."""
+    for name in ('state.json', 'state.npz'):
+        try:
+            os.remove(os.path.join(state_dir, name))
+        except FileNotFoundError:
+            pass
+
+
+def changed_neighbor_items(state, item_ids, neighbor_lists, tolerance=NEIGHBOR_SIM_TOLERANCE):
+    """Boolean mask of items whose neighbor list changed since the last run.
+
+    Returns None when the catalog itself changed (items added, removed or
+    reordered): the zero-score tail of every user's list may shift then, so
+    the caller has to rescore everyone. A larger `tolerance` trades a little
+    staleness for fewer rescored users after small similarity drifts.
+    """
+    if state.item_ids.shape != item_ids.shape or not np.array_equal(state.item_ids, item_ids):
+        return None
+    if state.neighbor_indices.shape != neighbor_lists.indices.shape:
+        return None
+
+    changed = (state.neighbor_indices != neighbor_lists.indices).any(axis=1)
+    changed |= (np.abs(state.neighbor_sims - neighbor_lists.sims) > tolerance).any(axis=1)
+    return changed
+
+
+def affected_users(state, reviews_df, user_ids, rated, changed_items):
+    """Users whose recommendations have to be recomputed, and users to drop.
+
+    Affected are users with reviews changed at or after the watermark, users
+    whose review count changed (deletions or ratings cleared), and users who
+    rated an item whose neighbor list changed. Users that no longer have any
+    rated review are returned separately so their rows can be deleted.
+    Returns (row positions into `user_ids`, removed user ids).
+    """
+    affected = np.zeros(len(user_ids), dtype=bool)
+    user_index = pd.Index(user_ids)
+
+    if state.watermark is not None:
+        fresh = reviews_df.loc[reviews_df['changed_at'] >= state.watermark, 'user_id']
+    else:
+        fresh = reviews_df['user_id']
+    affected[user_index.get_indexer(pd.unique(fresh))] = True
+
+    counts = reviews_df.groupby('user_id', sort=False).size()
+    previous = pd.Series(state.user_counts, index=state.user_ids)
+    all_users = previous.index.union(counts.index)
+    diff = counts.reindex(all_users, fill_value=0) != previous.reindex(all_users, fill_value=0)
+    count_changed = all_users[diff.to_numpy()]
+    positions = user_index.get_indexer(count_changed)
+    affected[positions[positions >= 0]] = True
+    removed = np.setdiff1d(np.asarray(count_changed), user_ids)
+
+    if changed_items.any():
+        affected |= np.asarray(rated[:, np.flatnonzero(changed_items)].sum(axis=1)).ravel() > 0
+
+    return np.flatnonzero(affected), removed
@@ -0,0 +1,106 @@
+import pandas as pd
+from pandas.api.types import union_categoricals
+from sqlalchemy import inspect, text
+
+# Rows fetched per round trip from the server-side cursor
+LOAD_CHUNK_SIZE = 50000
+
+# Columns the recommender reads, per table
+REQUIRED_COLUMNS = {
+    'reviews': ['user_id', 'content_id', 'rating'],
+    'content': ['id', 'genre', 'emotional_cloud', 'perception_map', 'hype_index', 'avg_rating'],
+}
+
+# Compact dtypes applied to every chunk as it arrives
+REVIEWS_DTYPES = {'user_id': 'uint32', 'content_id': 'uint32', 'rating': 'float32'}
+CONTENT_DTYPES = {'id': 'uint32', 'genre': 'category', 'hype_index': 'float32', 'avg_rating': 'float32'}
+
+
+def missing_columns(engine):
+    """{table: [missing columns]} for the tables the recommender reads (empty if all present)."""
+    inspector = inspect(engine)
+    missing = {}
+    for table, required in REQUIRED_COLUMNS.items():
+        if not inspector.has_table(table):
+            missing[table] = list(required)
+            continue
+        present = {c['name'] for c in inspector.get_columns(table)}
+        absent = [c for c in required if c not in present]
+        if absent:
+            missing[table] = absent
+    return missing
+
+
+def review_change_column(engine):
+    """Column that tells when a review last changed (updated_at once migrated).
+
+    Falls back to created_at, and to None when the table has neither.
+    """
+    columns = {c['name'] for c in inspect(engine).get_columns('reviews')}
+    for column in ('updated_at', 'created_at'):
+        if column in columns:
+            return column
+    return None
+
+
+def _compact(chunk, dtypes):
+    for column, dtype in dtypes.items():
+        if column not in chunk:
+            continue
+        if dtype == 'category':
+            chunk[column] = chunk[column].astype('category')
+        else:
+            # DECIMAL columns arrive as Decimal objects; go through float first
+            values = pd.to_numeric(chunk[column], errors='coerce')
+            if pd.api.types.is_integer_dtype(dtype) and values.isna().any():
+                # Integer ids can't hold NULL: rows without one are unusable anyway
+                keep = values.notna()
+                chunk, values = chunk[keep], values[keep]
+            chunk[column] = values.astype(dtype)
+    return chunk
+
+
+def _concat(chunks, columns):
+    """pd.concat that keeps categoricals categorical across chunks."""
+    if not chunks:
+        return pd.DataFrame(columns=columns)
+    categorical = [c for c in chunks[0].columns if isinstance(chunks[0][c].dtype, pd.CategoricalDtype)]
+    df = pd.concat([chunk.drop(columns=categorical) for chunk in chunks], ignore_index=True)
+    for column in categorical:
+        df[column] = pd.Categorical(union_categoricals([chunk[column] for chunk in chunks]))
+    return df[list(chunks[0].columns)]
+
+
+def read_sql_compact(engine, query, columns, dtypes, chunk_size=LOAD_CHUNK_SIZE, parse_dates=None):
+    """Reads a query through a server-side (unbuffered) cursor, chunk by chunk.
+
+    Each chunk is downcast with `dtypes` before the next one is fetched, so
+    peak memory is one raw chunk plus the compact result, not the whole table
+    as Python objects.
+    """
+    chunks = []
+    with engine.connect().execution_options(stream_results=True) as conn:
+        for chunk in pd.read_sql(text(query), conn, chunksize=chunk_size, parse_dates=parse_dates):
+            chunks.append(_compact(chunk, dtypes))
+    return _concat(chunks, columns)
+
+
+def load_reviews(engine, chunk_size=LOAD_CHUNK_SIZE):
+    """Rated content reviews: user_id/content_id uint32, rating float32, changed_at datetime.
+
+    Movie reviews carry `movie_id` with a NULL `content_id` and are skipped.
+    """
+    change_column = review_change_column(engine)
+    query = (
+        f"SELECT user_id, content_id, rating, {change_column or 'NULL'} AS changed_at "
+        "FROM reviews WHERE rating IS NOT NULL AND content_id IS NOT NULL"
+    )
+    columns = ['user_id', 'content_id', 'rating', 'changed_at']
+    return read_sql_compact(engine, query, columns, REVIEWS_DTYPES, chunk_size, parse_dates=['changed_at'])
+
+
+def load_content(engine, chunk_size=LOAD_CHUNK_SIZE):
+    """Content features: id uint32, genre categorical, JSON columns as raw strings."""
+    columns = REQUIRED_COLUMNS['content']
+    query = f"SELECT {', '.join(columns)} FROM content"
+    return read_sql_compact(engine, query, columns, CONTENT_DTYPES, chunk_size)
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+def build_id_index(ids):
+    """Integer id -> row/column position map (a hashed pd.Index)."""
+    return pd.Index(ids)
+
+
+def build_rating_matrix(reviews_df, item_index):
+    """Builds a users x items CSR rating matrix aligned with `item_index`.
+
+    Users keep their order of first appearance in `reviews_df`. When a user
+    rated the same item twice the last rating wins, like the old dict(zip(...)).
+    Reviews of items outside the catalog are dropped, but their users are kept.
+    Returns (user_ids, ratings, rated) where `rated` is the binary mask.
+    """
+    user_ids = pd.unique(reviews_df['user_id'])
+    user_index = build_id_index(user_ids)
+
+    latest = reviews_df.drop_duplicates(['user_id', 'content_id'], keep='last')
+    cols = item_index.get_indexer(latest['content_id'])
+    known = cols >= 0
+    rows = user_index.get_indexer(latest['user_id'])[known]
+    cols = cols[known]
+    values = latest['rating'].to_numpy(dtype=np.float64)[known]
+
+    shape = (len(user_index), len(item_index))
+    ratings = sparse.csr_matrix((values, (rows, cols)), shape=shape)
+    rated = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=shape)
+    return user_ids, ratings, rated
+
+
+def build_item_user_matrix(reviews_df, item_index):
+    """Builds the items x users CSR matrix used by collaborative filtering.
+
+    Equivalent to pivot_table(...).fillna(0) reindexed to the catalog and
+    transposed: duplicate (user, item) ratings are averaged, unknown items are
+    dropped, and missing ratings are implicit zeros instead of stored floats.
+    """
+    means = reviews_df.groupby(['content_id', 'user_id'], sort=False)['rating'].mean().reset_index()
+    rows = item_index.get_indexer(means['content_id'])
+    known = rows >= 0
+
+    user_index = build_id_index(pd.unique(means['user_id']))
+    cols = user_index.get_indexer(means['user_id'])
+
+    return sparse.csr_matrix(
+        (means['rating'].to_numpy(dtype=np.float32)[known], (rows[known], cols[known])),
+        shape=(len(item_index), len(user_index)),
+    )
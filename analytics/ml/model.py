@@ -0,0 +1,114 @@
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+# Bumped when the artifact layout changes; older artifacts are not loaded
+MODEL_VERSION = 1
+DEFAULT_MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.recs-model')
+MANIFEST = 'model.json'
+ARRAYS = ('item_ids', 'id_order', 'neighbor_indices', 'neighbor_sims', 'popularity', 'popular')
+
+
+class ModelArtifact:
+    """What the online scorer needs from a training run, as read-only memmaps.
+
+    `item_ids` maps catalog positions to content ids and `id_order` sorts
+    them (for id -> position lookups), `neighbor_indices`/`neighbor_sims`
+    are the NeighborLists arrays and `popularity` the per-item prior with
+    `popular` the positions ordered by it, best first.
+    """
+
+    def __init__(self, manifest, arrays):
+        self.manifest = manifest
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        # Sorted content ids, gathered once for id -> position lookups
+        self.sorted_ids = np.asarray(self.item_ids[self.id_order])
+
+    @property
+    def n_items(self):
+        return len(self.item_ids)
+
+    def positions(self, content_ids):
+        """Catalog positions of `content_ids`, -1 for ids not in the catalog."""
+        content_ids = np.asarray(content_ids, dtype=np.int64)
+        if self.n_items == 0:
+            return np.full(len(content_ids), -1, dtype=np.int64)
+        at = np.minimum(np.searchsorted(self.sorted_ids, content_ids), self.n_items - 1)
+        return np.where(self.sorted_ids[at] == content_ids, self.id_order[at], -1)
+
+
+def popularity_priors(content_df, reviews_df):
+    """(prior per catalog position, positions best first) for cold-start lists.
+
+    The prior is the number of reviews an item has; hype_index then catalog
+    order break ties, so a catalog without reviews is still ordered.
+    """
+    counts = np.zeros(len(content_df), dtype=np.float32)
+    if not reviews_df.empty:
+        per_item = reviews_df.groupby('content_id').size()
+        positions = content_df.reset_index(drop=True).reset_index().set_index('id')['index']
+        known = per_item.index.isin(positions.index)
+        counts[positions.loc[per_item.index[known]].to_numpy()] = per_item.to_numpy()[known]
+
+    hype = content_df['hype_index'].fillna(0).to_numpy(dtype=np.float32)
+    popular = np.lexsort((np.arange(len(counts)), -hype, -counts)).astype(np.int32)
+    return counts, popular
+
+
+def save_model(model_dir, item_ids, neighbor_lists, popularity, popular, config):
+    """Writes the artifact as .npy files + manifest and swaps it in whole.
+
+    The new version is written next to the old one and renamed into place,
+    so a running scorer only ever sees a complete artifact.
+    """
+    item_ids = np.asarray(item_ids, dtype=np.int64)
+    arrays = {
+        'item_ids': item_ids,
+        'id_order': np.argsort(item_ids, kind='stable'),
+        'neighbor_indices': neighbor_lists.indices.astype(np.int32, copy=False),
+        'neighbor_sims': neighbor_lists.sims.astype(np.float32, copy=False),
+        'popularity': np.asarray(popularity, dtype=np.float32),
+        'popular': np.asarray(popular, dtype=np.int32),
+    }
+    manifest = {
+        'version': MODEL_VERSION,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'n_items': len(item_ids),
+        'k': neighbor_lists.k,
+        **config,
+    }
+
+    parent = os.path.dirname(os.path.abspath(model_dir))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = f"{model_dir}.tmp"
+    old_dir = f"{model_dir}.old"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), array)
+    with open(os.path.join(tmp_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f)
+
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.isdir(model_dir):
+        os.rename(model_dir, old_dir)
+    os.rename(tmp_dir, model_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return sum(array.nbytes for array in arrays.values())
+
+
+def load_model(model_dir):
+    """Memory-maps a saved artifact; None if there is none (or an older version)."""
+    try:
+        with open(os.path.join(model_dir, MANIFEST)) as f:
+            manifest = json.load(f)
+        if manifest.get('version') != MODEL_VERSION:
+            return None
+        arrays = {name: np.load(os.path.join(model_dir, f"{name}.npy"), mmap_mode='r') for name in ARRAYS}
+    except (OSError, ValueError):
+        return None
+    return ModelArtifact(manifest, arrays)
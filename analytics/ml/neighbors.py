@@ -0,0 +1,193 @@
+import numpy as np
+from scipy import sparse
+
+from ann import IVF_PROBE, IVFIndex
+from similarity import SIM_TILE_ROWS, iter_hybrid_tiles, normalize_rows
+
+# Neighbors kept per item and the similarity floor (matches the scoring threshold)
+NEIGHBORS_K = 200
+NEIGHBORS_FLOOR = 0.1
+
+
+class NeighborLists:
+    """Top-K hybrid neighbors per item: O(items * K) instead of items x items.
+
+    Row j of `indices` holds the catalog positions of the most similar items
+    to item j (best first, -1 padded) and `sims` the matching similarities.
+    Self-similarity is never stored: an item can't be recommended from itself.
+    """
+
+    def __init__(self, indices, sims):
+        self.indices = indices
+        self.sims = sims
+
+    @property
+    def n_items(self):
+        return self.indices.shape[0]
+
+    @property
+    def k(self):
+        return self.indices.shape[1]
+
+    @property
+    def nbytes(self):
+        return self.indices.nbytes + self.sims.nbytes
+
+    def to_csr(self):
+        """items x items CSR where row j maps each neighbor i to sim(j, i)."""
+        valid = self.indices >= 0
+        counts = valid.sum(axis=1)
+        indptr = np.zeros(self.n_items + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return sparse.csr_matrix(
+            (self.sims[valid], self.indices[valid], indptr),
+            shape=(self.n_items, self.n_items),
+        )
+
+
+def _select_top_k(tile, start, k, floor):
+    """Best k columns per tile row with sim > floor, best first, -1 padded."""
+    rows = np.arange(tile.shape[0])
+    tile[rows, start + rows] = -np.inf  # drop self-similarity
+
+    k_eff = min(k, tile.shape[1] - 1)
+    if k_eff <= 0:
+        return (np.full((tile.shape[0], k), -1, dtype=np.int32),
+                np.zeros((tile.shape[0], k), dtype=np.float32))
+
+    part = np.argpartition(-tile, k_eff - 1, axis=1)[:, :k_eff]
+    part_sims = np.take_along_axis(tile, part, axis=1)
+    order = np.argsort(-part_sims, axis=1, kind='stable')
+    idx = np.take_along_axis(part, order, axis=1).astype(np.int32)
+    sims = np.take_along_axis(part_sims, order, axis=1).astype(np.float32)
+
+    below = ~(sims > floor)
+    idx[below] = -1
+    sims[below] = 0
+
+    if k_eff < k:
+        pad = k - k_eff
+        idx = np.pad(idx, ((0, 0), (0, pad)), constant_values=-1)
+        sims = np.pad(sims, ((0, 0), (0, pad)))
+    return idx, sims
+
+
+def build_neighbors(content_features, item_user_matrix=None, alpha=0.0,
+                    k=NEIGHBORS_K, floor=NEIGHBORS_FLOOR, tile_rows=SIM_TILE_ROWS):
+    """Builds NeighborLists tile by tile without materializing items x items.
+
+    `content_features` is the items x features matrix and `item_user_matrix`
+    the items x users CSR ratings (None for pure content-based). Both are
+    normalized once; each tile of the hybrid similarity is reduced to its
+    top-k neighbors above `floor` before the next one is computed.
+    """
+    n_items = content_features.shape[0]
+    indices = np.full((n_items, k), -1, dtype=np.int32)
+    sims = np.zeros((n_items, k), dtype=np.float32)
+
+    content_norm = normalize_rows(content_features)
+    collab_norm = normalize_rows(item_user_matrix) if item_user_matrix is not None else None
+
+    for start, stop, tile in iter_hybrid_tiles(content_norm, collab_norm, alpha, tile_rows):
+        indices[start:stop], sims[start:stop] = _select_top_k(tile, start, k, floor)
+
+    return NeighborLists(indices, sims)
+
+
+def neighbors_from_matrix(sim, k=NEIGHBORS_K, floor=NEIGHBORS_FLOOR, tile_rows=SIM_TILE_ROWS):
+    """NeighborLists from an already built items x items similarity (RAM or memmap).
+
+    Used in exact mode, where the full hybrid matrix exists anyway, to give
+    the model artifact its top-k lists without recomputing similarities.
+    `sim` is read tile by tile and left unchanged.
+    """
+    n_items = sim.shape[0]
+    indices = np.full((n_items, k), -1, dtype=np.int32)
+    sims = np.zeros((n_items, k), dtype=np.float32)
+
+    for start in range(0, n_items, tile_rows):
+        stop = min(start + tile_rows, n_items)
+        tile = np.array(sim[start:stop], dtype=np.float32)
+        indices[start:stop], sims[start:stop] = _select_top_k(tile, start, k, floor)
+
+    return NeighborLists(indices, sims)
+
+
+def _select_top_k_pairs(rows, cols, scores, n_rows, k, floor):
+    """Per-row best k (col, score) pairs with score > floor, best first, -1 padded.
+
+    Pairs must be sorted by (row, col); equal scores keep the lower column.
+    """
+    indices = np.full((n_rows, k), -1, dtype=np.int32)
+    sims = np.zeros((n_rows, k), dtype=np.float32)
+    keep = scores > floor
+    rows, cols, scores = rows[keep], cols[keep], scores[keep]
+
+    # Input is sorted by (row, col): two stable sorts give (row, -score, col)
+    order = np.argsort(-scores, kind='stable')
+    order = order[np.argsort(rows[order], kind='stable')]
+    rows, cols, scores = rows[order], cols[order], scores[order]
+    starts = np.searchsorted(rows, np.arange(n_rows))
+    rank = np.arange(len(rows)) - starts[rows]
+    top = rank < k
+    indices[rows[top], rank[top]] = cols[top]
+    sims[rows[top], rank[top]] = scores[top]
+    return indices, sims
+
+
+def build_neighbors_approx(content_features, item_user_matrix=None, alpha=0.0,
+                           k=NEIGHBORS_K, floor=NEIGHBORS_FLOOR, tile_rows=SIM_TILE_ROWS,
+                           n_lists=None, n_probe=IVF_PROBE):
+    """build_neighbors() with the content part served by an IVF index (sub-quadratic).
+
+    Candidates per item are its approximate top-k content neighbors plus the
+    items it shares a rater with (the only ones with collab similarity > 0);
+    the exact hybrid similarity is computed for those pairs only. Pairs the
+    index misses and nobody co-rated are dropped, so recall follows the
+    index settings (see `python ann.py`).
+    """
+    n_items = content_features.shape[0]
+    indices = np.full((n_items, k), -1, dtype=np.int32)
+    sims = np.zeros((n_items, k), dtype=np.float32)
+    if n_items == 0:
+        return NeighborLists(indices, sims)
+
+    index = IVFIndex.build(content_features, n_lists)
+    content_norm = index.vectors
+    content_idx, _ = index.neighbors(k, n_probe, tile_rows)
+
+    collab_norm = normalize_rows(item_user_matrix) if item_user_matrix is not None and alpha else None
+    collab_t = collab_norm.T.tocsr() if collab_norm is not None else None
+
+    for start in range(0, n_items, tile_rows):
+        stop = min(start + tile_rows, n_items)
+        block = content_idx[start:stop]
+        rows, cols = np.nonzero(block >= 0)
+        cols = block[rows, cols].astype(np.int64)
+
+        collab_keys = None
+        if collab_t is not None:
+            collab = (collab_norm[start:stop] @ collab_t).tocsr()
+            collab.sort_indices()
+            collab_rows = np.repeat(np.arange(stop - start), np.diff(collab.indptr))
+            # Row-major keys: sorted, so collab values can be looked up by searchsorted
+            collab_keys = collab_rows * n_items + collab.indices
+            rows = np.concatenate([rows, collab_rows])
+            cols = np.concatenate([cols, collab.indices])
+
+        pairs = np.sort(rows.astype(np.int64) * n_items + cols)
+        pairs = pairs[np.concatenate([[True], pairs[1:] != pairs[:-1]])]
+        rows, cols = pairs // n_items, pairs % n_items
+        not_self = cols != rows + start
+        pairs, rows, cols = pairs[not_self], rows[not_self], cols[not_self]
+
+        scores = (1 - alpha) * np.einsum('ij,ij->i', content_norm[rows + start], content_norm[cols])
+        if collab_keys is not None and len(collab_keys):
+            pos = np.minimum(np.searchsorted(collab_keys, pairs), len(collab_keys) - 1)
+            found = collab_keys[pos] == pairs
+            scores[found] += alpha * collab.data[pos[found]]
+        indices[start:stop], sims[start:stop] = _select_top_k_pairs(
+            rows, cols, scores.astype(np.float32), stop - start, k, floor,
+        )
+
+    return NeighborLists(indices, sims)
@@ -0,0 +1,141 @@
+import multiprocessing as mp
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+from scipy import sparse
+
+from scoring import TOP_N, USER_BLOCK_SIZE, score_users, score_users_neighbors
+
+# Per-process state of a scoring worker, filled by _init_worker()
+_worker = {}
+
+
+def _attach(spec):
+    """ndarray view of a shared block described by (name, shape, dtype)."""
+    name, shape, dtype = spec
+    try:
+        shm = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 registers the block again, with the resource tracker
+        # pool workers share with the parent; the parent's unlink clears it
+        shm = shared_memory.SharedMemory(name=name)
+    _worker.setdefault('segments', []).append(shm)
+    return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+class SharedArrays:
+    """Copies arrays into multiprocessing.shared_memory once, for the pool's lifetime.
+
+    `specs` maps each array name to a picklable (segment, shape, dtype) that
+    workers attach to without copying. Segments are unlinked on exit.
+    """
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        self.segments = []
+        self.specs = {}
+
+    def __enter__(self):
+        for key, array in self.arrays.items():
+            array = np.ascontiguousarray(array)
+            shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            self.segments.append(shm)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+            self.specs[key] = (shm.name, array.shape, array.dtype.str)
+        return self
+
+    def __exit__(self, *exc):
+        for shm in self.segments:
+            shm.close()
+            shm.unlink()
+        self.segments = []
+
+
+def _init_worker(kind, specs, memmap_spec, k, block_size):
+    if kind == 'neighbors':
+        n_items = specs['indptr'][1][0] - 1
+        _worker['sim'] = sparse.csr_matrix(
+            (_attach(specs['data']), _attach(specs['indices']), _attach(specs['indptr'])),
+            shape=(n_items, n_items),
+        )
+    elif memmap_spec is not None:
+        # A similarity memmap is already shared through the page cache
+        path, shape = memmap_spec
+        _worker['sim'] = np.memmap(path, dtype=np.float32, mode='r', shape=shape)
+    else:
+        _worker['sim'] = _attach(specs['sim'])
+    _worker.update(kind=kind, k=k, block_size=block_size)
+
+
+def _score_block(task):
+    start, ratings, rated = task
+    if _worker['kind'] == 'neighbors':
+        users, items, scores = score_users_neighbors(
+            _worker['sim'], ratings, rated, k=_worker['k'], block_size=_worker['block_size'],
+        )
+    else:
+        users, items, scores = score_users(
+            _worker['sim'], ratings, rated, k=_worker['k'], block_size=_worker['block_size'], premasked=True,
+        )
+    # Compact result: int32 positions instead of per-user dicts/lists
+    return (users + start).astype(np.int32), items.astype(np.int32), scores
+
+
+def _tasks(ratings, rated, block_size):
+    for start in range(0, ratings.shape[0], block_size):
+        stop = min(start + block_size, ratings.shape[0])
+        yield start, ratings[start:stop], rated[start:stop]
+
+
+def _run_pool(kind, arrays, memmap_spec, ratings, rated, k, block_size, workers):
+    out_users, out_items, out_scores = [], [], []
+    with SharedArrays(arrays) as shared:
+        with mp.get_context().Pool(
+            workers, initializer=_init_worker,
+            initargs=(kind, shared.specs, memmap_spec, k, block_size),
+        ) as pool:
+            # imap keeps block order, so the output is identical to the serial run
+            for users, items, scores in pool.imap(_score_block, _tasks(ratings, rated, block_size)):
+                out_users.append(users)
+                out_items.append(items)
+                out_scores.append(scores)
+
+    if not out_users:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0)
+
+    return (np.concatenate(out_users).astype(np.int64), np.concatenate(out_items).astype(np.int64),
+            np.concatenate(out_scores))
+
+
+def resolve_workers(workers):
+    """Worker count from a setting: 0 means one per CPU."""
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+
+def score_users_parallel(sim, ratings, rated, k=TOP_N, block_size=USER_BLOCK_SIZE, workers=0):
+    """score_users(premasked=True) with user blocks fanned out to a process pool.
+
+    The already masked items x items `sim` is copied into shared memory once
+    (a numpy.memmap is reopened by each worker instead); only the block's
+    rating rows travel with each task. Returns the same arrays, in the same
+    order, as the single-process call.
+    """
+    workers = resolve_workers(workers)
+    if workers == 1:
+        return score_users(sim, ratings, rated, k=k, block_size=block_size, premasked=True)
+
+    if isinstance(sim, np.memmap) and sim.filename:
+        return _run_pool('dense', {}, (sim.filename, sim.shape), ratings, rated, k, block_size, workers)
+    return _run_pool('dense', {'sim': sim}, None, ratings, rated, k, block_size, workers)
+
+
+def score_users_neighbors_parallel(neighbor_csr, ratings, rated, k=TOP_N, block_size=USER_BLOCK_SIZE, workers=0):
+    """score_users_neighbors() over a process pool sharing the neighbor CSR arrays."""
+    workers = resolve_workers(workers)
+    if workers == 1:
+        return score_users_neighbors(neighbor_csr, ratings, rated, k=k, block_size=block_size)
+
+    arrays = {'data': neighbor_csr.data, 'indices': neighbor_csr.indices, 'indptr': neighbor_csr.indptr}
+    return _run_pool('neighbors', arrays, None, ratings, rated, k, block_size, workers)
@@ -0,0 +1,112 @@
+import json
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+def _format_bytes(n):
+    n = float(n)
+    for unit in ('B', 'KB', 'MB'):
+        if abs(n) < 1024:
+            return f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GB"
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def reset_peak_rss():
+    """Resets the kernel's peak RSS (VmHWM) so the next reading covers one stage.
+
+    Linux only; returns False where it is not supported, and peak readings
+    then stay process-wide.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def stage_peak_rss_bytes():
+    """Peak RSS since the last reset_peak_rss() (VmHWM), else the process peak."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return peak_rss_bytes()
+
+
+class StageProfiler:
+    """Records wall time, peak RSS and peak traced memory (numpy/pandas allocations included) per stage.
+
+    `trace=False` skips tracemalloc (its bookkeeping slows allocation-heavy
+    stages), leaving wall time and RSS only. Tracing started by the profiler
+    is stopped again by report().
+
+    Usage:
+        profiler = StageProfiler()
+        with profiler.stage('load'):
+            ...
+        profiler.report()
+    """
+
+    def __init__(self, enabled=True, trace=True):
+        self.enabled = enabled
+        self.trace = trace
+        self.stages = []
+        self._started_tracing = False
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        if self.trace:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+        reset_peak_rss()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = {
+                'stage': name,
+                'seconds': time.perf_counter() - started,
+                'peak_rss_bytes': stage_peak_rss_bytes(),
+            }
+            if self.trace:
+                current, peak = tracemalloc.get_traced_memory()
+                record.update(peak_bytes=peak - base, retained_bytes=current - base)
+            self.stages.append(record)
+
+    def to_json(self):
+        return json.dumps({'stages': self.stages, 'peak_rss_bytes': peak_rss_bytes()})
+
+    def report(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        if not self.enabled or not self.stages:
+            return
+        print("📏 Time and peak memory per stage:")
+        for s in self.stages:
+            traced = (f"   peak {_format_bytes(s['peak_bytes']):>10}   retained {_format_bytes(s['retained_bytes']):>10}"
+                      if 'peak_bytes' in s else "")
+            print(f"   {s['stage']:<16} {s['seconds']:>8.2f}s   RSS {_format_bytes(s['peak_rss_bytes']):>10}{traced}")
+        print(f"   process peak RSS {_format_bytes(peak_rss_bytes())}")
@@ -1,12 +1,25 @@
 import os
-import json
+import argparse
 import pandas as pd
 import numpy as np
-from sqlalchemy import create_engine, text
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.preprocessing import MinMaxScaler, MultiLabelBinarizer
+from sqlalchemy import create_engine
 from dotenv import load_dotenv
 
+from als import ALS_CONFIDENCE, ALS_FACTORS, ALS_ITERATIONS, ALS_REGULARIZATION, fit_als, score_users_als
+from ann import IVF_PROBE
+from artifacts import ARTIFACT_CACHE_MAX_BYTES, DEFAULT_CACHE_DIR, ArtifactCache, cache_key, frame_fingerprint
+from features import FEATURE_COLUMNS, FEATURE_CONFIG, build_content_features
+from incremental import NEIGHBOR_SIM_TOLERANCE, affected_users, changed_neighbor_items, clear_state, load_state, save_state
+from loader import LOAD_CHUNK_SIZE as DEFAULT_LOAD_CHUNK_SIZE, load_content, load_reviews, missing_columns
+from matrices import build_id_index, build_item_user_matrix, build_rating_matrix
+from model import DEFAULT_MODEL_DIR, popularity_priors, save_model
+from neighbors import NEIGHBORS_K as DEFAULT_NEIGHBORS_K, NeighborLists, build_neighbors, build_neighbors_approx, neighbors_from_matrix
+from parallel import score_users_neighbors_parallel, score_users_parallel
+from profiling import StageProfiler
+from similarity import SIM_TILE_ROWS as DEFAULT_SIM_TILE_ROWS, blocked_cosine, combine_hybrid, fingerprint_matrix
+from scoring import TOP_N, SIM_THRESHOLD
+from writer import replace_user_rows, write_recommendations
+
 # Load environment variables
 basedir = os.path.dirname(os.path.abspath(__file__))
 env_path = os.path.join(basedir, '../../movie-aggregator-backend-nest/.env')
@@ -18,40 +31,79 @@ DB_USER = os.getenv('DB_USER', 'root')
 DB_PASS = os.getenv('DB_PASS', '')
 DB_NAME = os.getenv('DB_NAME', 'warehouse')
 
+# Collaborative model: 'itemknn' (item-item cosine) or 'als' (implicit matrix factorization)
+ENGINE = os.getenv('RECS_ENGINE', 'itemknn')
+# ALS factors per user/item, iterations, L2 regularization and rating confidence weight
+ALS_FACTORS = int(os.getenv('RECS_ALS_FACTORS', ALS_FACTORS))
+ALS_ITERATIONS = int(os.getenv('RECS_ALS_ITERATIONS', ALS_ITERATIONS))
+ALS_REGULARIZATION = float(os.getenv('RECS_ALS_REG', ALS_REGULARIZATION))
+ALS_CONFIDENCE = float(os.getenv('RECS_ALS_CONFIDENCE', ALS_CONFIDENCE))
+# Users scored per matrix product; bounds the dense score buffer to block x items
+USER_BLOCK_SIZE = int(os.getenv('RECS_USER_BLOCK_SIZE', '256'))
+# Scoring processes; 1 scores in this process, 0 uses one per CPU
+SCORING_WORKERS = int(os.getenv('RECS_SCORING_WORKERS', '1'))
+# Hybrid neighbors kept per item; 0 (default) scores against the full items x items
+# matrix. Top-K lists save memory but change rankings unless K >= catalog size.
+NEIGHBORS_K = int(os.getenv('RECS_NEIGHBORS_K', '0'))
+# Content neighbor search in neighbor mode: 'exact' (all pairs, tiled) or 'ivf' (approximate index)
+CONTENT_INDEX = os.getenv('RECS_CONTENT_INDEX', 'exact')
+# IVF inverted lists (0 = sqrt(items)) and lists probed per item
+IVF_LISTS = int(os.getenv('RECS_IVF_LISTS', '0'))
+IVF_PROBE = int(os.getenv('RECS_IVF_PROBE', IVF_PROBE))
+# Similarities at or below this floor are ignored when scoring
+SIM_FLOOR = float(os.getenv('RECS_SIM_FLOOR', SIM_THRESHOLD))
+# Item rows per similarity tile (exact mode and neighbor building)
+SIM_TILE_ROWS = int(os.getenv('RECS_SIM_TILE_ROWS', DEFAULT_SIM_TILE_ROWS))
+# Directory for memory-mapped similarity matrices in exact mode (unset = in RAM)
+SIM_DIR = os.getenv('RECS_SIM_DIR')
+# Where incremental runs keep the review watermark and previous neighbor lists
+STATE_DIR = os.getenv('RECS_STATE_DIR', os.path.join(basedir, '.recs-state'))
+# Neighbor similarity drift below this does not trigger rescoring
+NEIGHBOR_TOLERANCE = float(os.getenv('RECS_NEIGHBOR_TOLERANCE', NEIGHBOR_SIM_TOLERANCE))
+# How the save step loads rows: 'insert' (multi-row INSERT) or 'load-data' (LOAD DATA LOCAL INFILE)
+WRITE_METHOD = os.getenv('RECS_WRITE_METHOD', 'insert')
+# Rows per fetch from the server-side cursor when loading reviews/content
+LOAD_CHUNK_SIZE = int(os.getenv('RECS_LOAD_CHUNK_SIZE', DEFAULT_LOAD_CHUNK_SIZE))
+# Content-addressed cache of feature/similarity artifacts ('' disables it)
+CACHE_DIR = os.getenv('RECS_CACHE_DIR', DEFAULT_CACHE_DIR) or None
+# Size the artifact cache may grow to before least recently used files are evicted
+CACHE_MAX_BYTES = int(os.getenv('RECS_CACHE_MAX_MB', ARTIFACT_CACHE_MAX_BYTES // 1024 ** 2)) * 1024 ** 2
+# Model artifact for the on-demand scorer (serving.py); '' disables it
+MODEL_DIR = os.getenv('RECS_MODEL_DIR', DEFAULT_MODEL_DIR) or None
+# Print time and peak memory per stage at the end of a run
+MEMORY_REPORT = os.getenv('RECS_MEMORY_REPORT', '0') == '1'
+
 # Connect to Database
 db_url = f"mysql+pymysql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-engine = create_engine(db_url)
+engine = create_engine(db_url, connect_args={'local_infile': True} if WRITE_METHOD == 'load-data' else {})
 
-def parse_json_feature(json_data, keys):
-    """Parses JSON string or dict and extracts specific keys as a vector."""
-    if not json_data:
-        return [0] * len(keys)
-    
-    if isinstance(json_data, str):
-        try:
-            data = json.loads(json_data)
-        except:
-            return [0] * len(keys)
-    else:
-        data = json_data
-        
-    return [float(data.get(k, 0)) for k in keys]
+def train_recommender(full=False, engine_name=ENGINE, db=None, profiler=None):
+    """One training run against `db` (the MySQL engine by default).
 
-def train_recommender():
-    print("🚀 Starting Hybrid ML Recommendation Engine...")
+    `profiler` collects per-stage time and memory; bench.py passes its own
+    and reads the stages back instead of the printed report.
+    """
+    print(f"🚀 Starting Hybrid ML Recommendation Engine ({engine_name})...")
+    db = db if db is not None else engine
+    profiler = profiler if profiler is not None else StageProfiler(enabled=MEMORY_REPORT)
+    cache = ArtifactCache(CACHE_DIR, CACHE_MAX_BYTES)
 
     # ---------------------------------------------------------
     # 1. Fetch Data
     # ---------------------------------------------------------
     print("📥 Fetching data from database...")
     
-    # Fetch Reviews
-    reviews_query = "SELECT user_id, content_id, rating FROM reviews WHERE rating IS NOT NULL"
-    reviews_df = pd.read_sql(reviews_query, engine)
+    missing = missing_columns(db)
+    if missing:
+        for table, columns in missing.items():
+            print(f"❌ Table '{table}' is missing columns: {', '.join(columns)}")
+        return
     
-    # Fetch Content Features
-    content_query = "SELECT id, title, genre, emotional_cloud, perception_map, hype_index, avg_rating FROM content"
-    content_df = pd.read_sql(content_query, engine)
+    with profiler.stage('load'):
+        # Stream both tables through a server-side cursor in compact dtypes
+        # (uint32 ids, float32 ratings, categorical genre)
+        reviews_df = load_reviews(db, LOAD_CHUNK_SIZE)
+        content_df = load_content(db, LOAD_CHUNK_SIZE)
     
     if content_df.empty:
         print("⚠️ No content found. Exiting.")
@@ -59,164 +111,270 @@ def train_recommender():
 
     print(f"📊 Loaded {len(reviews_df)} reviews and {len(content_df)} content items.")
 
+    # All matrices below share this item order (content_id -> row/column)
+    item_ids = content_df['id'].to_numpy()
+    item_index = build_id_index(item_ids)
+
     # ---------------------------------------------------------
     # 2. Content-Based Filtering (Feature Engineering)
     # ---------------------------------------------------------
     print("🧠 Building Content-Based Model...")
     
-    # A. Genre Features
-    content_df['genre_list'] = content_df['genre'].apply(lambda x: [g.strip() for g in x.split(',')] if x else [])
-    mlb = MultiLabelBinarizer()
-    genre_matrix = mlb.fit_transform(content_df['genre_list'])
+    # Content metadata rarely changes: features (and the similarities built
+    # from them) are cached under a hash of the content rows + feature config
+    features_key = cache_key(content=frame_fingerprint(content_df, FEATURE_COLUMNS), features=FEATURE_CONFIG)
     
-    # B. Emotional Features
-    emotion_keys = ['joy', 'sadness', 'anger', 'fear', 'surprise', 'disgust', 'anticipation', 'trust', 'awe', 'tension', 'excitement']
-    content_df['emotions_vec'] = content_df['emotional_cloud'].apply(lambda x: parse_json_feature(x, emotion_keys))
-    emotion_matrix = np.array(content_df['emotions_vec'].tolist())
+    with profiler.stage('features'):
+        # Genre multi-hot + MinMax-scaled emotion/perception vectors, parsed
+        # column-wise in one pass (float32 so similarities are float32 too)
+        content_features = cache.get_or_build(
+            'features', features_key,
+            lambda: {'features': build_content_features(content_df)},
+            config=FEATURE_CONFIG,
+        )['features']
     
-    # Normalize emotions (0-1)
-    scaler = MinMaxScaler()
-    if emotion_matrix.shape[0] > 0:
-        emotion_matrix = scaler.fit_transform(emotion_matrix)
-
-    # C. Perception Features
-    perception_keys = ['plot', 'acting', 'visuals', 'soundtrack', 'originality', 'pacing', 'atmosphere']
-    content_df['perception_vec'] = content_df['perception_map'].apply(lambda x: parse_json_feature(x, perception_keys))
-    perception_matrix = np.array(content_df['perception_vec'].tolist())
-    
-    if perception_matrix.shape[0] > 0:
-        perception_matrix = scaler.fit_transform(perception_matrix)
-
-    # Combine Features: Genre (0.3) + Emotions (0.4) + Perception (0.3)
-    # We concatenate them and let cosine similarity handle it, but weighting helps.
-    # Let's just concatenate for now, assuming equal importance of dimensions, 
-    # but since genre is sparse binary and others are dense continuous, we might want to weight them.
-    
-    # Simple concatenation
-    content_features = np.hstack([genre_matrix, emotion_matrix, perception_matrix])
-    
-    # Compute Content Similarity Matrix
-    content_sim_matrix = cosine_similarity(content_features)
-    content_sim_df = pd.DataFrame(content_sim_matrix, index=content_df['id'], columns=content_df['id'])
+    # Hybrid Weight: 70% Collaborative (if available), 30% Content
+    # If no reviews, 100% Content
+    alpha = 0.7 if not reviews_df.empty else 0.0
+    # With ALS the collaborative part comes from the factors, so the
+    # similarities below stay content-only and alpha is applied when scoring
+    sim_alpha = alpha if engine_name == 'itemknn' else 0.0
     
-    print("✅ Content-Based Similarity calculated.")
-
-    # ---------------------------------------------------------
-    # 3. Collaborative Filtering (Item-Item)
-    # ---------------------------------------------------------
-    print("🤝 Building Collaborative Filtering Model...")
+    neighbor_lists = None
+    item_user_matrix = None
     
-    collab_sim_df = pd.DataFrame(0, index=content_df['id'], columns=content_df['id'])
+    if not reviews_df.empty and engine_name == 'itemknn':
+        # Sparse Item-User matrix aligned with all content IDs; unrated
+        # items are empty rows instead of a dense block of zeros
+        item_user_matrix = build_item_user_matrix(reviews_df, item_index)
+    elif reviews_df.empty:
+        print("⚠️ No reviews yet. Using pure Content-Based Filtering.")
     
-    if not reviews_df.empty:
-        # Create User-Item Matrix
-        user_item_matrix = reviews_df.pivot_table(index='user_id', columns='content_id', values='rating').fillna(0)
+    if NEIGHBORS_K > 0:
+        # ---------------------------------------------------------
+        # 3-4. Hybrid Top-K Neighbor Lists
+        # ---------------------------------------------------------
+        # Only similarities above the scoring threshold are ever used, so keep
+        # the best NEIGHBORS_K per item, computed tile by tile (O(N*K) memory)
+        print(f"🤝 Building Hybrid Top-{NEIGHBORS_K} Neighbor Lists...")
         
-        # Align with all content IDs (fill missing items with 0)
-        # This ensures the matrix has all items even if not rated
-        all_content_ids = content_df['id'].unique()
-        user_item_matrix = user_item_matrix.reindex(columns=all_content_ids, fill_value=0)
+        neighbors_config = {
+            'collab_weight': sim_alpha,
+            'content_weight': round(1 - sim_alpha, 6),
+            'k': NEIGHBORS_K,
+            'floor': SIM_FLOOR,
+            'content_index': CONTENT_INDEX,
+        }
+        if CONTENT_INDEX == 'ivf':
+            neighbors_config.update(ivf_lists=IVF_LISTS, ivf_probe=IVF_PROBE)
+        neighbors_key = cache_key(
+            features=features_key,
+            ratings=fingerprint_matrix(item_user_matrix) if item_user_matrix is not None else None,
+            **neighbors_config,
+        )
         
-        # Compute Item-Item Similarity
-        # Transpose to get Item-User matrix
-        item_user_matrix = user_item_matrix.T
-        collab_sim_matrix = cosine_similarity(item_user_matrix)
-        collab_sim_df = pd.DataFrame(collab_sim_matrix, index=item_user_matrix.index, columns=item_user_matrix.index)
+        def build():
+            if CONTENT_INDEX == 'ivf':
+                # Content candidates from the IVF index, collab candidates from
+                # co-rated items; exact hybrid similarity for those pairs only
+                built = build_neighbors_approx(
+                    content_features, item_user_matrix, sim_alpha,
+                    k=NEIGHBORS_K, floor=SIM_FLOOR, tile_rows=SIM_TILE_ROWS,
+                    n_lists=IVF_LISTS or None, n_probe=IVF_PROBE,
+                )
+            else:
+                built = build_neighbors(
+                    content_features, item_user_matrix, sim_alpha,
+                    k=NEIGHBORS_K, floor=SIM_FLOOR, tile_rows=SIM_TILE_ROWS,
+                )
+            return {'indices': built.indices, 'sims': built.sims}
         
-        print("✅ Collaborative Similarity calculated.")
+        with profiler.stage('neighbors'):
+            arrays = cache.get_or_build('neighbors', neighbors_key, build, config=neighbors_config)
+            neighbor_lists = NeighborLists(arrays['indices'], arrays['sims'])
+        
+        print(f"✅ Neighbor lists built ({neighbor_lists.nbytes / 1024 ** 2:.1f} MB).")
     else:
-        print("⚠️ No reviews yet. Using pure Content-Based Filtering.")
+        # With RECS_SIM_DIR set, similarities are written tile by tile to
+        # memory-mapped files and reused while their inputs are unchanged
+        sim_path = (lambda name: os.path.join(SIM_DIR, name)) if SIM_DIR else (lambda name: None)
+        
+        with profiler.stage('content_sim'):
+            # Compute Content Similarity Matrix (items x items, float32);
+            # memmapped files already reuse themselves, in RAM it goes through the cache
+            if SIM_DIR:
+                content_sim = blocked_cosine(content_features, sim_path('content_sim.f32'), SIM_TILE_ROWS)
+            else:
+                content_sim = cache.get_or_build(
+                    'content_sim', cache_key(features=features_key, similarity='cosine'),
+                    lambda: {'sim': blocked_cosine(content_features, None, SIM_TILE_ROWS)},
+                    config={'similarity': 'cosine'},
+                )['sim']
+        
+        print("✅ Content-Based Similarity calculated.")
 
-    # ---------------------------------------------------------
-    # 4. Hybridization
-    # ---------------------------------------------------------
-    print("DNA Combining Models (Hybrid Approach)...")
-    
-    # Hybrid Weight: 70% Collaborative (if available), 30% Content
-    # If no reviews, 100% Content
-    alpha = 0.7 if not reviews_df.empty else 0.0
-    
-    # Ensure indices match
-    hybrid_sim_df = alpha * collab_sim_df + (1 - alpha) * content_sim_df
+        # ---------------------------------------------------------
+        # 3. Collaborative Filtering (Item-Item)
+        # ---------------------------------------------------------
+        print("🤝 Building Collaborative Filtering Model...")
+        
+        collab_sim = None
+        
+        if item_user_matrix is not None:
+            with profiler.stage('collab_sim'):
+                # Compute Item-Item Similarity
+                collab_sim = blocked_cosine(item_user_matrix, sim_path('collab_sim.f32'), SIM_TILE_ROWS)
+            
+            print("✅ Collaborative Similarity calculated.")
+
+        # ---------------------------------------------------------
+        # 4. Hybridization
+        # ---------------------------------------------------------
+        print("DNA Combining Models (Hybrid Approach)...")
+        
+        with profiler.stage('hybrid'):
+            # hybrid = alpha * collab + (1 - alpha) * content, masked at the floor.
+            # In memory it overwrites content_sim, so no extra N x N copy is kept.
+            hybrid_sim = combine_hybrid(
+                content_sim, collab_sim, sim_alpha, floor=SIM_FLOOR,
+                out=None if SIM_DIR else content_sim,
+                path=sim_path('hybrid_sim.f32'), tile_rows=SIM_TILE_ROWS,
+            )
+            del content_sim, collab_sim
     
     # ---------------------------------------------------------
     # 5. Generate Recommendations
     # ---------------------------------------------------------
     print("🔮 Generating Recommendations...")
     
-    recommendations = []
-    
-    # Get all users (including those who might not have reviews if we had a users table, 
-    # but here we only iterate over users who have reviews. 
-    # For new users, we should have a separate 'popular' strategy or handle them in the API request)
+    recs_df = pd.DataFrame()
+    user_ids = np.empty(0, dtype=np.int64)
+    removed_users = np.empty(0, dtype=np.int64)
     
-    # We will generate recommendations for all users found in reviews
-    unique_users = reviews_df['user_id'].unique() if not reviews_df.empty else []
+    # Incremental runs only rescore users whose reviews or neighbor lists changed
+    # (neighbor mode only: exact mode has no per-item lists to diff, so every
+    # exact run is a full rebuild)
+    state = None
+    if not full and neighbor_lists is None and engine_name == 'itemknn':
+        print("ℹ️ Incremental runs need neighbor lists (RECS_NEIGHBORS_K > 0). Rescoring all users.")
+    elif not full and neighbor_lists is not None and engine_name == 'itemknn':
+        state = load_state(STATE_DIR)
+        if state is not None and reviews_df.empty:
+            removed_users = state.user_ids
     
-    for user_id in unique_users:
-        # Get items user has rated
-        user_ratings = reviews_df[reviews_df['user_id'] == user_id]
-        rated_items = dict(zip(user_ratings['content_id'], user_ratings['rating']))
-        
-        scores = {}
-        
-        # For every item in the catalog
-        for item_id in content_df['id']:
-            if item_id in rated_items:
-                continue # Skip already seen
-            
-            # Calculate score based on similarity to rated items
-            weighted_sum = 0
-            similarity_sum = 0
+    # We generate recommendations for all users found in reviews.
+    # New users are scored on demand by serving.py from the model artifact.
+    if not reviews_df.empty:
+        with profiler.stage('scoring'):
+            user_ids, ratings, rated = build_rating_matrix(reviews_df, item_index)
             
-            for rated_item_id, rating in rated_items.items():
-                if rated_item_id not in hybrid_sim_df.index:
-                    continue
-                    
-                sim = hybrid_sim_df.loc[item_id, rated_item_id]
-                
-                # Only consider positive similarities
-                if sim > 0.1: 
-                    weighted_sum += sim * rating
-                    similarity_sum += sim
+            if state is not None:
+                changed_items = changed_neighbor_items(state, item_ids, neighbor_lists, NEIGHBOR_TOLERANCE)
+                if changed_items is None:
+                    print("ℹ️ Catalog changed since the last run. Rescoring all users.")
+                    state = None
+                else:
+                    rows, removed_users = affected_users(state, reviews_df, user_ids, rated, changed_items)
+                    print(f"♻️ Incremental run: {len(rows)} of {len(user_ids)} users changed, "
+                          f"{int(changed_items.sum())} neighbor lists changed.")
+                    user_ids, ratings, rated = user_ids[rows], ratings[rows], rated[rows]
             
-            if similarity_sum > 0:
-                predicted_score = weighted_sum / similarity_sum
-                scores[item_id] = predicted_score
+            # Score all users at once, USER_BLOCK_SIZE users per matrix product;
+            # with several workers the similarity is put in shared memory once
+            # and blocks are fanned out to a process pool (same output order)
+            if engine_name == 'als':
+                # Compact user/item factors; each user block is one dense
+                # factor product blended with the content-based prediction
+                model = fit_als(
+                    ratings, rated, factors=ALS_FACTORS, iterations=ALS_ITERATIONS,
+                    regularization=ALS_REGULARIZATION, confidence=ALS_CONFIDENCE,
+                )
+                print(f"🧮 ALS factors learned ({model.nbytes / 1024 ** 2:.1f} MB).")
+                user_rows, item_rows, scores = score_users_als(
+                    model, ratings, rated,
+                    neighbor_lists.to_csr() if neighbor_lists is not None else hybrid_sim,
+                    alpha=alpha, k=TOP_N, block_size=USER_BLOCK_SIZE,
+                )
+            elif neighbor_lists is not None:
+                user_rows, item_rows, scores = score_users_neighbors_parallel(
+                    neighbor_lists.to_csr(), ratings, rated,
+                    k=TOP_N, block_size=USER_BLOCK_SIZE, workers=SCORING_WORKERS,
+                )
             else:
-                # Fallback to content popularity/hype if no similarity found
-                # (This helps with serendipity)
-                scores[item_id] = 0
-        
-        # Top 20
-        top_items = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:20]
-        
-        for item_id, score in top_items:
-            recommendations.append({
-                'user_id': user_id,
-                'content_id': item_id,
-                'score': score,
-                'reason': 'На основе ваших предпочтений'
+                user_rows, item_rows, scores = score_users_parallel(
+                    hybrid_sim, ratings, rated,
+                    k=TOP_N, block_size=USER_BLOCK_SIZE, workers=SCORING_WORKERS,
+                )
+            
+            recs_df = pd.DataFrame({
+                'user_id': user_ids[user_rows],
+                'content_id': item_ids[item_rows],
+                'score': scores,
+                'reason': 'На основе ваших предпочтений',
             })
 
     # ---------------------------------------------------------
     # 6. Save to Database
     # ---------------------------------------------------------
-    if recommendations:
-        print(f"💾 Saving {len(recommendations)} recommendations to database...")
+    if state is not None:
+        print(f"💾 Upserting {len(recs_df)} recommendations for {len(user_ids)} users...")
         
-        recs_df = pd.DataFrame(recommendations)
+        with profiler.stage('save'):
+            # Only the affected users' rows are replaced
+            replace_user_rows(db, recs_df, np.concatenate([user_ids, removed_users]))
         
-        # Add an ID column to match NestJS entity
-        recs_df['id'] = range(1, len(recs_df) + 1)
-
-        # Use 'replace' to handle schema changes (e.g. adding 'reason' column)
-        # Note: This drops Foreign Keys, but for a read-heavy table it's acceptable in this context.
-        recs_df.to_sql('recommendations', engine, if_exists='replace', index=False)
+        print("✅ Recommendations updated successfully!")
+    elif not recs_df.empty:
+        print(f"💾 Saving {len(recs_df)} recommendations to database...")
+        
+        with profiler.stage('save'):
+            # Load a staging table and swap it in atomically: readers never see a
+            # half-written table, and the schema (AUTO_INCREMENT id, FKs) is kept
+            write_recommendations(db, recs_df, method=WRITE_METHOD)
             
         print("✅ Recommendations saved successfully!")
     else:
         print("⚠️ No recommendations generated.")
 
+    if MODEL_DIR:
+        with profiler.stage('model'):
+            # Neighbor lists + id maps + popularity priors, memory-mapped by serving.py.
+            # In exact mode the lists are cut from the hybrid matrix at the default K.
+            model_lists = neighbor_lists
+            if model_lists is None:
+                model_lists = neighbors_from_matrix(hybrid_sim, DEFAULT_NEIGHBORS_K, SIM_FLOOR, SIM_TILE_ROWS)
+            popularity, popular = popularity_priors(content_df, reviews_df)
+            model_bytes = save_model(
+                MODEL_DIR, item_ids, model_lists, popularity, popular,
+                config={'engine': engine_name, 'collab_weight': sim_alpha, 'floor': SIM_FLOOR},
+            )
+        print(f"📦 Model artifact saved to {MODEL_DIR} ({model_bytes / 1024 ** 2:.1f} MB).")
+
+    if engine_name == 'itemknn' and neighbor_lists is not None:
+        save_state(STATE_DIR, reviews_df, item_ids, neighbor_lists)
+    else:
+        # ALS factors change on every fit and exact mode keeps no neighbor
+        # lists, so whatever state is on disk no longer matches the table
+        clear_state(STATE_DIR)
+
+    profiler.report()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="CineVibe hybrid recommender")
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Rebuild recommendations for every user instead of only the changed ones "
+             "(incremental runs need RECS_NEIGHBORS_K > 0; exact mode and als are always full)",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=["itemknn", "als"],
+        default=ENGINE,
+        help="Collaborative model: item-item cosine neighbors or ALS matrix factorization (always a full run)",
+    )
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    train_recommender()
+    args = parse_args()
+    train_recommender(full=args.full, engine_name=args.engine)
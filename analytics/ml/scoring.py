@@ -0,0 +1,139 @@
+import numpy as np
+
+# Scoring defaults (kept identical to the original per-user loop)
+TOP_N = 20
+SIM_THRESHOLD = 0.1
+USER_BLOCK_SIZE = 256
+# Predictions are rounded before ranking so that mathematically equal scores
+# tie (and fall back to catalog order) regardless of summation order and
+# float32 similarity noise
+SCORE_DECIMALS = 6
+
+
+def top_k(scores, k):
+    """Indices of the k best scores, highest first, ties broken by lower index.
+
+    Entries set to -inf are never returned. This reproduces
+    sorted(..., reverse=True)[:k] over the catalog order.
+    """
+    valid = np.count_nonzero(scores > -np.inf)
+    k = min(k, valid)
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+
+    kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+    above = np.flatnonzero(scores > kth)
+    ties = np.flatnonzero(scores == kth)[:k - len(above)]
+    idx = np.concatenate([above, ties])
+    return idx[np.lexsort((idx, -scores[idx]))]
+
+
+def score_users(sim, ratings, rated, k=TOP_N, threshold=SIM_THRESHOLD,
+                block_size=USER_BLOCK_SIZE, premasked=False):
+    """Predicts top-k items for every user with blocked matrix products.
+
+    `sim` is the items x items hybrid similarity, masked in place at
+    `threshold` unless `premasked` (e.g. a memmap from combine_hybrid()).
+    `ratings`/`rated` come from matrices.build_rating_matrix(). For item i
+    the prediction is sum(sim * rating) / sum(sim) over the user's rated items
+    with sim > threshold, or 0 if there are none. Already rated items are
+    excluded. Users are processed `block_size` rows at a time so the dense
+    score buffer stays bounded.
+
+    Returns (user_rows, item_indices, scores) as flat numpy arrays.
+    """
+    if not premasked:
+        sim[sim <= threshold] = 0
+    masked_t = sim.T
+
+    out_users, out_items, out_scores = [], [], []
+    n_users = ratings.shape[0]
+
+    for start in range(0, n_users, block_size):
+        stop = min(start + block_size, n_users)
+        weighted = np.asarray(ratings[start:stop] @ masked_t)
+        sim_sum = np.asarray(rated[start:stop] @ masked_t)
+
+        scores = np.zeros_like(weighted)
+        np.divide(weighted, sim_sum, out=scores, where=sim_sum > 0)
+        np.round(scores, SCORE_DECIMALS, out=scores)
+        block_rated = rated[start:stop]
+        scores[block_rated.nonzero()] = -np.inf
+
+        for offset, row in enumerate(scores):
+            idx = top_k(row, k)
+            out_users.append(np.full(len(idx), start + offset, dtype=np.int64))
+            out_items.append(idx)
+            out_scores.append(row[idx])
+
+    if not out_users:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0)
+
+    return np.concatenate(out_users), np.concatenate(out_items), np.concatenate(out_scores)
+
+
+def _top_k_sparse(cand_idx, cand_scores, rated_idx, k):
+    """top_k() for a row where every item outside `cand_idx` scores 0.
+
+    Positive candidates are ranked first; the rest of the list is filled with
+    the lowest-index unrated items, exactly as the dense path orders zeros.
+    """
+    keep = ~np.isin(cand_idx, rated_idx)
+    cand_idx, cand_scores = cand_idx[keep], cand_scores[keep]
+
+    positive = cand_scores > 0
+    pos_idx, pos_scores = cand_idx[positive], cand_scores[positive]
+    order = np.lexsort((pos_idx, -pos_scores))[:k]
+    idx, scores = pos_idx[order], pos_scores[order]
+
+    need = k - len(idx)
+    if need > 0:
+        excluded = np.union1d(rated_idx, pos_idx)
+        fill = np.setdiff1d(np.arange(need + len(excluded)), excluded)[:need]
+        idx = np.concatenate([idx, fill])
+        scores = np.concatenate([scores, np.zeros(len(fill))])
+    return idx, scores
+
+
+def score_users_neighbors(neighbor_csr, ratings, rated, k=TOP_N, block_size=USER_BLOCK_SIZE):
+    """score_users() against top-K neighbor lists instead of the full matrix.
+
+    `neighbor_csr` is NeighborLists.to_csr(): row j holds sim(j, i) for the
+    neighbors i of item j, already above the similarity floor. The products
+    stay sparse, so the cost per user is O(history * K) rather than O(items).
+    Items outside every neighbor list of the user's history score 0.
+    """
+    n_items = neighbor_csr.shape[0]
+    out_users, out_items, out_scores = [], [], []
+    n_users = ratings.shape[0]
+
+    for start in range(0, n_users, block_size):
+        stop = min(start + block_size, n_users)
+        block_rated = rated[start:stop]
+        sim_sum = (block_rated @ neighbor_csr).tocsr()
+        weighted = (ratings[start:stop] @ neighbor_csr).tocsr()
+        sim_sum.sort_indices()
+        weighted.sort_indices()
+
+        for offset in range(stop - start):
+            s_lo, s_hi = sim_sum.indptr[offset], sim_sum.indptr[offset + 1]
+            w_lo, w_hi = weighted.indptr[offset], weighted.indptr[offset + 1]
+            cand_idx = sim_sum.indices[s_lo:s_hi]
+
+            # weighted drops exact zeros (0 ratings), so align it onto sim_sum
+            w_full = np.zeros(len(cand_idx))
+            w_full[np.searchsorted(cand_idx, weighted.indices[w_lo:w_hi])] = weighted.data[w_lo:w_hi]
+            cand_scores = np.round(w_full / sim_sum.data[s_lo:s_hi], SCORE_DECIMALS)
+
+            rated_idx = block_rated.indices[block_rated.indptr[offset]:block_rated.indptr[offset + 1]]
+            idx, scores = _top_k_sparse(cand_idx, cand_scores, rated_idx, min(k, n_items - len(rated_idx)))
+            out_users.append(np.full(len(idx), start + offset, dtype=np.int64))
+            out_items.append(idx.astype(np.int64))
+            out_scores.append(scores)
+
+    if not out_users:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0)
+
+    return np.concatenate(out_users), np.concatenate(out_items), np.concatenate(out_scores)
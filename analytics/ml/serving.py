@@ -0,0 +1,296 @@
+"""On-demand recommendations from the saved model artifact (model.py).
+
+Scores an arbitrary list of (content_id, rating) pairs against the
+memory-mapped neighbor lists, the same prediction as the nightly run:
+sum(sim * rating) / sum(sim) over the rated items that list a candidate as
+a neighbor. Users without ratings get the current content_popularity
+trending scores from ClickHouse (or the artifact's popularity prior when
+ClickHouse is unavailable). Nothing is loaded per request, so a call costs
+O(history * K) and stays in the low milliseconds.
+
+    python serving.py                      # http://127.0.0.1:8765
+    curl -X POST localhost:8765/recommend -d '{"ratings": [[12, 9.5], [40, 7]], "limit": 20}'
+
+The artifact is reloaded when a training run replaces it.
+"""
+import argparse
+import json
+import math
+import os
+import threading
+import time
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from model import DEFAULT_MODEL_DIR, MANIFEST, load_model
+from scoring import SCORE_DECIMALS, TOP_N
+
+PERSONAL_REASON = 'На основе ваших предпочтений'
+POPULAR_REASON = 'Популярное сейчас'
+
+MODEL_DIR = os.getenv('RECS_MODEL_DIR') or DEFAULT_MODEL_DIR
+SERVE_HOST = os.getenv('RECS_SERVE_HOST', '127.0.0.1')
+SERVE_PORT = int(os.getenv('RECS_SERVE_PORT', '8765'))
+# Seconds between checks for a new artifact and between trending refreshes
+MODEL_CHECK_INTERVAL = float(os.getenv('RECS_MODEL_CHECK_INTERVAL', '5'))
+TRENDING_TTL = float(os.getenv('RECS_TRENDING_TTL', '300'))
+# Ratings accepted per request (longer histories are cut to the most recent)
+MAX_HISTORY = int(os.getenv('RECS_MAX_HISTORY', '1000'))
+# Largest list a request may ask for (larger limits are clamped)
+MAX_LIMIT = int(os.getenv('RECS_MAX_LIMIT', '100'))
+# content_id is UInt32 in ClickHouse; anything larger cannot be a real item
+MAX_CONTENT_ID = 2 ** 32 - 1
+
+CLICKHOUSE_URL = (
+    f"http://{os.getenv('CLICKHOUSE_HOST', 'localhost')}:{os.getenv('CLICKHOUSE_PORT', '8123')}/"
+)
+CLICKHOUSE_DB = os.getenv('CLICKHOUSE_DB', 'analytics')
+TRENDING_LIMIT = 1000
+
+
+def score_history(artifact, positions, ratings, k=TOP_N):
+    """Top-k (positions, scores) for one rating history, highest first.
+
+    `positions`/`ratings` are the rated catalog positions (unique) and
+    their ratings. Rated items are excluded, ties go to the lower catalog
+    position; only candidates with a positive score are returned.
+    """
+    if len(positions) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+
+    idx = np.asarray(artifact.neighbor_indices[positions])
+    sims = np.asarray(artifact.neighbor_sims[positions], dtype=np.float64)
+    valid = idx >= 0
+    cand, inverse = np.unique(idx[valid], return_inverse=True)
+    weighted = np.bincount(inverse, (sims * ratings[:, None])[valid], minlength=len(cand))
+    sim_sum = np.bincount(inverse, sims[valid], minlength=len(cand))
+    scores = np.round(weighted / sim_sum, SCORE_DECIMALS)
+
+    keep = ~np.isin(cand, positions) & (scores > 0)
+    cand, scores = cand[keep], scores[keep]
+    order = np.lexsort((cand, -scores))[:k]
+    return cand[order], scores[order]
+
+
+class TrendingCache:
+    """Latest content_popularity scores from ClickHouse, refreshed every `ttl` seconds.
+
+    Uses the HTTP interface directly; an unreachable server or an empty
+    table yields None and the caller falls back to the artifact prior.
+    """
+
+    def __init__(self, ttl=TRENDING_TTL, limit=TRENDING_LIMIT):
+        self.ttl = ttl
+        self.limit = limit
+        self.content_ids = None
+        self.fetched_at = 0.0
+        self.lock = threading.Lock()
+
+    def _fetch(self):
+        query = (
+            f"SELECT content_id FROM {CLICKHOUSE_DB}.content_popularity FINAL "
+            f"WHERE date = (SELECT max(date) FROM {CLICKHOUSE_DB}.content_popularity) "
+            f"ORDER BY popularity_score DESC, content_id LIMIT {self.limit} FORMAT TabSeparated"
+        )
+        url = CLICKHOUSE_URL + '?' + urllib.parse.urlencode({'query': query})
+        with urllib.request.urlopen(url, timeout=2) as response:
+            lines = response.read().decode().split()
+        return np.array([int(line) for line in lines], dtype=np.int64) if lines else None
+
+    def get(self):
+        with self.lock:
+            if time.monotonic() - self.fetched_at >= self.ttl:
+                try:
+                    self.content_ids = self._fetch()
+                except (OSError, ValueError) as exc:
+                    print(f"⚠️ Trending scores unavailable ({exc}); using popularity priors.")
+                    self.content_ids = None
+                self.fetched_at = time.monotonic()
+            return self.content_ids
+
+
+class OnlineScorer:
+    """Top-N for arbitrary rating lists from the artifact in `model_dir`.
+
+    The artifact is memory-mapped once and swapped for a newer one when its
+    manifest changes (checked at most every `check_interval` seconds).
+    """
+
+    def __init__(self, model_dir=MODEL_DIR, trending=None, check_interval=MODEL_CHECK_INTERVAL):
+        self.model_dir = model_dir
+        self.trending = trending if trending is not None else TrendingCache()
+        self.check_interval = check_interval
+        self.artifact = None
+        self.loaded_mtime = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+        self._maybe_reload(force=True)
+
+    def _maybe_reload(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.checked_at < self.check_interval:
+            return
+        with self.lock:
+            self.checked_at = now
+            try:
+                mtime = os.stat(os.path.join(self.model_dir, MANIFEST)).st_mtime_ns
+            except OSError:
+                return
+            if mtime == self.loaded_mtime:
+                return
+            artifact = load_model(self.model_dir)
+            if artifact is not None:
+                self.artifact, self.loaded_mtime = artifact, mtime
+                print(f"📦 Loaded model artifact ({artifact.n_items} items, "
+                      f"k={artifact.manifest['k']}, {artifact.manifest['created_at']}).")
+
+    def _popular(self, artifact, exclude, k):
+        """Popular unrated positions: trending content first, then the prior order."""
+        trending = self.trending.get()
+        trending = artifact.positions(trending) if trending is not None else np.empty(0, dtype=np.int64)
+        # Enough prior-ordered items to fill k even if every trending one is excluded
+        prior = np.asarray(artifact.popular[:k + len(exclude)], dtype=np.int64)
+        merged = np.concatenate([trending[trending >= 0], prior])
+        _, first = np.unique(merged, return_index=True)
+        merged = merged[np.sort(first)]
+        return merged[~np.isin(merged, exclude)][:k]
+
+    def recommend(self, pairs, limit=TOP_N):
+        """[{content_id, score, reason}] for a list of (content_id, rating) pairs.
+
+        Personal scores come first; the rest of the list is filled with
+        popular items at score 0. Unknown content ids are ignored and a
+        repeated id keeps its last rating.
+        """
+        self._maybe_reload()
+        artifact = self.artifact
+        if artifact is None:
+            raise LookupError(f"No model artifact in {self.model_dir}; run recommender.py first")
+
+        pairs = list(pairs)[-MAX_HISTORY:]
+        content_ids = np.array([int(c) for c, _ in pairs], dtype=np.int64)
+        ratings = np.array([float(r) for _, r in pairs], dtype=np.float64)
+        positions = artifact.positions(content_ids)
+        known = positions >= 0
+        positions, ratings = positions[known], ratings[known]
+        # Last rating wins for repeated items
+        _, last = np.unique(positions[::-1], return_index=True)
+        last = len(positions) - 1 - last
+        positions, ratings = positions[last], ratings[last]
+
+        idx, scores = score_history(artifact, positions, ratings, limit)
+        items = [
+            {'content_id': int(artifact.item_ids[i]), 'score': float(s), 'reason': PERSONAL_REASON}
+            for i, s in zip(idx, scores)
+        ]
+        need = min(limit, artifact.n_items - len(positions)) - len(items)
+        if need > 0:
+            fill = self._popular(artifact, np.concatenate([positions, idx]), need)
+            items += [
+                {'content_id': int(artifact.item_ids[i]), 'score': 0.0, 'reason': POPULAR_REASON}
+                for i in fill
+            ]
+        return items
+
+
+def _parse_pairs(ratings):
+    """Accepts [[content_id, rating], ...] or [{"content_id": .., "rating": ..}, ...].
+
+    Returns (int, float) pairs; raises ValueError naming the bad entry, so the
+    handler answers 400 instead of failing inside the scorer.
+    """
+    if not isinstance(ratings, list):
+        raise ValueError("'ratings' must be a list")
+    pairs = []
+    for n, entry in enumerate(ratings):
+        if isinstance(entry, dict):
+            content_id, rating = entry.get('content_id'), entry.get('rating')
+        elif isinstance(entry, list) and len(entry) == 2:
+            content_id, rating = entry
+        else:
+            raise ValueError(f"ratings[{n}] must be [content_id, rating] or an object")
+        if isinstance(content_id, bool) or not isinstance(content_id, int) or not 0 < content_id <= MAX_CONTENT_ID:
+            raise ValueError(f"ratings[{n}]: content_id must be an integer in 1..{MAX_CONTENT_ID}, got {content_id!r}")
+        if isinstance(rating, bool) or not isinstance(rating, (int, float)) or not math.isfinite(rating):
+            raise ValueError(f"ratings[{n}]: rating must be a finite number, got {rating!r}")
+        pairs.append((int(content_id), float(rating)))
+    return pairs
+
+
+def _parse_limit(value):
+    """Requested list length, clamped to 1..MAX_LIMIT; ValueError if not an integer."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value != int(value):
+        raise ValueError(f"'limit' must be an integer, got {value!r}")
+    return max(1, min(int(value), MAX_LIMIT))
+
+
+def make_handler(scorer):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, body):
+            payload = json.dumps(body, ensure_ascii=False).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path != '/health':
+                self._send(404, {'error': 'not found'})
+                return
+            artifact = scorer.artifact
+            self._send(200, {
+                'status': 'ok' if artifact is not None else 'no-model',
+                'model': artifact.manifest if artifact is not None else None,
+            })
+
+        def do_POST(self):
+            if self.path != '/recommend':
+                self._send(404, {'error': 'not found'})
+                return
+            started = time.perf_counter()
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                if not isinstance(body, dict):
+                    raise ValueError("body must be a JSON object")
+                pairs = _parse_pairs(body.get('ratings') or [])
+                limit = _parse_limit(body.get('limit', TOP_N))
+            except (ValueError, KeyError, TypeError, OverflowError) as exc:
+                self._send(400, {'error': f"bad request: {exc}"})
+                return
+            try:
+                items = scorer.recommend(pairs, limit)
+            except LookupError as exc:
+                self._send(503, {'error': str(exc)})
+                return
+            self._send(200, {'items': items, 'took_ms': round((time.perf_counter() - started) * 1000, 3)})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve on-demand recommendations from the model artifact")
+    parser.add_argument("--host", default=SERVE_HOST)
+    parser.add_argument("--port", type=int, default=SERVE_PORT)
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    args = parser.parse_args()
+
+    scorer = OnlineScorer(args.model_dir)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(scorer))
+    print(f"🌐 Serving recommendations on http://{args.host}:{args.port} (model: {args.model_dir})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
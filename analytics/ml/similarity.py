@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+# Item rows per similarity tile; a tile is tile_rows x items float32
+SIM_TILE_ROWS = 1024
+
+
+def normalize_rows(matrix):
+    """L2-normalizes rows once so cosine similarity becomes a plain dot product.
+
+    Dense input becomes a float32 ndarray, sparse input a float32 CSR matrix.
+    All-zero rows stay zero (cosine 0 against everything, as in sklearn).
+    """
+    if sparse.issparse(matrix):
+        return normalize(sparse.csr_matrix(matrix, dtype=np.float32), norm='l2', copy=False)
+    return normalize(np.asarray(matrix, dtype=np.float32), norm='l2', copy=False)
+
+
+def iter_hybrid_tiles(content_norm, collab_norm=None, alpha=0.0, tile_rows=SIM_TILE_ROWS):
+    """Yields (start, stop, tile) row tiles of the hybrid item-item similarity.
+
+    tile = alpha * collab + (1 - alpha) * content for rows start:stop against
+    every item, computed from pre-normalized features (see normalize_rows).
+    Only one tile_rows x items float32 block is alive at a time.
+    """
+    n_items = content_norm.shape[0]
+    content_t = np.ascontiguousarray(content_norm.T)
+    collab_t = collab_norm.T.tocsr() if collab_norm is not None else None
+
+    for start in range(0, n_items, tile_rows):
+        stop = min(start + tile_rows, n_items)
+        tile = content_norm[start:stop] @ content_t
+        tile *= (1 - alpha)
+        if collab_t is not None and alpha:
+            collab_tile = (collab_norm[start:stop] @ collab_t).toarray()
+            collab_tile *= alpha
+            tile += collab_tile
+        yield start, stop, tile
+
+
+def fingerprint_matrix(matrix):
+    """Stable hash of a dense or sparse matrix (shape, dtype and values)."""
+    h = hashlib.sha1(f"{matrix.shape}:{matrix.dtype}".encode())
+    if sparse.issparse(matrix):
+        matrix = sparse.csr_matrix(matrix)
+        matrix.sort_indices()
+        for part in (matrix.indptr, matrix.indices, matrix.data):
+            h.update(np.ascontiguousarray(part))
+    else:
+        h.update(np.ascontiguousarray(matrix))
+    return h.hexdigest()
+
+
+def _meta_path(path):
+    return path + '.json'
+
+
+def _load_cached(path, fingerprint, n_items):
+    """Opens a finished similarity memmap read-only if it was built from the same input."""
+    try:
+        with open(_meta_path(path)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('fingerprint') != fingerprint or meta.get('shape') != [n_items, n_items]:
+        return None
+    if not os.path.exists(path):
+        return None
+    return np.memmap(path, dtype=np.float32, mode='r', shape=(n_items, n_items))
+
+
+def _allocate(path, n_items):
+    if path is None:
+        return np.empty((n_items, n_items), dtype=np.float32)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # Drop the old metadata first so a crash mid-write never looks reusable
+    if os.path.exists(_meta_path(path)):
+        os.remove(_meta_path(path))
+    return np.memmap(path, dtype=np.float32, mode='w+', shape=(n_items, n_items))
+
+
+def blocked_cosine(matrix, path=None, tile_rows=SIM_TILE_ROWS):
+    """Row-tiled cosine similarity of `matrix` rows, optionally out of core.
+
+    Rows are normalized once and the items x items float32 result is filled
+    tile_rows rows at a time. With `path` the result is a numpy.memmap on local
+    disk (plus a `<path>.json` fingerprint), so only one tile has to fit in
+    RAM, and a later call with unchanged input reopens the file read-only
+    instead of recomputing it.
+    """
+    n_items = matrix.shape[0]
+    fingerprint = None
+    if path is not None:
+        fingerprint = fingerprint_matrix(matrix)
+        cached = _load_cached(path, fingerprint, n_items)
+        if cached is not None:
+            return cached
+
+    norm = normalize_rows(matrix)
+    norm_t = norm.T.tocsr() if sparse.issparse(norm) else np.ascontiguousarray(norm.T)
+    out = _allocate(path, n_items)
+
+    for start in range(0, n_items, tile_rows):
+        stop = min(start + tile_rows, n_items)
+        tile = norm[start:stop] @ norm_t
+        out[start:stop] = tile.toarray() if sparse.issparse(tile) else tile
+
+    if path is not None:
+        out.flush()
+        with open(_meta_path(path), 'w') as f:
+            json.dump({'fingerprint': fingerprint, 'shape': [n_items, n_items], 'dtype': 'float32'}, f)
+    return out
+
+
+def combine_hybrid(content_sim, collab_sim=None, alpha=0.0, floor=None, out=None,
+                   path=None, tile_rows=SIM_TILE_ROWS):
+    """alpha * collab + (1 - alpha) * content, tile by tile.
+
+    Values at or below `floor` are zeroed on the way, so the result is already
+    masked for scoring. The result goes to `out` (may be `content_sim` itself
+    for an in-place combine), a new memmap at `path`, or a new array.
+    """
+    n_items = content_sim.shape[0]
+    if out is None:
+        out = _allocate(path, n_items)
+
+    for start in range(0, n_items, tile_rows):
+        stop = min(start + tile_rows, n_items)
+        tile = np.array(content_sim[start:stop], dtype=np.float32)
+        tile *= (1 - alpha)
+        if collab_sim is not None:
+            tile += alpha * collab_sim[start:stop]
+        if floor is not None:
+            tile[tile <= floor] = 0
+        out[start:stop] = tile
+
+    if isinstance(out, np.memmap):
+        out.flush()
+    return out
@@ -0,0 +1,253 @@
+"""Near-real-time recommendation refresh from the `reviews` Kafka topic.
+
+Keeps the model artifact of the last training run (model.py) memory-mapped
+and, for every micro-batch of review events, rescores the affected users
+with the same neighbor-list prediction as the nightly run and replaces their
+rows in `recommendations`. Events only say which users to rescore: their
+histories are always read back from `reviews`, so a replayed or late event
+can't bring back a rating that was edited or deleted since. A batch costs
+one SELECT of the users' reviews and one DELETE + multi-row INSERT
+transaction, however many events it holds; offsets are committed only
+after the write (at-least-once, and replaying an event is harmless).
+
+    python stream_refresh.py                                  # Kafka, topic `reviews`
+    python stream_refresh.py --file events.jsonl --follow     # file-backed stand-in
+
+The file source reads one event (the Kafka message value) per line and
+remembers its position in `<file>.offset`.
+"""
+import argparse
+import json
+import os
+import time
+
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from model import DEFAULT_MODEL_DIR
+from serving import OnlineScorer
+from scoring import TOP_N
+from writer import replace_user_rows
+
+KAFKA_BOOTSTRAP = os.getenv('KAFKA_BOOTSTRAP', 'localhost:9092')
+KAFKA_TOPIC = os.getenv('RECS_STREAM_TOPIC', 'reviews')
+KAFKA_GROUP = os.getenv('RECS_STREAM_GROUP', 'recs-refresh')
+MODEL_DIR = os.getenv('RECS_MODEL_DIR') or DEFAULT_MODEL_DIR
+# A micro-batch is written once it holds this many events or its oldest event waited this long
+STREAM_BATCH_SIZE = int(os.getenv('RECS_STREAM_BATCH_SIZE', '500'))
+STREAM_MAX_WAIT = float(os.getenv('RECS_STREAM_MAX_WAIT', '1.0'))
+
+REVIEW_EVENTS = {'review_created', 'review_updated', 'rating_changed', 'review_deleted'}
+
+
+def _parse_event(raw):
+    """One JSON event from a message value or file line; None (logged) if malformed."""
+    try:
+        return json.loads(raw)
+    except ValueError:
+        text_value = raw.decode('utf-8', 'replace') if isinstance(raw, bytes) else raw
+        print(f"⚠️ Skipping malformed event: {text_value.strip()[:80]}")
+        return None
+
+
+class KafkaSource:
+    """Review events from Kafka (kafka-python); offsets committed after each written batch."""
+
+    def __init__(self, bootstrap=KAFKA_BOOTSTRAP, topic=KAFKA_TOPIC, group=KAFKA_GROUP,
+                 batch_size=STREAM_BATCH_SIZE):
+        from kafka import KafkaConsumer
+
+        self.batch_size = batch_size
+        self.consumer = KafkaConsumer(
+            topic,
+            bootstrap_servers=bootstrap.split(','),
+            group_id=group,
+            enable_auto_commit=False,
+            auto_offset_reset='latest',
+        )
+
+    def poll(self, timeout):
+        # Decoded here rather than by a value_deserializer: a malformed message
+        # would raise inside poll() on every restart, since its offset is
+        # never committed
+        records = self.consumer.poll(timeout_ms=int(timeout * 1000), max_records=self.batch_size)
+        events = (_parse_event(record.value) for batch in records.values() for record in batch if record.value)
+        return [event for event in events if event is not None]
+
+    def commit(self):
+        self.consumer.commit()
+
+    def close(self):
+        self.consumer.close()
+
+
+class FileSource:
+    """JSON-lines stand-in for the topic: one event per line, position kept in `<path>.offset`.
+
+    Without `follow` poll() returns None at the end of the file, which ends the run.
+    """
+
+    def __init__(self, path, follow=False, batch_size=STREAM_BATCH_SIZE):
+        self.path = path
+        self.follow = follow
+        self.batch_size = batch_size
+        self.offset_path = f"{path}.offset"
+        try:
+            with open(self.offset_path) as f:
+                self.committed = int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            self.committed = 0
+        self.file = open(path, encoding='utf-8')
+        self.file.seek(self.committed)
+        self.position = self.committed
+
+    def poll(self, timeout):
+        events = []
+        while len(events) < self.batch_size:
+            line = self.file.readline()
+            if not line or (self.follow and not line.endswith('\n')):
+                # End of file, or a line the writer has not finished yet
+                self.file.seek(self.position)
+                break
+            self.position = self.file.tell()
+            event = _parse_event(line) if line.strip() else None
+            if event is not None:
+                events.append(event)
+        if not events:
+            if not self.follow:
+                return None
+            time.sleep(timeout)
+        return events
+
+    def commit(self):
+        tmp = f"{self.offset_path}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(str(self.position))
+        os.replace(tmp, self.offset_path)
+        self.committed = self.position
+
+    def close(self):
+        self.file.close()
+
+
+def load_histories(engine, user_ids):
+    """Current rated content reviews of `user_ids` (in id order, so the last rating wins)."""
+    query = text(
+        "SELECT user_id, content_id, rating FROM reviews "
+        "WHERE rating IS NOT NULL AND content_id IS NOT NULL AND user_id IN :users ORDER BY id"
+    ).bindparams(bindparam('users', expanding=True))
+    with engine.connect() as conn:
+        return pd.read_sql(query, conn, params={'users': [int(u) for u in user_ids]})
+
+
+def apply_events(histories, events):
+    """{user_id: {content_id: rating}} for every user the batch's events mention.
+
+    The database rows are the truth: an event is only published after its
+    review is written, so `histories` (read after the batch) already holds
+    its effect and every later edit. Event ratings are not applied, since a
+    replayed or late event would otherwise restore an outdated rating. Users
+    whose reviews are all gone get an empty history; events without a user
+    or content id are ignored.
+    """
+    per_user = {int(event['user_id']): {} for event in events if _is_review_event(event)}
+    for row in histories.dropna(subset=['content_id']).itertuples(index=False):
+        per_user.setdefault(int(row.user_id), {})[int(row.content_id)] = float(row.rating)
+    return per_user
+
+
+def refresh_users(engine, scorer, events, limit=TOP_N):
+    """Rescores the users of `events` and replaces their rows; returns (users, rows)."""
+    user_ids = list(dict.fromkeys(int(e['user_id']) for e in events if _is_review_event(e)))
+    per_user = apply_events(load_histories(engine, user_ids), events)
+
+    rows = []
+    for user_id in user_ids:
+        pairs = list(per_user.get(user_id, {}).items())
+        # Users left without ratings drop out, as they would in the nightly run
+        if pairs:
+            rows += [{'user_id': user_id, **item} for item in scorer.recommend(pairs, limit)]
+
+    recs_df = pd.DataFrame(rows, columns=['user_id', 'content_id', 'score', 'reason'])
+    replace_user_rows(engine, recs_df, user_ids)
+    return len(user_ids), len(recs_df)
+
+
+def _is_review_event(event):
+    return (
+        isinstance(event, dict)
+        and event.get('event_type') in REVIEW_EVENTS
+        and event.get('user_id') is not None
+        and event.get('content_id') is not None
+    )
+
+
+def _lag_seconds(events):
+    """Age of the oldest event in the batch, from its event_time (None if unknown)."""
+    times = pd.to_datetime([e.get('event_time') for e in events], errors='coerce', utc=True)
+    oldest = times.min()
+    return None if pd.isna(oldest) else (pd.Timestamp.now(tz='UTC') - oldest).total_seconds()
+
+
+def run(source, engine, scorer, batch_size=STREAM_BATCH_SIZE, max_wait=STREAM_MAX_WAIT):
+    """Consumes `source` until it is exhausted (file source) or interrupted."""
+    pending, first_at = [], None
+
+    def flush():
+        started = time.perf_counter()
+        n_users, n_rows = refresh_users(engine, scorer, pending)
+        source.commit()
+        lag = _lag_seconds(pending)
+        lag_note = f", event lag {lag:.2f}s" if lag is not None else ""
+        print(f"🔄 {len(pending)} events -> {n_users} users, {n_rows} rows "
+              f"in {(time.perf_counter() - started) * 1000:.0f} ms{lag_note}")
+
+    try:
+        while True:
+            # Poll no longer than the buffered batch may still wait
+            wait = max_wait if first_at is None else max_wait - (time.monotonic() - first_at)
+            events = source.poll(max(wait, 0.01))
+            if events is None:
+                break
+            relevant = [e for e in events if _is_review_event(e)]
+            if relevant and first_at is None:
+                first_at = time.monotonic()
+            pending += relevant
+            if not relevant and not pending:
+                # Nothing buffered: irrelevant events can be acknowledged right away
+                source.commit()
+            if pending and (len(pending) >= batch_size or time.monotonic() - first_at >= max_wait):
+                flush()
+                pending, first_at = [], None
+        if pending:
+            flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        source.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh recommendations from review events")
+    parser.add_argument("--file", help="Read events from a JSON-lines file instead of Kafka")
+    parser.add_argument("--follow", action="store_true", help="Keep waiting for new lines (with --file)")
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--batch-size", type=int, default=STREAM_BATCH_SIZE)
+    parser.add_argument("--max-wait", type=float, default=STREAM_MAX_WAIT, help="Seconds a batch may wait")
+    args = parser.parse_args()
+
+    from recommender import engine
+
+    scorer = OnlineScorer(args.model_dir)
+    if scorer.artifact is None:
+        print(f"❌ No model artifact in {args.model_dir}; run recommender.py first.")
+        return
+    source = (FileSource(args.file, args.follow, batch_size=args.batch_size) if args.file
+              else KafkaSource(batch_size=args.batch_size))
+    print(f"👂 Refreshing recommendations from {args.file or f'{KAFKA_BOOTSTRAP}/{KAFKA_TOPIC}'} "
+          f"(batches of {args.batch_size} events / {args.max_wait}s)")
+    run(source, engine, scorer, args.batch_size, args.max_wait)
+
+
+if __name__ == "__main__":
+    main()
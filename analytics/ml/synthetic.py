@@ -0,0 +1,92 @@
+"""Synthetic `content` and `reviews` tables for benchmarks and engine comparisons.
+
+Shapes and dtypes follow the MySQL tables as loader.py reads them; the
+defaults of every knob reproduce the data the existing scripts were tuned on.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from features import EMOTION_KEYS, PERCEPTION_KEYS
+
+GENRES = ['Drama', 'Comedy', 'Action', 'Thriller', 'Horror', 'Sci-Fi', 'Romance', 'Animation', 'Documentary', 'Crime']
+
+
+def synthetic_content(n_items, seed=0, key_density=0.8, null_rate=0.05, broken_rate=0.02,
+                      extra_keys=0, max_genres=3):
+    """Content rows shaped like the MySQL table, including NULL and broken JSON.
+
+    Each JSON document holds every known key with probability `key_density`
+    plus `extra_keys` keys the feature pipeline ignores (larger documents);
+    `null_rate` / `broken_rate` of the documents are NULL / invalid JSON.
+    """
+    rng = np.random.default_rng(seed)
+    extra = [f"extra_{i}" for i in range(extra_keys)]
+
+    def doc(keys):
+        roll = rng.random()
+        if roll < null_rate:
+            return None
+        if roll < null_rate + broken_rate:
+            return '{broken'
+        values = {k: int(rng.integers(0, 100)) for k in keys if rng.random() < key_density}
+        if extra:
+            values.update({k: int(v) for k, v in zip(extra, rng.integers(0, 100, len(extra)))})
+        return json.dumps(values)
+
+    genres = [
+        ', '.join(rng.choice(GENRES, rng.integers(0, max_genres + 1), replace=False)) or None
+        for _ in range(n_items)
+    ]
+    return pd.DataFrame({
+        'id': np.arange(1, n_items + 1, dtype=np.uint32),
+        'genre': pd.Series(genres, dtype='category'),
+        'emotional_cloud': [doc(EMOTION_KEYS) for _ in range(n_items)],
+        'perception_map': [doc(PERCEPTION_KEYS) for _ in range(n_items)],
+        'hype_index': rng.uniform(0, 100, n_items).astype(np.float32),
+        'avg_rating': rng.uniform(0, 10, n_items).astype(np.float32),
+    })
+
+
+def synthetic_reviews(n_users, n_items, seed=0, dims=8, mean_reviews=15, latent=True):
+    """Reviews with Zipf item popularity and about `mean_reviews` reviews per user.
+
+    With `latent` the choices and ratings follow a latent taste model, so
+    there is something to learn (O(users * items), for quality comparisons);
+    without it items are drawn by popularity alone in one vectorized pass,
+    which scales to benchmark sizes.
+    """
+    rng = np.random.default_rng(seed)
+    if not latent:
+        return _popularity_reviews(rng, n_users, n_items, mean_reviews)
+
+    users = rng.standard_normal((n_users, dims))
+    items = rng.standard_normal((n_items, dims))
+    popularity = rng.zipf(1.5, n_items).clip(max=1000).astype(float)
+
+    rows = []
+    for u in range(n_users):
+        n = int(min(rng.geometric(1 / mean_reviews), n_items))
+        affinity = items @ users[u]
+        p = np.exp(affinity - affinity.max()) * popularity
+        chosen = rng.choice(n_items, n, replace=False, p=p / p.sum())
+        ratings = np.clip(np.round(6 + affinity[chosen] + rng.normal(0, 1, n), 1), 0, 10)
+        rows.append(pd.DataFrame({'user_id': u + 1, 'content_id': chosen + 1, 'rating': ratings}))
+
+    reviews = pd.concat(rows, ignore_index=True)
+    return reviews.astype({'user_id': 'uint32', 'content_id': 'uint32', 'rating': 'float32'})
+
+
+def _popularity_reviews(rng, n_users, n_items, mean_reviews):
+    popularity = rng.zipf(1.5, n_items).clip(max=1000).astype(float)
+    quality = rng.normal(6, 1.5, n_items)
+    counts = np.minimum(rng.geometric(1 / mean_reviews, n_users), n_items)
+
+    user_ids = np.repeat(np.arange(1, n_users + 1), counts)
+    content_ids = rng.choice(n_items, len(user_ids), p=popularity / popularity.sum()) + 1
+    reviews = pd.DataFrame({'user_id': user_ids, 'content_id': content_ids})
+    # Drawn with replacement: keep one review per (user, item)
+    reviews = reviews.drop_duplicates(ignore_index=True)
+    reviews['rating'] = np.clip(np.round(quality[reviews['content_id'] - 1] + rng.normal(0, 1.5, len(reviews)), 1), 0, 10)
+    return reviews.astype({'user_id': 'uint32', 'content_id': 'uint32', 'rating': 'float32'})
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+# ml/ scripts import each other as top-level modules (`from scoring import ...`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from features import build_content_features  # noqa: E402
+from matrices import build_id_index, build_item_user_matrix, build_rating_matrix  # noqa: E402
+from synthetic import synthetic_content, synthetic_reviews  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def catalog():
+    """A small synthetic catalog with the matrices train_recommender() builds from it."""
+    content_df = synthetic_content(300, seed=1)
+    reviews_df = synthetic_reviews(400, 300, seed=1)
+    item_ids = content_df['id'].to_numpy()
+    item_index = build_id_index(item_ids)
+    user_ids, ratings, rated = build_rating_matrix(reviews_df, item_index)
+    return {
+        'content_df': content_df,
+        'reviews_df': reviews_df,
+        'item_ids': item_ids,
+        'features': build_content_features(content_df),
+        'item_user': build_item_user_matrix(reviews_df, item_index),
+        'user_ids': user_ids,
+        'ratings': ratings,
+        'rated': rated,
+    }
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+from incremental import affected_users, changed_neighbor_items, clear_state, load_state, save_state
+from matrices import build_id_index, build_rating_matrix
+from neighbors import NeighborLists
+
+ITEM_IDS = np.array([10, 20, 30, 40])
+
+
+def _reviews(rows):
+    return pd.DataFrame(rows, columns=['user_id', 'content_id', 'rating', 'changed_at']).astype(
+        {'changed_at': 'datetime64[ns]'}
+    )
+
+
+def _neighbors():
+    indices = np.array([[1, 2], [0, -1], [0, 3], [2, -1]], dtype=np.int32)
+    sims = np.array([[0.9, 0.5], [0.9, 0], [0.5, 0.4], [0.4, 0]], dtype=np.float32)
+    return NeighborLists(indices, sims)
+
+
+def _previous_run(tmp_path):
+    reviews_df = _reviews([
+        (1, 10, 8.0, '2026-01-01'),
+        (2, 20, 6.0, '2026-01-01'),
+        (3, 40, 9.0, '2026-01-02'),
+        (4, 30, 7.0, '2026-01-01'),
+    ])
+    save_state(tmp_path, reviews_df, ITEM_IDS, _neighbors())
+    return load_state(tmp_path)
+
+
+def test_state_round_trip_and_clear(tmp_path):
+    state = _previous_run(tmp_path)
+    assert state.watermark == pd.Timestamp('2026-01-02')
+    np.testing.assert_array_equal(state.item_ids, ITEM_IDS)
+    np.testing.assert_array_equal(state.neighbor_indices, _neighbors().indices)
+
+    clear_state(tmp_path)
+    assert load_state(tmp_path) is None
+
+
+def test_changed_neighbor_items(tmp_path):
+    state = _previous_run(tmp_path)
+    lists = _neighbors()
+    assert not changed_neighbor_items(state, ITEM_IDS, lists).any()
+
+    lists.sims[2, 1] += 1e-7  # drift within the tolerance
+    lists.indices[3] = [1, -1]
+    lists.sims[1, 0] -= 0.01
+    np.testing.assert_array_equal(changed_neighbor_items(state, ITEM_IDS, lists), [False, True, False, True])
+
+    assert changed_neighbor_items(state, np.array([10, 20, 30]), lists) is None
+    assert changed_neighbor_items(state, ITEM_IDS[::-1], lists) is None
+
+
+def test_affected_users(tmp_path):
+    state = _previous_run(tmp_path)
+    # User 1 edits a rating, user 2 is untouched, user 3 deletes their only review,
+    # user 4 is untouched but rated an item whose neighbors changed, user 5 is new
+    reviews_df = _reviews([
+        (1, 10, 5.0, '2026-01-03'),
+        (2, 20, 6.0, '2026-01-01'),
+        (4, 30, 7.0, '2026-01-01'),
+        (5, 40, 3.0, '2026-01-03'),
+    ])
+    user_ids, _, rated = build_rating_matrix(reviews_df, build_id_index(ITEM_IDS))
+    changed_items = np.array([False, False, True, False])
+
+    rows, removed = affected_users(state, reviews_df, user_ids, rated, changed_items)
+    assert sorted(user_ids[rows]) == [1, 4, 5]
+    assert list(removed) == [3]
+
+    rows, _ = affected_users(state, reviews_df, user_ids, rated, np.zeros(4, dtype=bool))
+    assert sorted(user_ids[rows]) == [1, 5]
@@ -0,0 +1,31 @@
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from loader import REVIEWS_DTYPES, _compact, load_reviews
+
+
+def test_load_reviews_skips_reviews_without_content_id(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE reviews (id INTEGER PRIMARY KEY, user_id INT NOT NULL, content_id INT NULL, "
+            "movie_id INT NULL, rating DECIMAL(3, 1) NULL, created_at DATETIME)"
+        ))
+        conn.execute(text(
+            "INSERT INTO reviews (user_id, content_id, movie_id, rating, created_at) VALUES "
+            "(1, 10, NULL, 8.5, '2026-01-01'), (1, NULL, 7, 6.0, '2026-01-01'), "
+            "(2, 20, NULL, NULL, '2026-01-01'), (2, 30, NULL, 4.0, '2026-01-02')"
+        ))
+
+    reviews_df = load_reviews(engine)
+
+    assert list(zip(reviews_df['user_id'], reviews_df['content_id'])) == [(1, 10), (2, 30)]
+    assert reviews_df['content_id'].dtype == 'uint32'
+    assert reviews_df['rating'].tolist() == [8.5, 4.0]
+
+
+def test_compact_drops_rows_with_null_integer_ids():
+    chunk = pd.DataFrame({'user_id': [1, 2], 'content_id': [10, None], 'rating': [5.0, 6.0]})
+    compact = _compact(chunk, REVIEWS_DTYPES)
+    assert compact['content_id'].tolist() == [10]
+    assert compact['content_id'].dtype == 'uint32'
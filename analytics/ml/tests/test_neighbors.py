@@ -0,0 +1,77 @@
+import numpy as np
+
+from neighbors import build_neighbors, neighbors_from_matrix
+from scoring import score_users, score_users_neighbors
+from similarity import blocked_cosine, combine_hybrid
+
+ALPHA = 0.7
+FLOOR = 0.1
+
+
+def _hybrid(catalog):
+    return combine_hybrid(
+        blocked_cosine(catalog['features']), blocked_cosine(catalog['item_user']), ALPHA, floor=FLOOR,
+    )
+
+
+def _by_user(user_rows, item_rows, scores):
+    lists = {}
+    for user, item, score in zip(user_rows, item_rows, scores):
+        lists.setdefault(user, []).append((item, score))
+    return lists
+
+
+def _divergence(exact, approx):
+    """(share of users with identical top-N, mean top-N overlap, max score delta on shared items)."""
+    identical, overlap, delta = [], [], 0.0
+    for user, expected in exact.items():
+        got = approx.get(user, [])
+        identical.append([i for i, _ in expected] == [i for i, _ in got])
+        overlap.append(len({i for i, _ in expected} & {i for i, _ in got}) / len(expected))
+        expected_scores = dict(expected)
+        for item, score in got:
+            if item in expected_scores:
+                delta = max(delta, abs(expected_scores[item] - score))
+    return np.mean(identical), np.mean(overlap), delta
+
+
+def test_top_k_matches_exact_mode_when_k_covers_the_catalog(catalog):
+    exact = _by_user(*score_users(_hybrid(catalog), catalog['ratings'], catalog['rated'], premasked=True))
+    n_items = len(catalog['item_ids'])
+
+    lists = build_neighbors(catalog['features'], catalog['item_user'], ALPHA, k=n_items - 1, floor=FLOOR)
+    approx = _by_user(*score_users_neighbors(lists.to_csr(), catalog['ratings'], catalog['rated']))
+
+    identical, overlap, delta = _divergence(exact, approx)
+    assert identical == 1.0
+    assert overlap == 1.0
+    assert delta <= 1e-5
+
+
+def test_top_k_divergence_shrinks_as_k_grows(catalog):
+    exact = _by_user(*score_users(_hybrid(catalog), catalog['ratings'], catalog['rated'], premasked=True))
+    n_items = len(catalog['item_ids'])
+
+    overlaps = []
+    for k in (20, 100, 200, n_items - 1):
+        lists = build_neighbors(catalog['features'], catalog['item_user'], ALPHA, k=k, floor=FLOOR)
+        approx = _by_user(*score_users_neighbors(lists.to_csr(), catalog['ratings'], catalog['rated']))
+        overlaps.append(_divergence(exact, approx)[1])
+
+    # Pruned lists lose contributions outside the top-K, so rankings differ
+    # from exact mode and only converge to it as K approaches the catalog
+    assert overlaps == sorted(overlaps)
+    assert overlaps[0] < 1.0
+    assert overlaps[-1] == 1.0
+
+
+def test_neighbors_from_matrix_matches_build_neighbors(catalog):
+    hybrid = _hybrid(catalog)
+    before = hybrid.copy()
+
+    from_matrix = neighbors_from_matrix(hybrid, k=50, floor=FLOOR, tile_rows=64)
+    built = build_neighbors(catalog['features'], catalog['item_user'], ALPHA, k=50, floor=FLOOR)
+
+    np.testing.assert_array_equal(hybrid, before)
+    np.testing.assert_allclose(from_matrix.sims, built.sims, atol=1e-6)
+    assert (from_matrix.indices == built.indices).mean() > 0.99
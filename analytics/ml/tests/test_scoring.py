@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+from features import build_content_features
+from matrices import build_id_index, build_item_user_matrix, build_rating_matrix
+from scoring import SCORE_DECIMALS, SIM_THRESHOLD, TOP_N, score_users
+from similarity import blocked_cosine, combine_hybrid
+from synthetic import synthetic_content, synthetic_reviews
+
+
+def legacy_recommendations(sim, item_ids, reviews_df):
+    """The original per-user, per-item, per-rated-item loop of recommender.py.
+
+    Scores are rounded to SCORE_DECIMALS before the stable sort, as the
+    vectorized code does, so that equal predictions tie on catalog order
+    instead of on summation noise.
+    """
+    position = {item_id: pos for pos, item_id in enumerate(item_ids)}
+    recommendations = {}
+    for user_id in reviews_df['user_id'].unique():
+        user_ratings = reviews_df[reviews_df['user_id'] == user_id]
+        rated_items = dict(zip(user_ratings['content_id'], user_ratings['rating']))
+        scores = {}
+        for item_id in item_ids:
+            if item_id in rated_items:
+                continue
+            weighted_sum = 0
+            similarity_sum = 0
+            for rated_item_id, rating in rated_items.items():
+                if rated_item_id not in position:
+                    continue
+                s = float(sim[position[item_id], position[rated_item_id]])
+                if s > SIM_THRESHOLD:
+                    weighted_sum += s * rating
+                    similarity_sum += s
+            scores[item_id] = round(weighted_sum / similarity_sum, SCORE_DECIMALS) if similarity_sum > 0 else 0
+        recommendations[user_id] = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:TOP_N]
+    return recommendations
+
+
+def test_score_users_matches_the_legacy_loop():
+    content_df = synthetic_content(60, seed=3)
+    reviews_df = synthetic_reviews(80, 60, seed=3)
+    # A repeated rating (last one wins) and a review of an item outside the catalog
+    reviews_df = pd.concat([
+        reviews_df,
+        pd.DataFrame({'user_id': [1, 2], 'content_id': [reviews_df['content_id'].iloc[0], 999], 'rating': [3.0, 8.0]}),
+    ], ignore_index=True)
+    item_ids = content_df['id'].to_numpy()
+    item_index = build_id_index(item_ids)
+
+    sim = combine_hybrid(
+        blocked_cosine(build_content_features(content_df)),
+        blocked_cosine(build_item_user_matrix(reviews_df, item_index)),
+        0.7,
+    )
+    expected = legacy_recommendations(sim, item_ids, reviews_df)
+
+    user_ids, ratings, rated = build_rating_matrix(reviews_df, item_index)
+    user_rows, item_rows, scores = score_users(sim.copy(), ratings, rated, block_size=16)
+
+    got = {}
+    for user, item, score in zip(user_ids[user_rows], item_ids[item_rows], scores):
+        got.setdefault(user, []).append((item, score))
+
+    assert set(got) == set(expected)
+    for user_id, items in expected.items():
+        assert [i for i, _ in got[user_id]] == [i for i, _ in items], user_id
+        np.testing.assert_allclose([s for _, s in got[user_id]], [s for _, s in items], atol=2 * 10 ** -SCORE_DECIMALS)
@@ -0,0 +1,40 @@
+import pytest
+
+from serving import MAX_LIMIT, _parse_limit, _parse_pairs
+
+
+def test_parse_pairs_accepts_lists_and_objects():
+    pairs = _parse_pairs([[12, 9.5], {'content_id': 40, 'rating': 7}])
+    assert pairs == [(12, 9.5), (40, 7.0)]
+    assert all(isinstance(c, int) and isinstance(r, float) for c, r in pairs)
+
+
+@pytest.mark.parametrize('ratings', [
+    [[1, 'abc']],
+    [[1, None]],
+    [[1, float('nan')]],
+    [[1, True]],
+    [['1', 5]],
+    [[1.5, 5]],
+    [[0, 5]],
+    [[2 ** 70, 5]],
+    [[1]],
+    [{'content_id': 1}],
+    {'1': 5},
+])
+def test_parse_pairs_rejects_malformed_entries(ratings):
+    with pytest.raises(ValueError):
+        _parse_pairs(ratings)
+
+
+def test_parse_limit_clamps_to_range():
+    assert _parse_limit(5) == 5
+    assert _parse_limit(5.0) == 5
+    assert _parse_limit(0) == 1
+    assert _parse_limit(10 ** 30) == MAX_LIMIT
+
+
+@pytest.mark.parametrize('limit', ['5', None, True, 2.5, float('inf'), float('nan'), 1e400])
+def test_parse_limit_rejects_non_integers(limit):
+    with pytest.raises(ValueError):
+        _parse_limit(limit)
@@ -0,0 +1,109 @@
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from stream_refresh import FileSource, KafkaSource, apply_events, refresh_users
+
+
+def _histories(rows):
+    return pd.DataFrame(rows, columns=['user_id', 'content_id', 'rating'])
+
+
+def test_apply_events_keeps_database_ratings():
+    histories = _histories([(1, 10, 4.0), (1, 20, 8.0), (2, 30, 6.0)])
+    events = [
+        # Replayed event from before user 1 edited the rating to 4.0
+        {'event_type': 'rating_changed', 'user_id': 1, 'content_id': 10, 'rating': 9.0},
+        # Late creation event for a review the database no longer has
+        {'event_type': 'review_created', 'user_id': 3, 'content_id': 10, 'rating': 7.0},
+    ]
+
+    per_user = apply_events(histories, events)
+
+    assert per_user[1] == {10: 4.0, 20: 8.0}
+    assert per_user[3] == {}
+
+
+def test_apply_events_skips_rows_and_events_without_ids():
+    histories = _histories([(1, 10, 4.0), (1, None, 6.0)])
+    events = [
+        {'event_type': 'review_created', 'user_id': 1, 'content_id': 10, 'rating': 4.0},
+        # Movie review: movie_id only
+        {'event_type': 'review_created', 'user_id': 2, 'content_id': None, 'movie_id': 7, 'rating': 6.0},
+    ]
+
+    assert apply_events(histories, events) == {1: {10: 4.0}}
+
+
+class _Scorer:
+    def __init__(self):
+        self.calls = []
+
+    def recommend(self, pairs, limit):
+        self.calls.append(pairs)
+        return [{'content_id': 99, 'score': 1.0, 'reason': 'r'}]
+
+
+def test_refresh_users_rescores_from_the_reviews_table(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE reviews (id INTEGER PRIMARY KEY, user_id INT, content_id INT, rating FLOAT)"))
+        conn.execute(text(
+            "INSERT INTO reviews (user_id, content_id, rating) VALUES (1, 10, 4.0), (1, 20, NULL), (1, NULL, 7.0)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE recommendations (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INT, "
+            "content_id INT, score FLOAT, reason VARCHAR(255))"
+        ))
+        conn.execute(text("INSERT INTO recommendations (user_id, content_id, score) VALUES (1, 50, 2.0), (2, 50, 2.0)"))
+    scorer = _Scorer()
+    events = [
+        {'event_type': 'rating_changed', 'user_id': 1, 'content_id': 10, 'rating': 9.0},
+        {'event_type': 'review_deleted', 'user_id': 2, 'content_id': 30},
+    ]
+
+    assert refresh_users(engine, scorer, events) == (2, 1)
+
+    assert scorer.calls == [[(10, 4.0)]]
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT user_id, content_id FROM recommendations ORDER BY user_id")).fetchall()
+    assert [tuple(r) for r in rows] == [(1, 99)]
+
+
+def test_file_source_polls_at_most_batch_size(tmp_path):
+    path = tmp_path / 'events.jsonl'
+    path.write_text(''.join(f'{{"n": {n}}}\n' for n in range(5)))
+    source = FileSource(str(path), batch_size=2)
+
+    assert [len(source.poll(0)) for _ in range(3)] == [2, 2, 1]
+    assert source.poll(0) is None
+    source.close()
+
+
+class _Record:
+    def __init__(self, value):
+        self.value = value
+
+
+class _Consumer:
+    def __init__(self, values):
+        self.values = values
+
+    def poll(self, timeout_ms, max_records):
+        return {'partition-0': [_Record(v) for v in self.values[:max_records]]}
+
+
+def test_kafka_source_skips_malformed_messages():
+    source = KafkaSource.__new__(KafkaSource)
+    source.batch_size = 10
+    source.consumer = _Consumer([b'{"user_id": 1}', b'{broken', b'\xff', None, b'{"user_id": 2}'])
+
+    assert source.poll(0) == [{'user_id': 1}, {'user_id': 2}]
+
+
+def test_file_source_skips_malformed_lines(tmp_path):
+    path = tmp_path / 'events.jsonl'
+    path.write_text('{"n": 1}\n{broken\n\n{"n": 2}\n')
+    source = FileSource(str(path))
+
+    assert source.poll(0) == [{'n': 1}, {'n': 2}]
+    source.close()
@@ -0,0 +1,46 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from writer import RECOMMENDATIONS_TABLE, replace_user_rows, write_recommendations
+
+
+@pytest.fixture
+def engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'recs.db'}")
+
+
+def _recs(rows):
+    return pd.DataFrame(rows, columns=['user_id', 'content_id', 'score', 'reason'])
+
+
+def _table(engine):
+    with engine.connect() as conn:
+        return pd.read_sql(text(f"SELECT id, user_id, content_id, score, reason FROM {RECOMMENDATIONS_TABLE} ORDER BY id"), conn)
+
+
+def test_write_recommendations_swaps_in_a_staged_table(engine):
+    write_recommendations(engine, _recs([(1, 10, 9.5, 'old'), (2, 20, 8.0, 'old')]))
+    recs_df = _recs([(1, 30, 7.25, 'new'), (3, 10, 6.5, None), (3, 20, 0.0, 'new')])
+
+    assert write_recommendations(engine, recs_df, chunk_size=2) == 3
+
+    table = _table(engine)
+    pd.testing.assert_frame_equal(table.drop(columns='id'), recs_df, check_dtype=False)
+    assert list(table['id']) == [1, 2, 3]
+    # Staging and old tables are gone after the swap
+    assert set(inspect(engine).get_table_names()) == {RECOMMENDATIONS_TABLE}
+
+
+def test_write_recommendations_creates_the_table(engine):
+    write_recommendations(engine, _recs([(1, 10, 9.5, 'r')]))
+    assert len(_table(engine)) == 1
+
+
+def test_replace_user_rows_only_touches_given_users(engine):
+    write_recommendations(engine, _recs([(1, 10, 9.0, 'r'), (2, 10, 8.0, 'r'), (3, 10, 7.0, 'r')]))
+
+    replace_user_rows(engine, _recs([(1, 20, 5.0, 'r')]), [1, 3])
+
+    table = _table(engine)
+    assert sorted(zip(table['user_id'], table['content_id'])) == [(1, 20), (2, 10)]
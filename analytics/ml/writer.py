@@ -0,0 +1,184 @@
+import os
+import tempfile
+import time
+
+from sqlalchemy import text
+
+RECOMMENDATIONS_TABLE = 'recommendations'
+STAGING_TABLE = 'recommendations_staging'
+OLD_TABLE = 'recommendations_old'
+
+# Rows per INSERT batch / LOAD DATA file
+WRITE_CHUNK_SIZE = 10000
+
+COLUMNS = ('user_id', 'content_id', 'score', 'reason')
+
+# Canonical schema of the NestJS Recommendation entity. Foreign keys are left
+# unnamed on purpose: MySQL names them <table>_ibfk_N and renames them with the
+# table, so the staging table's keys become recommendations_ibfk_N on swap.
+MYSQL_DDL = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT NOT NULL,
+        content_id INT NOT NULL,
+        score FLOAT NOT NULL,
+        reason VARCHAR(255) NULL,
+        INDEX idx_recommendations_user_score (user_id, score),
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+        FOREIGN KEY (content_id) REFERENCES content(id) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+GENERIC_DDL = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        content_id INTEGER NOT NULL,
+        score FLOAT NOT NULL,
+        reason VARCHAR(255) NULL
+    )
+"""
+
+
+def _is_mysql(engine):
+    return engine.dialect.name == 'mysql'
+
+
+def _create_table(conn, engine, table):
+    ddl = MYSQL_DDL if _is_mysql(engine) else GENERIC_DDL
+    conn.execute(text(ddl.format(table=table)))
+
+
+def _rows(recs_df):
+    """Plain Python tuples in COLUMNS order (DB-API drivers can't bind numpy scalars)."""
+    return list(zip(*(recs_df[c].tolist() for c in COLUMNS)))
+
+
+def _insert_chunk(cursor, table, rows, paramstyle):
+    marker = '%s' if paramstyle in ('format', 'pyformat') else '?'
+    placeholders = ', '.join([marker] * len(COLUMNS))
+    # pymysql turns executemany of a plain INSERT into multi-row INSERT statements
+    cursor.executemany(f"INSERT INTO {table} ({', '.join(COLUMNS)}) VALUES ({placeholders})", rows)
+
+
+def _load_data_chunk(cursor, table, rows):
+    """Loads a chunk with LOAD DATA LOCAL INFILE (needs local_infile on client and server)."""
+    with tempfile.NamedTemporaryFile('w', suffix='.tsv', delete=False, encoding='utf-8') as f:
+        for user_id, content_id, score, reason in rows:
+            reason = '\\N' if reason is None else str(reason).replace('\\', '\\\\').replace('\t', ' ').replace('\n', ' ')
+            f.write(f"{user_id}\t{content_id}\t{score!r}\t{reason}\n")
+        path = f.name
+    try:
+        cursor.execute(
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {table} "
+            f"CHARACTER SET utf8mb4 FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' "
+            f"({', '.join(COLUMNS)})",
+            (path,),
+        )
+    finally:
+        os.remove(path)
+
+
+def _stream_rows(engine, dbapi_conn, table, recs_df, method, chunk_size):
+    """Writes recs_df into `table` chunk by chunk; returns rows written."""
+    rows = _rows(recs_df)
+    paramstyle = engine.dialect.paramstyle
+    cursor = dbapi_conn.cursor()
+    try:
+        if _is_mysql(engine):
+            # Ids come from the snapshot we just scored; skip per-row FK lookups
+            cursor.execute("SET foreign_key_checks = 0")
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            if method == 'load-data' and _is_mysql(engine):
+                _load_data_chunk(cursor, table, chunk)
+            else:
+                _insert_chunk(cursor, table, chunk, paramstyle)
+    finally:
+        # The connection goes back to the pool: never leave FK checks off on it
+        try:
+            if _is_mysql(engine):
+                cursor.execute("SET foreign_key_checks = 1")
+        finally:
+            cursor.close()
+    return len(rows)
+
+
+def _report(label, n_rows, started):
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(f"   {label}: {n_rows} rows in {elapsed:.2f}s ({n_rows / elapsed:,.0f} rows/s)")
+
+
+def write_recommendations(engine, recs_df, method='insert', chunk_size=WRITE_CHUNK_SIZE):
+    """Replaces the whole recommendations table without ever exposing a partial one.
+
+    Rows are streamed into a fresh staging table with the canonical schema
+    (AUTO_INCREMENT id, indexes, foreign keys), then swapped in with a single
+    atomic RENAME TABLE; readers see either the old or the new table.
+    `method` is 'insert' (batched multi-row INSERT) or 'load-data'
+    (LOAD DATA LOCAL INFILE).
+    """
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {STAGING_TABLE}"))
+        _create_table(conn, engine, STAGING_TABLE)
+
+    dbapi_conn = engine.raw_connection()
+    try:
+        n_rows = _stream_rows(engine, dbapi_conn, STAGING_TABLE, recs_df, method, chunk_size)
+        dbapi_conn.commit()
+    finally:
+        dbapi_conn.close()
+    _report('staged', n_rows, started)
+
+    with engine.begin() as conn:
+        exists = engine.dialect.has_table(conn, RECOMMENDATIONS_TABLE)
+        conn.execute(text(f"DROP TABLE IF EXISTS {OLD_TABLE}"))
+        if _is_mysql(engine):
+            if exists:
+                conn.execute(text(
+                    f"RENAME TABLE {RECOMMENDATIONS_TABLE} TO {OLD_TABLE}, "
+                    f"{STAGING_TABLE} TO {RECOMMENDATIONS_TABLE}"
+                ))
+            else:
+                conn.execute(text(f"RENAME TABLE {STAGING_TABLE} TO {RECOMMENDATIONS_TABLE}"))
+        else:
+            # Transactional DDL (SQLite/Postgres): the two renames commit together
+            if exists:
+                conn.execute(text(f"ALTER TABLE {RECOMMENDATIONS_TABLE} RENAME TO {OLD_TABLE}"))
+            conn.execute(text(f"ALTER TABLE {STAGING_TABLE} RENAME TO {RECOMMENDATIONS_TABLE}"))
+        conn.execute(text(f"DROP TABLE IF EXISTS {OLD_TABLE}"))
+
+    _report('swapped', n_rows, started)
+    return n_rows
+
+
+def replace_user_rows(engine, recs_df, user_ids, chunk_size=WRITE_CHUNK_SIZE):
+    """Replaces the rows of `user_ids` only (incremental runs), in one transaction."""
+    started = time.perf_counter()
+    user_ids = [int(u) for u in user_ids]
+    marker = '%s' if engine.dialect.paramstyle in ('format', 'pyformat') else '?'
+
+    with engine.begin() as conn:
+        _create_table(conn, engine, RECOMMENDATIONS_TABLE)
+
+    dbapi_conn = engine.raw_connection()
+    try:
+        cursor = dbapi_conn.cursor()
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            cursor.execute(
+                f"DELETE FROM {RECOMMENDATIONS_TABLE} WHERE user_id IN ({', '.join([marker] * len(chunk))})",
+                chunk,
+            )
+        cursor.close()
+        n_rows = _stream_rows(engine, dbapi_conn, RECOMMENDATIONS_TABLE, recs_df, 'insert', chunk_size)
+        dbapi_conn.commit()
+    except Exception:
+        dbapi_conn.rollback()
+        raise
+    finally:
+        dbapi_conn.close()
+
+    _report('upserted', n_rows, started)
+    return n_rows
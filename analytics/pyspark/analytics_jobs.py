@@ -6,14 +6,19 @@ This module contains multiple PySpark jobs for processing analytics data:
 2. Batch aggregations for daily reports
 3. Content popularity calculations
 4. User behavior analysis
+5. Distributed hybrid recommendations (MySQL -> Spark -> MySQL)
 """
 
 import argparse
 import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+import numpy as np
+import pandas as pd
 from pyspark.sql import SparkSession, DataFrame
 from pyspark.sql import functions as F
 from pyspark.sql.types import (
@@ -28,8 +33,83 @@ CLICKHOUSE_HOST = os.environ.get("CLICKHOUSE_HOST", "localhost")
 CLICKHOUSE_PORT = int(os.environ.get("CLICKHOUSE_PORT", "8123"))
 CLICKHOUSE_DB = os.environ.get("CLICKHOUSE_DB", "analytics")
 
+# HTTP connections kept alive per process (one per concurrent stream is enough)
+CLICKHOUSE_POOL_SIZE = int(os.environ.get("CLICKHOUSE_POOL_SIZE", "8"))
+
+# How micro-batches reach ClickHouse: 'executor' (each partition inserts Arrow
+# blocks itself) or 'driver' (toPandas() on the driver + one insert_df)
+CLICKHOUSE_SINK_MODE = os.environ.get("CLICKHOUSE_SINK_MODE", "executor")
+# Rows per Arrow insert block sent from an executor
+CLICKHOUSE_INSERT_BLOCK_ROWS = int(os.environ.get("CLICKHOUSE_INSERT_BLOCK_ROWS", "100000"))
+
+# Adaptive inserts: block size and partition count follow these targets between batches
+CLICKHOUSE_ADAPTIVE_INSERTS = os.environ.get("CLICKHOUSE_ADAPTIVE_INSERTS", "false").lower() == "true"
+CLICKHOUSE_TARGET_INSERT_MS = float(os.environ.get("CLICKHOUSE_TARGET_INSERT_MS", "1000"))
+CLICKHOUSE_TARGET_PART_ROWS = int(os.environ.get("CLICKHOUSE_TARGET_PART_ROWS", str(CLICKHOUSE_INSERT_BLOCK_ROWS)))
+
 KAFKA_BOOTSTRAP = os.environ.get("KAFKA_BOOTSTRAP", "localhost:9092")
 
+# Streaming triggers: '' = next micro-batch as soon as the previous one ends
+STREAM_TRIGGER_INTERVAL = os.environ.get("STREAM_TRIGGER_INTERVAL", "")
+# Kafka offsets per micro-batch (0 = unbounded); a batch below the minimum
+# waits for more data, at most STREAM_MAX_TRIGGER_DELAY
+STREAM_MAX_OFFSETS_PER_TRIGGER = int(os.environ.get("STREAM_MAX_OFFSETS_PER_TRIGGER", "0"))
+STREAM_MIN_OFFSETS_PER_TRIGGER = int(os.environ.get("STREAM_MIN_OFFSETS_PER_TRIGGER", "0"))
+STREAM_MAX_TRIGGER_DELAY = os.environ.get("STREAM_MAX_TRIGGER_DELAY", "15m")
+# Incremental batch jobs: hours per INSERT chunk, and how long after its end
+# an hour/day counts as closed (room for late events)
+BATCH_CHUNK_HOURS = int(os.environ.get("BATCH_CHUNK_HOURS", "24"))
+BATCH_CLOSE_DELAY_MINUTES = int(os.environ.get("BATCH_CLOSE_DELAY_MINUTES", "10"))
+# Days/chunks a batch job runs against ClickHouse at the same time
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "4"))
+# Trending: popularity_score = sum over the last POPULARITY_WINDOW_DAYS days of
+# POPULARITY_DECAY**age * (views + POPULARITY_REVIEW_WEIGHT * reviews)
+POPULARITY_WINDOW_DAYS = 7
+POPULARITY_DECAY = float(os.environ.get("POPULARITY_DECAY", "0.8"))
+POPULARITY_REVIEW_WEIGHT = float(os.environ.get("POPULARITY_REVIEW_WEIGHT", "10"))
+# In-stream rollups: event-time window size and how late an event may arrive
+STREAM_ROLLUP_WINDOW = os.environ.get("STREAM_ROLLUP_WINDOW", "1 minute")
+STREAM_ROLLUP_WATERMARK = os.environ.get("STREAM_ROLLUP_WATERMARK", "1 minute")
+
+# MySQL (reviews/content source and recommendations target), same env as the backend
+MYSQL_HOST = os.environ.get("DB_HOST", "localhost")
+MYSQL_PORT = int(os.environ.get("DB_PORT", "3306"))
+MYSQL_USER = os.environ.get("DB_USER", "root")
+MYSQL_PASSWORD = os.environ.get("DB_PASS", "")
+MYSQL_DB = os.environ.get("DB_NAME", "warehouse")
+MYSQL_JDBC_URL = os.environ.get(
+    "MYSQL_JDBC_URL",
+    f"jdbc:mysql://{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}?rewriteBatchedStatements=true",
+)
+MYSQL_JDBC_DRIVER = "com.mysql.cj.jdbc.Driver"
+MYSQL_JDBC_PACKAGE = os.environ.get("MYSQL_JDBC_PACKAGE", "com.mysql:mysql-connector-j:8.3.0")
+
+# Recommender parameters (same defaults as analytics/ml/recommender.py);
+# RECS_NEIGHBORS_K=0 keeps every neighbor above the floor (exact mode)
+RECS_TOP_N = 20
+RECS_ALPHA = 0.7
+RECS_NEIGHBORS_K = int(os.environ.get("RECS_NEIGHBORS_K", "0"))
+RECS_SIM_FLOOR = float(os.environ.get("RECS_SIM_FLOOR", "0.1"))
+# Must match SCORE_DECIMALS in analytics/ml/scoring.py (ties fall back to catalog order)
+RECS_SCORE_DECIMALS = 6
+RECS_REASON = "На основе ваших предпочтений"
+# Item rows per similarity tile on an executor (tile = rows x catalog float32)
+RECS_TILE_ROWS = int(os.environ.get("RECS_SPARK_TILE_ROWS", "256"))
+# Users are scored in this many hash buckets (one pandas batch each); 0 = the
+# cluster's default parallelism, more when buckets would exceed RECS_BUCKET_USERS
+RECS_USER_BUCKETS = int(os.environ.get("RECS_USER_BUCKETS", "0"))
+RECS_BUCKET_USERS = int(os.environ.get("RECS_BUCKET_USERS", "50000"))
+# Parallel JDBC writers and rows per JDBC batch
+RECS_WRITE_PARTITIONS = int(os.environ.get("RECS_WRITE_PARTITIONS", "4"))
+RECS_JDBC_BATCH_SIZE = int(os.environ.get("RECS_JDBC_BATCH_SIZE", "10000"))
+
+RECS_TABLE = "recommendations"
+RECS_STAGING_TABLE = "recommendations_staging"
+RECS_OLD_TABLE = "recommendations_old"
+
+EMOTION_KEYS = ["joy", "sadness", "anger", "fear", "surprise", "disgust", "anticipation", "trust", "awe", "tension", "excitement"]
+PERCEPTION_KEYS = ["plot", "acting", "visuals", "soundtrack", "originality", "pacing", "atmosphere"]
+
 # Topic configurations
 TOPICS = {
     "reviews": "reviews",
@@ -71,31 +151,82 @@ CONTENT_EVENT_SCHEMA = StructType([
 
 # ==================== Spark Session ====================
 
-def build_spark(app_name: str = "CineVibeAnalytics") -> SparkSession:
-    """Build Spark session with necessary configurations."""
-    return (
+def build_spark(app_name: str = "CineVibeAnalytics", packages: Optional[List[str]] = None) -> SparkSession:
+    """Build Spark session with necessary configurations.
+
+    SPARK_MASTER (e.g. local[*] or spark://spark-master:7077) is optional;
+    without it spark-submit / pyspark decide, which is local mode for a
+    plain `python analytics_jobs.py`.
+    """
+    builder = (
         SparkSession.builder
         .appName(app_name)
         .config("spark.sql.adaptive.enabled", "true")
         .config("spark.sql.shuffle.partitions", "10")
         .config("spark.streaming.stopGracefullyOnShutdown", "true")
-        .getOrCreate()
     )
+    if os.environ.get("SPARK_MASTER"):
+        builder = builder.master(os.environ["SPARK_MASTER"])
+    if packages:
+        builder = builder.config("spark.jars.packages", ",".join(packages))
+    return builder.getOrCreate()
 
 
 # ==================== ClickHouse Writer ====================
 
+_clickhouse_client = None
+_clickhouse_client_pid = None
+
+
 def get_clickhouse_client():
-    """Get ClickHouse client instance."""
-    import clickhouse_connect
-    return clickhouse_connect.get_client(
-        host=CLICKHOUSE_HOST, 
-        port=CLICKHOUSE_PORT
-    )
+    """Get the process-wide ClickHouse client.
+
+    Created once per process (again after a fork) on a keep-alive HTTP
+    connection pool, so micro-batches reuse open connections. No session
+    id is bound, which lets concurrent streams share the client.
+    """
+    global _clickhouse_client, _clickhouse_client_pid
+    if _clickhouse_client is None or _clickhouse_client_pid != os.getpid():
+        import clickhouse_connect
+        from clickhouse_connect.driver.httputil import get_pool_manager
+
+        _clickhouse_client = clickhouse_connect.get_client(
+            host=CLICKHOUSE_HOST,
+            port=CLICKHOUSE_PORT,
+            autogenerate_session_id=False,
+            pool_mgr=get_pool_manager(maxsize=CLICKHOUSE_POOL_SIZE, num_pools=1),
+        )
+        _clickhouse_client_pid = os.getpid()
+    return _clickhouse_client
+
+
+_schema_ready = False
+
+
+def retire_legacy_popularity(client):
+    """
+    Move aside a content_popularity table with the old backend layout
+    (SummingMergeTree of views_count/reviews_count/trend_score) so the
+    current one can be created in its place; CREATE TABLE IF NOT EXISTS
+    would keep it and every popularity insert would fail. Its rows are kept
+    in content_popularity_legacy_<timestamp>.
+    """
+    legacy = int(client.command(
+        f"SELECT count() > 0 AND countIf(name = 'popularity_score') = 0 FROM system.columns "
+        f"WHERE database = '{CLICKHOUSE_DB}' AND table = 'content_popularity'"
+    ))
+    if not legacy:
+        return
+    backup = f"content_popularity_legacy_{datetime.now():%Y%m%d%H%M%S}"
+    client.command(f"RENAME TABLE {CLICKHOUSE_DB}.content_popularity TO {CLICKHOUSE_DB}.{backup}")
+    print(f"⚠️ content_popularity had the old layout; moved it to {CLICKHOUSE_DB}.{backup}")
 
 
 def ensure_clickhouse_schema(client):
-    """Ensure all required tables exist in ClickHouse."""
+    """Ensure all required tables exist in ClickHouse (once per process)."""
+    global _schema_ready
+    if _schema_ready:
+        return
     client.command(f"CREATE DATABASE IF NOT EXISTS {CLICKHOUSE_DB}")
     
     # Reviews events table
@@ -181,42 +312,326 @@ def ensure_clickhouse_schema(client):
         PARTITION BY toYYYYMM(date)
         ORDER BY (date, user_id)
     """)
+    
+    # Mergeable daily states: sums, sum+count pairs and uniqCombined sketches,
+    # so any date range can be merged without rescanning raw events
+    client.command(f"""
+        CREATE TABLE IF NOT EXISTS {CLICKHOUSE_DB}.content_daily_states (
+            date           Date,
+            content_id     UInt32,
+            content_type   LowCardinality(String),
+            views_count    SimpleAggregateFunction(sum, UInt64),
+            reviews_count  SimpleAggregateFunction(sum, UInt64),
+            rating_sum     SimpleAggregateFunction(sum, Float64),
+            rating_count   SimpleAggregateFunction(sum, UInt64),
+            unique_users   AggregateFunction(uniqCombined, Nullable(UInt32))
+        ) ENGINE = AggregatingMergeTree()
+        PARTITION BY toYYYYMM(date)
+        ORDER BY (date, content_id, content_type)
+    """)
+    
+    client.command(f"""
+        CREATE TABLE IF NOT EXISTS {CLICKHOUSE_DB}.user_activity_daily_states (
+            date           Date,
+            user_id        UInt32,
+            reviews_count  SimpleAggregateFunction(sum, UInt64),
+            logins_count   SimpleAggregateFunction(sum, UInt64),
+            views_count    SimpleAggregateFunction(sum, UInt64),
+            rating_sum     SimpleAggregateFunction(sum, Float64),
+            rating_count   SimpleAggregateFunction(sum, UInt64),
+            unique_content AggregateFunction(uniqCombined, Nullable(UInt32))
+        ) ENGINE = AggregatingMergeTree()
+        PARTITION BY toYYYYMM(date)
+        ORDER BY (date, user_id)
+    """)
+    
+    # Stream rollup inputs: Null tables whose rows (one per window and user or
+    # content) are folded into the daily states by materialized views, so the
+    # stream adds uniqCombined states instead of per-window distinct counts
+    client.command(f"""
+        CREATE TABLE IF NOT EXISTS {CLICKHOUSE_DB}.content_daily_states_input (
+            date           Date,
+            content_id     UInt32,
+            content_type   LowCardinality(String),
+            user_id        Nullable(UInt32),
+            views_count    UInt64,
+            reviews_count  UInt64,
+            rating_sum     Float64,
+            rating_count   UInt64
+        ) ENGINE = Null
+    """)
+    client.command(f"""
+        CREATE MATERIALIZED VIEW IF NOT EXISTS {CLICKHOUSE_DB}.content_daily_states_mv
+        TO {CLICKHOUSE_DB}.content_daily_states AS
+        SELECT
+            date, content_id, content_type,
+            sum(views_count) as views_count,
+            sum(reviews_count) as reviews_count,
+            sum(rating_sum) as rating_sum,
+            sum(rating_count) as rating_count,
+            uniqCombinedState(user_id) as unique_users
+        FROM {CLICKHOUSE_DB}.content_daily_states_input
+        GROUP BY date, content_id, content_type
+    """)
+    client.command(f"""
+        CREATE TABLE IF NOT EXISTS {CLICKHOUSE_DB}.user_activity_daily_states_input (
+            date           Date,
+            user_id        UInt32,
+            content_id     Nullable(UInt32),
+            reviews_count  UInt64,
+            logins_count   UInt64,
+            views_count    UInt64,
+            rating_sum     Float64,
+            rating_count   UInt64
+        ) ENGINE = Null
+    """)
+    client.command(f"""
+        CREATE MATERIALIZED VIEW IF NOT EXISTS {CLICKHOUSE_DB}.user_activity_daily_states_mv
+        TO {CLICKHOUSE_DB}.user_activity_daily_states AS
+        SELECT
+            date, user_id,
+            sum(reviews_count) as reviews_count,
+            sum(logins_count) as logins_count,
+            sum(views_count) as views_count,
+            sum(rating_sum) as rating_sum,
+            sum(rating_count) as rating_count,
+            uniqCombinedState(content_id) as unique_content
+        FROM {CLICKHOUSE_DB}.user_activity_daily_states_input
+        GROUP BY date, user_id
+    """)
+    
+    # Rolling 7-day popularity; rating_sum_7d/rating_count_7d carry the
+    # window's ratings so the next day can be derived from this one
+    retire_legacy_popularity(client)
+    client.command(f"""
+        CREATE TABLE IF NOT EXISTS {CLICKHOUSE_DB}.content_popularity (
+            date           Date,
+            content_id     UInt32,
+            content_type   LowCardinality(String),
+            popularity_score Float64,
+            views_7d       UInt64,
+            reviews_7d     UInt64,
+            avg_rating_7d  Float64,
+            rating_sum_7d  Float64 DEFAULT 0,
+            rating_count_7d UInt64 DEFAULT 0
+        ) ENGINE = ReplacingMergeTree()
+        PARTITION BY toYYYYMM(date)
+        ORDER BY (date, content_id)
+    """)
+    for column in ("rating_sum_7d Float64 DEFAULT 0", "rating_count_7d UInt64 DEFAULT 0"):
+        client.command(f"ALTER TABLE {CLICKHOUSE_DB}.content_popularity ADD COLUMN IF NOT EXISTS {column}")
+    
+    # Progress of the incremental batch jobs
+    client.command(f"""
+        CREATE TABLE IF NOT EXISTS {CLICKHOUSE_DB}.batch_watermarks (
+            job            LowCardinality(String),
+            watermark      DateTime,
+            updated_at     DateTime DEFAULT now()
+        ) ENGINE = ReplacingMergeTree(watermark)
+        ORDER BY job
+    """)
+    _schema_ready = True
+
+
+def arrow_block_inserter(full_table: str, block_rows: int):
+    """mapInArrow function that inserts a partition into `full_table` from the executor.
+
+    Arrow batches are buffered up to `block_rows` rows and sent as one
+    Arrow insert; yields a single row with the partition's row count,
+    number of inserts and time spent inserting.
+    """
+    def insert(batches):
+        import pyarrow as pa
+
+        client = None
+        pending, pending_rows = [], 0
+        stats = {"rows": 0, "inserts": 0, "insert_ms": 0.0}
+
+        def flush():
+            nonlocal client
+            client = client or get_clickhouse_client()
+            started = time.perf_counter()
+            client.insert_arrow(full_table, pa.Table.from_batches(pending))
+            stats["insert_ms"] += (time.perf_counter() - started) * 1000
+            stats["inserts"] += 1
+            stats["rows"] += pending_rows
+
+        for batch in batches:
+            if batch.num_rows == 0:
+                continue
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            if pending_rows >= block_rows:
+                flush()
+                pending, pending_rows = [], 0
+        if pending:
+            flush()
+        yield pa.RecordBatch.from_pydict({
+            "rows": pa.array([stats["rows"]], type=pa.int64()),
+            "inserts": pa.array([stats["inserts"]], type=pa.int64()),
+            "insert_ms": pa.array([stats["insert_ms"]], type=pa.float64()),
+        })
+
+    return insert
+
+
+class InsertSizer:
+    """Adapts a table's insert block size and partition count between micro-batches.
+
+    Blocks grow toward `target_rows` rows (one part each) while the average
+    insert stays under `target_ms`, and shrink when it does not, moving at
+    most 2x per batch. Batches are coalesced to about one block per
+    partition, using a running estimate of the batch size, so a trickle of
+    events does not turn into one tiny part per Kafka partition.
+    """
+
+    def __init__(self, block_rows: int, target_ms: float, target_rows: int, min_rows: int = 1000):
+        self.target_ms = target_ms
+        self.target_rows = target_rows
+        self.min_rows = min(min_rows, target_rows)
+        self.block_rows = max(self.min_rows, min(block_rows, target_rows))
+        self.expected_rows = None
+
+    def partitions(self) -> Optional[int]:
+        """Partitions for the next batch (None until a batch has been seen)."""
+        if self.expected_rows is None:
+            return None
+        return max(1, int(np.ceil(self.expected_rows / self.block_rows)))
+
+    def observe(self, rows: int, inserts: int, insert_ms: float):
+        if rows == 0 or inserts == 0:
+            return
+        self.expected_rows = rows if self.expected_rows is None else 0.5 * self.expected_rows + 0.5 * rows
+        avg_ms = max(insert_ms / inserts, 1.0)
+        factor = min(max(self.target_ms / avg_ms, 0.5), 2.0)
+        if factor > 1 and rows / inserts < self.block_rows / 2:
+            # Blocks were not filled: partitions were the limit, not the block size
+            return
+        self.block_rows = int(min(max(self.block_rows * factor, self.min_rows), self.target_rows))
+
+
+_insert_sizers: Dict[str, InsertSizer] = {}
+
+
+def insert_sizer(table: str) -> InsertSizer:
+    if table not in _insert_sizers:
+        _insert_sizers[table] = InsertSizer(
+            CLICKHOUSE_INSERT_BLOCK_ROWS, CLICKHOUSE_TARGET_INSERT_MS, CLICKHOUSE_TARGET_PART_ROWS,
+        )
+    return _insert_sizers[table]
+
+
+def write_partitions_to_clickhouse(df: DataFrame, table: str, epoch_id: int = 0):
+    """Write DataFrame to ClickHouse from the executors, one Spark job per batch.
+
+    Nothing is collected on the driver except one stats row per partition,
+    so ingest scales with executors; empty partitions (and empty batches)
+    insert nothing, without a separate emptiness check. With
+    CLICKHOUSE_ADAPTIVE_INSERTS the block size and partition count are
+    tuned per table by InsertSizer.
+    """
+    full_table = f"{CLICKHOUSE_DB}.{table}"
+    sizer = insert_sizer(table) if CLICKHOUSE_ADAPTIVE_INSERTS else None
+    block_rows = sizer.block_rows if sizer else CLICKHOUSE_INSERT_BLOCK_ROWS
+    partitions = sizer.partitions() if sizer else None
+    if partitions:
+        df = df.coalesce(partitions)
+    
+    started = time.perf_counter()
+    stats = (
+        df.mapInArrow(
+            arrow_block_inserter(full_table, block_rows),
+            "rows long, inserts long, insert_ms double",
+        )
+        .collect()
+    )
+    n_rows = sum(row["rows"] for row in stats)
+    n_inserts = sum(row["inserts"] for row in stats)
+    insert_ms = sum(row["insert_ms"] for row in stats)
+    if sizer:
+        sizer.observe(n_rows, n_inserts, insert_ms)
+    if n_rows:
+        print(
+            f"[{datetime.now()}] Inserted {n_rows} rows to {full_table} (batch {epoch_id}) "
+            f"in {n_inserts} inserts of <= {block_rows} rows from {len(stats)} partitions: "
+            f"{(time.perf_counter() - started) * 1000:.0f} ms, "
+            f"{insert_ms / max(n_inserts, 1):.0f} ms per insert"
+        )
 
 
 def write_to_clickhouse(df: DataFrame, table: str, epoch_id: int = 0):
-    """Write DataFrame to ClickHouse table."""
+    """Write DataFrame to ClickHouse table.
+
+    The schema is created once when a stream starts, not per micro-batch;
+    the pooled client keeps its connections between batches. With
+    CLICKHOUSE_SINK_MODE=executor the rows are inserted by the executors.
+    """
+    if CLICKHOUSE_SINK_MODE == "executor":
+        write_partitions_to_clickhouse(df, table, epoch_id)
+        return
+    
     if df.rdd.isEmpty():
         return
     
     client = get_clickhouse_client()
-    ensure_clickhouse_schema(client)
     
+    started = time.perf_counter()
     pdf = df.toPandas()
+    collected = time.perf_counter()
     full_table = f"{CLICKHOUSE_DB}.{table}"
     
     client.insert_df(full_table, pdf)
-    print(f"[{datetime.now()}] Inserted {len(pdf)} rows to {full_table}")
+    inserted = time.perf_counter()
+    print(
+        f"[{datetime.now()}] Inserted {len(pdf)} rows to {full_table} (batch {epoch_id}): "
+        f"collect {(collected - started) * 1000:.0f} ms, insert {(inserted - collected) * 1000:.0f} ms"
+    )
 
 
 # ==================== Streaming Jobs ====================
 
-def stream_reviews_to_clickhouse(spark: SparkSession):
-    """Stream review events from Kafka to ClickHouse."""
-    print(f"Starting reviews streaming from {KAFKA_BOOTSTRAP} topic={TOPICS['reviews']}")
-    
-    df = (
+def read_kafka(spark: SparkSession, *topics: str) -> DataFrame:
+    """Kafka source subscribed to `topics` (rows carry `topic` and `value`).
+
+    maxOffsetsPerTrigger bounds a batch after a consumer outage;
+    minOffsetsPerTrigger holds back batches too small to be worth an insert.
+    """
+    reader = (
         spark.readStream
         .format("kafka")
         .option("kafka.bootstrap.servers", KAFKA_BOOTSTRAP)
-        .option("subscribe", TOPICS["reviews"])
+        .option("subscribe", ",".join(topics))
         .option("startingOffsets", "latest")
         .option("failOnDataLoss", "false")
-        .load()
     )
-    
-    parsed = (
-        df.select(F.col("value").cast("string").alias("value"))
-        .withColumn("json", F.from_json(F.col("value"), REVIEW_EVENT_SCHEMA))
+    if STREAM_MAX_OFFSETS_PER_TRIGGER > 0:
+        reader = reader.option("maxOffsetsPerTrigger", STREAM_MAX_OFFSETS_PER_TRIGGER)
+    if STREAM_MIN_OFFSETS_PER_TRIGGER > 0:
+        reader = (
+            reader.option("minOffsetsPerTrigger", STREAM_MIN_OFFSETS_PER_TRIGGER)
+            .option("maxTriggerDelay", STREAM_MAX_TRIGGER_DELAY)
+        )
+    return reader.load()
+
+
+def start_stream(frame: DataFrame, write_batch, checkpoint: str):
+    """Start a foreachBatch query with the configured trigger interval."""
+    writer = (
+        frame.writeStream
+        .outputMode("append")
+        .foreachBatch(write_batch)
+        .option("checkpointLocation", f".spark-checkpoints/{checkpoint}")
+    )
+    if STREAM_TRIGGER_INTERVAL:
+        writer = writer.trigger(processingTime=STREAM_TRIGGER_INTERVAL)
+    return writer.start()
+
+
+def parse_events(raw: DataFrame, schema: StructType) -> DataFrame:
+    """Parse Kafka `value` JSON with `schema`; missing/invalid event_time becomes now."""
+    return (
+        raw.select(F.col("value").cast("string").alias("value"))
+        .withColumn("json", F.from_json(F.col("value"), schema))
         .select("json.*")
         .withColumn("event_time", 
             F.coalesce(
@@ -224,236 +639,1158 @@ def stream_reviews_to_clickhouse(spark: SparkSession):
                 F.current_timestamp()
             )
         )
-        .select(
-            "event_time",
-            "event_type",
-            "user_id",
-            "content_id",
-            "content_type",
-            "rating",
-            F.coalesce(F.col("emotions"), F.lit("{}")).alias("emotions"),
-            F.coalesce(F.col("aspects"), F.lit("{}")).alias("aspects"),
-            F.coalesce(F.col("source"), F.lit("web")).alias("source"),
-        )
     )
-    
-    query = (
-        parsed.writeStream
-        .outputMode("append")
-        .foreachBatch(lambda df, epoch: write_to_clickhouse(df, "reviews_events", epoch))
-        .option("checkpointLocation", ".spark-checkpoints/reviews_to_ch")
-        .start()
+
+
+def parse_review_events(raw: DataFrame) -> DataFrame:
+    """Kafka rows -> reviews_events columns."""
+    return parse_events(raw, REVIEW_EVENT_SCHEMA).select(
+        "event_time",
+        "event_type",
+        "user_id",
+        "content_id",
+        "content_type",
+        "rating",
+        F.coalesce(F.col("emotions"), F.lit("{}")).alias("emotions"),
+        F.coalesce(F.col("aspects"), F.lit("{}")).alias("aspects"),
+        F.coalesce(F.col("source"), F.lit("web")).alias("source"),
+    )
+
+
+def parse_user_events(raw: DataFrame) -> DataFrame:
+    """Kafka rows -> user_events columns."""
+    return parse_events(raw, USER_EVENT_SCHEMA).select(
+        "event_time",
+        "event_type",
+        "user_id",
+        F.coalesce(F.col("metadata"), F.lit("{}")).alias("metadata"),
+    )
+
+
+def parse_content_events(raw: DataFrame) -> DataFrame:
+    """Kafka rows -> content_events columns."""
+    return parse_events(raw, CONTENT_EVENT_SCHEMA).select(
+        "event_time",
+        "event_type",
+        "user_id",
+        "content_id",
+        "content_type",
+        F.coalesce(F.col("metadata"), F.lit("{}")).alias("metadata"),
     )
+
+
+# Kafka topic -> (parser, ClickHouse table)
+STREAM_ROUTES = {
+    TOPICS["reviews"]: (parse_review_events, "reviews_events"),
+    TOPICS["users"]: (parse_user_events, "user_events"),
+    TOPICS["content"]: (parse_content_events, "content_events"),
+}
+
+
+def stream_reviews_to_clickhouse(spark: SparkSession):
+    """Stream review events from Kafka to ClickHouse."""
+    print(f"Starting reviews streaming from {KAFKA_BOOTSTRAP} topic={TOPICS['reviews']}")
+    ensure_clickhouse_schema(get_clickhouse_client())
+    
+    parsed = parse_review_events(read_kafka(spark, TOPICS["reviews"]))
     
-    return query
+    return start_stream(
+        parsed, lambda df, epoch: write_to_clickhouse(df, "reviews_events", epoch), "reviews_to_ch"
+    )
 
 
 def stream_users_to_clickhouse(spark: SparkSession):
     """Stream user events from Kafka to ClickHouse."""
     print(f"Starting users streaming from {KAFKA_BOOTSTRAP} topic={TOPICS['users']}")
+    ensure_clickhouse_schema(get_clickhouse_client())
     
-    df = (
-        spark.readStream
-        .format("kafka")
-        .option("kafka.bootstrap.servers", KAFKA_BOOTSTRAP)
-        .option("subscribe", TOPICS["users"])
-        .option("startingOffsets", "latest")
-        .option("failOnDataLoss", "false")
-        .load()
-    )
+    parsed = parse_user_events(read_kafka(spark, TOPICS["users"]))
     
-    parsed = (
-        df.select(F.col("value").cast("string").alias("value"))
-        .withColumn("json", F.from_json(F.col("value"), USER_EVENT_SCHEMA))
-        .select("json.*")
-        .withColumn("event_time", 
-            F.coalesce(
-                F.to_timestamp(F.col("event_time")), 
-                F.current_timestamp()
-            )
-        )
-        .select(
-            "event_time",
-            "event_type",
-            "user_id",
-            F.coalesce(F.col("metadata"), F.lit("{}")).alias("metadata"),
-        )
-    )
-    
-    query = (
-        parsed.writeStream
-        .outputMode("append")
-        .foreachBatch(lambda df, epoch: write_to_clickhouse(df, "user_events", epoch))
-        .option("checkpointLocation", ".spark-checkpoints/users_to_ch")
-        .start()
+    return start_stream(
+        parsed, lambda df, epoch: write_to_clickhouse(df, "user_events", epoch), "users_to_ch"
     )
-    
-    return query
 
 
 def stream_content_to_clickhouse(spark: SparkSession):
     """Stream content events from Kafka to ClickHouse."""
     print(f"Starting content streaming from {KAFKA_BOOTSTRAP} topic={TOPICS['content']}")
+    ensure_clickhouse_schema(get_clickhouse_client())
     
-    df = (
-        spark.readStream
-        .format("kafka")
-        .option("kafka.bootstrap.servers", KAFKA_BOOTSTRAP)
-        .option("subscribe", TOPICS["content"])
-        .option("startingOffsets", "latest")
-        .option("failOnDataLoss", "false")
-        .load()
+    parsed = parse_content_events(read_kafka(spark, TOPICS["content"]))
+    
+    return start_stream(
+        parsed, lambda df, epoch: write_to_clickhouse(df, "content_events", epoch), "content_to_ch"
     )
+
+
+def write_multiplexed_batch(batch: DataFrame, epoch_id: int):
+    """Route one micro-batch of all topics to their tables.
+
+    The raw batch is cached so Kafka is read once, then each topic's rows
+    are parsed with its own schema and written like the per-topic streams.
+    """
+    batch.persist()
+    try:
+        for topic, (parse, table) in STREAM_ROUTES.items():
+            write_to_clickhouse(parse(batch.filter(F.col("topic") == topic)), table, epoch_id)
+    finally:
+        batch.unpersist()
+
+
+def stream_all_to_clickhouse(spark: SparkSession):
+    """Stream all topics to ClickHouse through one query and one Kafka consumer."""
+    topics = list(STREAM_ROUTES)
+    print(f"Starting multiplexed streaming from {KAFKA_BOOTSTRAP} topics={','.join(topics)}")
+    ensure_clickhouse_schema(get_clickhouse_client())
     
-    parsed = (
-        df.select(F.col("value").cast("string").alias("value"))
-        .withColumn("json", F.from_json(F.col("value"), CONTENT_EVENT_SCHEMA))
-        .select("json.*")
-        .withColumn("event_time", 
-            F.coalesce(
-                F.to_timestamp(F.col("event_time")), 
-                F.current_timestamp()
-            )
-        )
-        .select(
+    raw = read_kafka(spark, *topics).select("topic", "value")
+    
+    return start_stream(raw, write_multiplexed_batch, "all_to_ch")
+
+
+def rollup_events(raw: DataFrame) -> DataFrame:
+    """Events of all topics in one shape: source, event_type, user, content, rating."""
+    def normalized(topic, source, columns):
+        parse, _ = STREAM_ROUTES[topic]
+        events = parse(raw.filter(F.col("topic") == topic))
+        return events.select(
             "event_time",
+            F.lit(source).alias("source"),
             "event_type",
-            "user_id",
-            "content_id",
-            "content_type",
-            F.coalesce(F.col("metadata"), F.lit("{}")).alias("metadata"),
+            F.col("user_id").cast("int").alias("user_id"),
+            *columns,
         )
+
+    return (
+        normalized(TOPICS["reviews"], "reviews", [
+            "content_id", "content_type", F.col("rating").cast("double").alias("rating"),
+        ])
+        .unionByName(normalized(TOPICS["users"], "users", [
+            F.lit(None).cast("int").alias("content_id"),
+            F.lit(None).cast("string").alias("content_type"),
+            F.lit(None).cast("double").alias("rating"),
+        ]))
+        .unionByName(normalized(TOPICS["content"], "content", [
+            "content_id", "content_type", F.lit(None).cast("double").alias("rating"),
+        ]))
     )
+
+
+def write_rollups(batch: DataFrame, epoch_id: int):
+    """Add one batch of closed windows to hourly_activity and the daily states.
+
+    Hourly counts are partial sums for the SummingMergeTree. Per-content and
+    per-user rows go through the `*_states_input` Null tables, whose
+    materialized views turn them into sums, sum+count rating pairs and
+    uniqCombined states, so unique users and average ratings stay exact
+    across windows (read them with read_content_stats / read_user_activity).
+    Counting follows the batch aggregation jobs. Windows for hours or days a
+    batch job has already replaced (before its watermark) are skipped: the
+    batch rows were built from the raw events and already include them.
+    The exact content_daily_stats / user_activity_daily tables are left to
+    the batch jobs.
+    """
+    client = get_clickhouse_client()
+    hourly_closed = read_watermark(client, "hourly_activity")
+    content_closed = read_watermark(client, "content_daily_stats")
+    users_closed = read_watermark(client, "user_activity_daily")
+
+    def after(column, watermark):
+        # Daily watermarks are midnights, so a date compares as its start
+        return F.lit(True) if watermark is None else F.col(column) >= F.lit(watermark)
+
+    batch = (
+        batch.withColumn("window_start", F.col("window.start")).drop("window")
+        .withColumn("date", F.to_date("window_start"))
+        .persist()
+    )
+    is_review = (F.col("source") == "reviews") & (F.col("event_type") == "review_created")
+
+    def count_if(condition):
+        return F.sum(F.when(condition, F.col("events")).otherwise(0)).cast("long")
+
+    rating_sum = F.coalesce(F.sum("sum_rating"), F.lit(0.0)).alias("rating_sum")
+    rating_count = F.sum("rating_count").cast("long").alias("rating_count")
+
+    try:
+        hourly = (
+            batch.groupBy(F.date_trunc("hour", "window_start").alias("hour"), "event_type")
+            .agg(F.sum("events").cast("long").alias("count"))
+            .filter(after("hour", hourly_closed))
+        )
+        content = (
+            batch.filter(
+                F.col("source").isin("reviews", "content") & F.col("content_id").isNotNull()
+                & after("date", content_closed)
+            )
+            .groupBy(
+                "date",
+                "content_id",
+                F.coalesce(F.col("content_type"), F.lit("")).alias("content_type"),
+                "user_id",
+            )
+            .agg(
+                count_if(F.col("source") == "content").alias("views_count"),
+                count_if(is_review).alias("reviews_count"),
+                rating_sum,
+                rating_count,
+            )
+        )
+        users = (
+            batch.filter(
+                F.col("user_id").isNotNull()
+                & after("date", users_closed)
+            )
+            .groupBy("date", "user_id", "content_id")
+            .agg(
+                count_if(is_review).alias("reviews_count"),
+                count_if((F.col("source") == "users") & (F.col("event_type") == "user_login")).alias("logins_count"),
+                count_if((F.col("source") == "content") & (F.col("event_type") == "content_viewed")).alias("views_count"),
+                rating_sum,
+                rating_count,
+            )
+        )
+        write_to_clickhouse(hourly, "hourly_activity", epoch_id)
+        write_to_clickhouse(content, "content_daily_states_input", epoch_id)
+        write_to_clickhouse(users, "user_activity_daily_states_input", epoch_id)
+    finally:
+        batch.unpersist()
+
+
+def stream_rollups_to_clickhouse(spark: SparkSession):
+    """Keep hourly_activity and the daily states up to date from Kafka.
+
+    Events are counted per STREAM_ROLLUP_WINDOW event-time window; a window
+    is emitted once the watermark (STREAM_ROLLUP_WATERMARK behind the latest
+    event) passes its end, and later events are dropped from the rollups
+    (the raw tables still get them).
+    """
+    topics = list(STREAM_ROUTES)
+    print(
+        f"Starting rollups from {KAFKA_BOOTSTRAP} topics={','.join(topics)} "
+        f"(window {STREAM_ROLLUP_WINDOW}, watermark {STREAM_ROLLUP_WATERMARK})"
+    )
+    ensure_clickhouse_schema(get_clickhouse_client())
     
-    query = (
-        parsed.writeStream
-        .outputMode("append")
-        .foreachBatch(lambda df, epoch: write_to_clickhouse(df, "content_events", epoch))
-        .option("checkpointLocation", ".spark-checkpoints/content_to_ch")
-        .start()
+    windowed = (
+        rollup_events(read_kafka(spark, *topics).select("topic", "value"))
+        .withWatermark("event_time", STREAM_ROLLUP_WATERMARK)
+        .groupBy(
+            F.window("event_time", STREAM_ROLLUP_WINDOW).alias("window"),
+            "source", "event_type", "user_id", "content_id", "content_type",
+        )
+        .agg(
+            F.count(F.lit(1)).alias("events"),
+            F.sum("rating").alias("sum_rating"),
+            F.count("rating").alias("rating_count"),
+        )
     )
     
-    return query
+    return start_stream(windowed, write_rollups, "rollups_to_ch")
 
 
 # ==================== Batch Aggregation Jobs ====================
 
-def aggregate_daily_content_stats(spark: SparkSession, date: str = None):
+CLICKHOUSE_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def clickhouse_time(client, expression: str) -> datetime:
+    """Evaluate a DateTime expression on the server (its timezone, as the tables)."""
+    return datetime.strptime(client.command(f"SELECT toString({expression})"), CLICKHOUSE_TIME_FORMAT)
+
+
+def read_watermark(client, job: str) -> Optional[datetime]:
+    """End of the range `job` has aggregated so far (None before its first run)."""
+    value = client.command(
+        f"SELECT toString(max(watermark)) FROM {CLICKHOUSE_DB}.batch_watermarks "
+        f"WHERE job = '{job}' HAVING count() > 0"
+    )
+    return datetime.strptime(value, CLICKHOUSE_TIME_FORMAT) if value else None
+
+
+def save_watermark(client, job: str, watermark: datetime):
+    client.command(
+        f"INSERT INTO {CLICKHOUSE_DB}.batch_watermarks (job, watermark) "
+        f"VALUES ('{job}', '{watermark:{CLICKHOUSE_TIME_FORMAT}}')"
+    )
+
+
+def replace_range(client, table: str, column: str, start: str, end: str, select: str):
+    """Replace the rows of `table` with `column` in [start, end) by the rows of `select`.
+
+    A rerun of a range therefore replaces its sums instead of adding to
+    them. The delete and insert are not atomic: after a failure in between
+    the range stays empty until it is run again.
     """
-    Aggregate daily content statistics from raw events.
-    Run this as a daily batch job.
+    client.command(f"DELETE FROM {CLICKHOUSE_DB}.{table} WHERE {column} >= '{start}' AND {column} < '{end}'")
+    client.command(f"INSERT INTO {CLICKHOUSE_DB}.{table} {select}")
+
+
+def run_ordered(units: list, work: Callable, workers: Optional[int] = None):
+    """Run `work(unit)` for every unit on up to `workers` threads (BATCH_CONCURRENCY).
+
+    Yields the units in order, each once it and all before it are done, so
+    callers can record progress; a failure is raised after the units ahead
+    of it have been yielded.
     """
-    client = get_clickhouse_client()
-    ensure_clickhouse_schema(client)
-    
-    if date is None:
-        date = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    workers = BATCH_CONCURRENCY if workers is None else workers
+    if workers <= 1 or len(units) <= 1:
+        for unit in units:
+            work(unit)
+            yield unit
+        return
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for unit, _ in zip(units, pool.map(work, units)):
+            yield unit
+
+
+def next_day(day: str) -> str:
+    return (datetime.strptime(day, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def closed_days(client, job: str, date: Optional[str] = None, date_to: Optional[str] = None) -> List[str]:
+    """`date`..`date_to` (inclusive) if given, else the closed days after the job's watermark (yesterday on a first run)."""
+    if date is not None:
+        days, day = [], date
+        while day <= (date_to or date):
+            days.append(day)
+            day = next_day(day)
+        return days
+    end = clickhouse_time(client, f"toStartOfDay(now() - INTERVAL {BATCH_CLOSE_DELAY_MINUTES} MINUTE)")
+    start = read_watermark(client, job) or end - timedelta(days=1)
+    days = []
+    while start < end:
+        days.append(start.strftime("%Y-%m-%d"))
+        start += timedelta(days=1)
+    return days
+
+
+def run_daily_job(client, job: str, date: Optional[str], date_to: Optional[str],
+                  targets: List[Tuple[str, Callable[[str], str]]], workers: Optional[int] = None):
+    """Replace every (table, select_for_day) target day by day, days in parallel.
+
+    Without an explicit `date` the job's watermark follows the days once
+    all their targets are written; an explicit range leaves it alone.
+    """
+    days = closed_days(client, job, date, date_to)
+    if not days:
+        print(f"{job} is up to date")
     
-    print(f"Aggregating content stats for {date}")
+    def run_day(day):
+        for table, select_for_day in targets:
+            replace_range(client, table, "date", day, next_day(day), select_for_day(day))
     
-    # Query raw events and aggregate
-    query = f"""
-        INSERT INTO {CLICKHOUSE_DB}.content_daily_stats
+    for day in run_ordered(days, run_day, workers):
+        if date is None:
+            save_watermark(client, job, datetime.strptime(next_day(day), "%Y-%m-%d"))
+        print(f"{job} aggregated for {day}")
+
+
+def content_states_select(start: str, end: str) -> str:
+    """content_daily_states rows for the days in [start, end)."""
+    return f"""
         SELECT
-            toDate('{date}') as date,
+            toDate(event_time) as date,
             content_id,
             content_type,
-            countIf(event_type = 'content_viewed') as views_count,
-            countIf(event_type = 'review_created') as reviews_count,
-            avgIf(rating, rating IS NOT NULL) as avg_rating,
-            sumIf(rating, rating IS NOT NULL) as sum_rating,
-            uniqExact(user_id) as unique_users
+            countIf(source = 'content') as views_count,
+            countIf(source = 'reviews' AND event_type = 'review_created') as reviews_count,
+            ifNull(sum(rating), 0) as rating_sum,
+            count(rating) as rating_count,
+            uniqCombinedState(user_id) as unique_users
         FROM (
-            SELECT content_id, content_type, 'content_viewed' as event_type, NULL as rating, user_id
+            SELECT event_time, content_id, content_type, 'content' as source, event_type,
+                   CAST(NULL, 'Nullable(Float32)') as rating, user_id
             FROM {CLICKHOUSE_DB}.content_events
-            WHERE toDate(event_time) = '{date}'
+            WHERE event_time >= '{start}' AND event_time < '{end}'
             UNION ALL
-            SELECT content_id, content_type, event_type, rating, user_id
+            SELECT event_time, content_id, content_type, 'reviews' as source, event_type,
+                   rating, toNullable(user_id) as user_id
             FROM {CLICKHOUSE_DB}.reviews_events
-            WHERE toDate(event_time) = '{date}'
+            WHERE event_time >= '{start}' AND event_time < '{end}'
         )
-        GROUP BY content_id, content_type
+        GROUP BY date, content_id, content_type
+    """
+
+
+def user_states_select(start: str, end: str) -> str:
+    """user_activity_daily_states rows for the days in [start, end)."""
+    return f"""
+        SELECT
+            toDate(event_time) as date,
+            user_id,
+            countIf(source = 'reviews' AND event_type = 'review_created') as reviews_count,
+            countIf(source = 'users' AND event_type = 'user_login') as logins_count,
+            countIf(source = 'content' AND event_type = 'content_viewed') as views_count,
+            ifNull(sum(rating), 0) as rating_sum,
+            count(rating) as rating_count,
+            uniqCombinedState(content_id) as unique_content
+        FROM (
+            SELECT event_time, user_id, 'reviews' as source, event_type, rating, toNullable(content_id) as content_id
+            FROM {CLICKHOUSE_DB}.reviews_events
+            WHERE event_time >= '{start}' AND event_time < '{end}'
+            UNION ALL
+            SELECT event_time, user_id, 'users' as source, event_type,
+                   CAST(NULL, 'Nullable(Float32)') as rating, CAST(NULL, 'Nullable(UInt32)') as content_id
+            FROM {CLICKHOUSE_DB}.user_events
+            WHERE event_time >= '{start}' AND event_time < '{end}'
+            UNION ALL
+            SELECT event_time, assumeNotNull(user_id) as user_id, 'content' as source, event_type,
+                   CAST(NULL, 'Nullable(Float32)') as rating, toNullable(content_id) as content_id
+            FROM {CLICKHOUSE_DB}.content_events
+            WHERE event_time >= '{start}' AND event_time < '{end}' AND user_id IS NOT NULL
+        )
+        GROUP BY date, user_id
+    """
+
+
+def describe_days(date: Optional[str], date_to: Optional[str]) -> str:
+    if date is None:
+        return "closed days since the last run"
+    return date if not date_to or date_to == date else f"{date} .. {date_to}"
+
+
+def aggregate_daily_content_stats(spark: Optional[SparkSession], date: str = None, date_to: str = None):
+    """
+    Aggregate daily content statistics from raw events.
+    Run this as a daily batch job: without `date` it covers every closed
+    day since the last run, and each day's rows are replaced. `date` ..
+    `date_to` backfills a range, BATCH_CONCURRENCY days at a time.
+    """
+    client = get_clickhouse_client()
+    ensure_clickhouse_schema(client)
+    
+    print(f"Aggregating content stats for {describe_days(date, date_to)}")
+    
+    # Query raw events and aggregate
+    def select_for_day(day):
+        return f"""
+            SELECT
+                toDate('{day}') as date,
+                content_id,
+                content_type,
+                countIf(event_type = 'content_viewed') as views_count,
+                countIf(event_type = 'review_created') as reviews_count,
+                avgIf(rating, rating IS NOT NULL) as avg_rating,
+                sumIf(rating, rating IS NOT NULL) as sum_rating,
+                uniqExact(user_id) as unique_users
+            FROM (
+                SELECT content_id, content_type, 'content_viewed' as event_type, NULL as rating, user_id
+                FROM {CLICKHOUSE_DB}.content_events
+                WHERE event_time >= '{day}' AND event_time < '{next_day(day)}'
+                UNION ALL
+                SELECT content_id, content_type, event_type, rating, user_id
+                FROM {CLICKHOUSE_DB}.reviews_events
+                WHERE event_time >= '{day}' AND event_time < '{next_day(day)}'
+            )
+            GROUP BY content_id, content_type
+        """
+    
+    run_daily_job(client, "content_daily_stats", date, date_to, [
+        ("content_daily_stats", select_for_day),
+        ("content_daily_states", lambda day: content_states_select(day, next_day(day))),
+    ])
+
+
+def aggregate_hourly_activity(spark: Optional[SparkSession], hours_back: int = 24,
+                              date: str = None, date_to: str = None):
     """
+    Aggregate hourly activity counts for the closed hours since the last run.
+
+    The first run starts `hours_back` hours back. Hours are processed in
+    chunks of BATCH_CHUNK_HOURS, each replacing its rows, and the watermark
+    follows the finished chunks, so overlapping or repeated runs never
+    double-count. `date` .. `date_to` backfills whole days instead.
+    """
+    client = get_clickhouse_client()
+    ensure_clickhouse_schema(client)
+    
+    job = "hourly_activity"
+    if date is not None:
+        start = datetime.strptime(date, "%Y-%m-%d")
+        end = datetime.strptime(next_day(date_to or date), "%Y-%m-%d")
+    else:
+        end = clickhouse_time(client, f"toStartOfHour(now() - INTERVAL {BATCH_CLOSE_DELAY_MINUTES} MINUTE)")
+        start = read_watermark(client, job) or end - timedelta(hours=hours_back)
+    if start >= end:
+        print("Hourly activity is up to date")
+        return
+    
+    print(f"Aggregating hourly activity for {start} .. {end}")
+    
+    chunks = []
+    while start < end:
+        chunk_end = min(start + timedelta(hours=BATCH_CHUNK_HOURS), end)
+        chunks.append((start, chunk_end))
+        start = chunk_end
+    
+    def run_chunk(chunk):
+        lo, hi = (f"{t:{CLICKHOUSE_TIME_FORMAT}}" for t in chunk)
+        replace_range(client, "hourly_activity", "hour", lo, hi, f"""
+            SELECT
+                toStartOfHour(event_time) as hour,
+                event_type,
+                count() as count
+            FROM (
+                SELECT event_time, event_type FROM {CLICKHOUSE_DB}.reviews_events
+                WHERE event_time >= '{lo}' AND event_time < '{hi}'
+                UNION ALL
+                SELECT event_time, event_type FROM {CLICKHOUSE_DB}.user_events
+                WHERE event_time >= '{lo}' AND event_time < '{hi}'
+                UNION ALL
+                SELECT event_time, event_type FROM {CLICKHOUSE_DB}.content_events
+                WHERE event_time >= '{lo}' AND event_time < '{hi}'
+            )
+            GROUP BY hour, event_type
+        """)
+    
+    for _, chunk_end in run_ordered(chunks, run_chunk):
+        if date is None:
+            save_watermark(client, job, chunk_end)
     
-    client.command(query)
-    print(f"Content daily stats aggregated for {date}")
+    print("Hourly activity aggregated")
 
 
-def aggregate_hourly_activity(spark: SparkSession, hours_back: int = 24):
+def aggregate_user_activity(spark: Optional[SparkSession], date: str = None, date_to: str = None):
     """
-    Aggregate hourly activity counts.
+    Aggregate daily user activity summary (closed days since the last run
+    without `date`, else `date` .. `date_to`; each day's rows are replaced).
     """
     client = get_clickhouse_client()
     ensure_clickhouse_schema(client)
     
-    print(f"Aggregating hourly activity for last {hours_back} hours")
+    print(f"Aggregating user activity for {describe_days(date, date_to)}")
     
-    query = f"""
-        INSERT INTO {CLICKHOUSE_DB}.hourly_activity
-        SELECT
-            toStartOfHour(event_time) as hour,
-            event_type,
-            count() as count
-        FROM (
-            SELECT event_time, event_type FROM {CLICKHOUSE_DB}.reviews_events
-            WHERE event_time >= now() - INTERVAL {hours_back} HOUR
+    def select_for_day(day):
+        return f"""
+            SELECT
+                toDate('{day}') as date,
+                user_id,
+                countIf(source = 'reviews' AND event_type = 'review_created') as reviews_count,
+                countIf(source = 'users' AND event_type = 'user_login') as logins_count,
+                countIf(source = 'content' AND event_type = 'content_viewed') as views_count,
+                sumIf(rating, rating IS NOT NULL) as total_rating
+            FROM (
+                SELECT user_id, 'reviews' as source, event_type, rating
+                FROM {CLICKHOUSE_DB}.reviews_events
+                WHERE event_time >= '{day}' AND event_time < '{next_day(day)}'
+                UNION ALL
+                SELECT user_id, 'users' as source, event_type, NULL as rating
+                FROM {CLICKHOUSE_DB}.user_events
+                WHERE event_time >= '{day}' AND event_time < '{next_day(day)}'
+                UNION ALL
+                SELECT user_id, 'content' as source, event_type, NULL as rating
+                FROM {CLICKHOUSE_DB}.content_events
+                WHERE event_time >= '{day}' AND event_time < '{next_day(day)}' AND user_id IS NOT NULL
+            )
+            GROUP BY user_id
+        """
+    
+    run_daily_job(client, "user_activity_daily", date, date_to, [
+        ("user_activity_daily", select_for_day),
+        ("user_activity_daily_states", lambda day: user_states_select(day, next_day(day))),
+    ])
+
+
+def popularity_select(day: str, incremental: bool) -> str:
+    """content_popularity rows for `day`.
+
+    Incrementally, the previous day's window is decayed, the new day is
+    added and the day leaving the window subtracted (two days of daily
+    states, not seven days of raw events); otherwise the window is summed
+    from the daily states directly. Contents with an empty window drop out.
+    """
+    today = datetime.strptime(day, "%Y-%m-%d")
+    previous = (today - timedelta(days=1)).strftime("%Y-%m-%d")
+    expired = (today - timedelta(days=POPULARITY_WINDOW_DAYS)).strftime("%Y-%m-%d")
+    weight = POPULARITY_REVIEW_WEIGHT
+    
+    def day_totals(where: str, sign: int = 1, factor: float = 1.0) -> str:
+        return f"""
+            SELECT
+                content_id,
+                any(content_type) as content_type,
+                {sign * factor} * (sum(views_count) + {weight} * sum(reviews_count)) as score,
+                {sign} * toInt64(sum(views_count)) as views,
+                {sign} * toInt64(sum(reviews_count)) as reviews,
+                {sign} * sum(rating_sum) as rating_sum,
+                {sign} * toInt64(sum(rating_count)) as rating_count
+            FROM {CLICKHOUSE_DB}.content_daily_states
+            WHERE {where}
+            GROUP BY content_id
+        """
+    
+    if incremental:
+        source = f"""
+            SELECT
+                content_id, content_type,
+                {POPULARITY_DECAY} * popularity_score as score,
+                toInt64(views_7d) as views,
+                toInt64(reviews_7d) as reviews,
+                rating_sum_7d as rating_sum,
+                toInt64(rating_count_7d) as rating_count
+            FROM {CLICKHOUSE_DB}.content_popularity FINAL
+            WHERE date = '{previous}'
             UNION ALL
-            SELECT event_time, event_type FROM {CLICKHOUSE_DB}.user_events
-            WHERE event_time >= now() - INTERVAL {hours_back} HOUR
+            {day_totals(f"date = '{day}'")}
             UNION ALL
-            SELECT event_time, event_type FROM {CLICKHOUSE_DB}.content_events
-            WHERE event_time >= now() - INTERVAL {hours_back} HOUR
-        )
-        GROUP BY hour, event_type
+            {day_totals(f"date = '{expired}'", -1, POPULARITY_DECAY ** POPULARITY_WINDOW_DAYS)}
+        """
+    else:
+        source = f"""
+            SELECT
+                content_id,
+                any(content_type) as content_type,
+                sum((views_count + {weight} * reviews_count) * pow({POPULARITY_DECAY}, dateDiff('day', date, toDate('{day}')))) as score,
+                toInt64(sum(views_count)) as views,
+                toInt64(sum(reviews_count)) as reviews,
+                sum(rating_sum) as rating_sum,
+                toInt64(sum(rating_count)) as rating_count
+            FROM {CLICKHOUSE_DB}.content_daily_states
+            WHERE date > '{expired}' AND date <= '{day}'
+            GROUP BY content_id
+        """
+    
+    return f"""
+        SELECT
+            toDate('{day}') as date,
+            content_id,
+            any(content_type) as content_type,
+            round(greatest(sum(score), 0), 6) as popularity_score,
+            toUInt64(greatest(sum(views), 0)) as views_7d,
+            toUInt64(greatest(sum(reviews), 0)) as reviews_7d,
+            if(sum(rating_count) > 0, sum(rating_sum) / sum(rating_count), 0) as avg_rating_7d,
+            if(sum(rating_count) > 0, sum(rating_sum), 0) as rating_sum_7d,
+            toUInt64(greatest(sum(rating_count), 0)) as rating_count_7d
+        FROM ({source})
+        GROUP BY content_id
+        HAVING views_7d + reviews_7d + rating_count_7d > 0
+    """
+
+
+def compute_content_popularity(spark: Optional[SparkSession], date: str = None, date_to: str = None):
     """
+    Roll content_popularity forward one day at a time from content_daily_states
+    (closed days since the last run without `date`). A day is derived from
+    the previous one when that exists, else summed over its 7-day window,
+    so a range runs in order, not in parallel.
+    """
+    client = get_clickhouse_client()
+    ensure_clickhouse_schema(client)
     
-    client.command(query)
-    print("Hourly activity aggregated")
+    print(f"Computing content popularity for {describe_days(date, date_to)}")
+    
+    def select_for_day(day):
+        previous = (datetime.strptime(day, "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")
+        incremental = int(client.command(
+            f"SELECT count() FROM {CLICKHOUSE_DB}.content_popularity WHERE date = '{previous}'"
+        )) > 0
+        return popularity_select(day, incremental)
+    
+    run_daily_job(client, "content_popularity", date, date_to, [("content_popularity", select_for_day)], workers=1)
 
 
-def aggregate_user_activity(spark: SparkSession, date: str = None):
+def backfill_daily_states(spark: Optional[SparkSession], date: str = None, date_to: str = None):
     """
-    Aggregate daily user activity summary.
+    Migration: build content_daily_states and user_activity_daily_states
+    from the raw event tables, one month (partition) per INSERT and
+    BATCH_CONCURRENCY months at a time, up to the last closed day (or
+    `date` .. `date_to`). Each month is replaced, so it is safe to rerun;
+    the daily jobs keep the states current afterwards.
     """
     client = get_clickhouse_client()
     ensure_clickhouse_schema(client)
     
-    if date is None:
-        date = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    if date is not None:
+        start = datetime.strptime(date, "%Y-%m-%d")
+        end = datetime.strptime(next_day(date_to or date), "%Y-%m-%d")
+    else:
+        first = client.command(f"""
+            SELECT toString(min(day)) FROM (
+                SELECT min(toDate(event_time)) as day FROM {CLICKHOUSE_DB}.reviews_events
+                UNION ALL
+                SELECT min(toDate(event_time)) FROM {CLICKHOUSE_DB}.user_events
+                UNION ALL
+                SELECT min(toDate(event_time)) FROM {CLICKHOUSE_DB}.content_events
+            ) WHERE day > '1970-01-01'
+        """)
+        if not first or first in ("1970-01-01", "0000-00-00"):
+            print("No raw events to backfill from")
+            return
+        start = datetime.strptime(first, "%Y-%m-%d").replace(day=1)
+        end = clickhouse_time(client, f"toStartOfDay(now() - INTERVAL {BATCH_CLOSE_DELAY_MINUTES} MINUTE)")
+    
+    months = []
+    while start < end:
+        month_end = min((start.replace(day=1) + timedelta(days=32)).replace(day=1), end)
+        months.append((start.strftime("%Y-%m-%d"), month_end.strftime("%Y-%m-%d")))
+        start = month_end
     
-    print(f"Aggregating user activity for {date}")
+    def run_month(month):
+        lo, hi = month
+        replace_range(client, "content_daily_states", "date", lo, hi, content_states_select(lo, hi))
+        replace_range(client, "user_activity_daily_states", "date", lo, hi, user_states_select(lo, hi))
     
-    query = f"""
-        INSERT INTO {CLICKHOUSE_DB}.user_activity_daily
+    for lo, hi in run_ordered(months, run_month):
+        print(f"Daily states backfilled for {lo} .. {hi}")
+
+
+def read_content_stats(start: str, end: str, content_ids: Optional[List[int]] = None) -> pd.DataFrame:
+    """Per-content totals for the days in [start, end), merged from content_daily_states.
+
+    unique_users is a uniqCombined estimate over the whole range (not a sum
+    of daily uniques) and avg_rating the mean of all ratings in it.
+    """
+    content_filter = f"AND content_id IN ({','.join(str(int(c)) for c in content_ids)})" if content_ids else ""
+    return get_clickhouse_client().query_df(f"""
+        SELECT
+            content_id,
+            content_type,
+            sum(views_count) as views_count,
+            sum(reviews_count) as reviews_count,
+            sum(rating_sum) / nullIf(sum(rating_count), 0) as avg_rating,
+            sum(rating_count) as rating_count,
+            uniqCombinedMerge(unique_users) as unique_users
+        FROM {CLICKHOUSE_DB}.content_daily_states
+        WHERE date >= '{start}' AND date < '{end}' {content_filter}
+        GROUP BY content_id, content_type
+    """)
+
+
+def read_user_activity(start: str, end: str, user_ids: Optional[List[int]] = None) -> pd.DataFrame:
+    """Per-user totals for the days in [start, end), merged from user_activity_daily_states."""
+    user_filter = f"AND user_id IN ({','.join(str(int(u)) for u in user_ids)})" if user_ids else ""
+    return get_clickhouse_client().query_df(f"""
         SELECT
-            toDate('{date}') as date,
             user_id,
-            countIf(source = 'reviews' AND event_type = 'review_created') as reviews_count,
-            countIf(source = 'users' AND event_type = 'user_login') as logins_count,
-            countIf(source = 'content' AND event_type = 'content_viewed') as views_count,
-            sumIf(rating, rating IS NOT NULL) as total_rating
-        FROM (
-            SELECT user_id, 'reviews' as source, event_type, rating
-            FROM {CLICKHOUSE_DB}.reviews_events
-            WHERE toDate(event_time) = '{date}'
-            UNION ALL
-            SELECT user_id, 'users' as source, event_type, NULL as rating
-            FROM {CLICKHOUSE_DB}.user_events
-            WHERE toDate(event_time) = '{date}'
-            UNION ALL
-            SELECT user_id, 'content' as source, event_type, NULL as rating
-            FROM {CLICKHOUSE_DB}.content_events
-            WHERE toDate(event_time) = '{date}' AND user_id IS NOT NULL
-        )
+            sum(reviews_count) as reviews_count,
+            sum(logins_count) as logins_count,
+            sum(views_count) as views_count,
+            sum(rating_sum) / nullIf(sum(rating_count), 0) as avg_rating,
+            uniqCombinedMerge(unique_content) as unique_content
+        FROM {CLICKHOUSE_DB}.user_activity_daily_states
+        WHERE date >= '{start}' AND date < '{end}' {user_filter}
         GROUP BY user_id
+    """)
+
+
+# ==================== Batch Recommendations ====================
+
+RECS_MYSQL_DDL = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT NOT NULL,
+        content_id INT NOT NULL,
+        score FLOAT NOT NULL,
+        reason VARCHAR(255) NULL,
+        INDEX idx_recommendations_user_score (user_id, score),
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+        FOREIGN KEY (content_id) REFERENCES content(id) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+
+def read_mysql(spark: SparkSession, query: str, partition_column: Optional[str] = None,
+               num_partitions: int = 10) -> DataFrame:
+    """Read a MySQL query over JDBC, split into range partitions on `partition_column`."""
+    def reader(sql: str):
+        return (
+            spark.read.format("jdbc")
+            .option("url", MYSQL_JDBC_URL)
+            .option("driver", MYSQL_JDBC_DRIVER)
+            .option("user", MYSQL_USER)
+            .option("password", MYSQL_PASSWORD)
+            .option("dbtable", f"({sql}) AS src")
+            .option("fetchsize", "10000")
+        )
+
+    if partition_column is None:
+        return reader(query).load()
+
+    bounds = reader(
+        f"SELECT MIN({partition_column}) AS lo, MAX({partition_column}) AS hi FROM ({query}) AS b"
+    ).load().first()
+    if bounds is None or bounds["lo"] is None:
+        return reader(query).load()
+    return (
+        reader(query)
+        .option("partitionColumn", partition_column)
+        .option("lowerBound", str(bounds["lo"]))
+        .option("upperBound", str(bounds["hi"]))
+        .option("numPartitions", str(num_partitions))
+        .load()
+    )
+
+
+def mysql_execute(spark: SparkSession, *statements: str):
+    """Run DDL/DML statements on MySQL through the JDBC driver on Spark's classpath."""
+    jvm = spark.sparkContext._gateway.jvm
+    # Load through the context class loader: jars from spark.jars.packages
+    # are not visible to java.sql.DriverManager
+    driver = jvm.java.lang.Thread.currentThread().getContextClassLoader().loadClass(MYSQL_JDBC_DRIVER).newInstance()
+    props = jvm.java.util.Properties()
+    props.setProperty("user", MYSQL_USER)
+    props.setProperty("password", MYSQL_PASSWORD)
+    conn = driver.connect(MYSQL_JDBC_URL, props)
+    try:
+        stmt = conn.createStatement()
+        for sql in statements:
+            stmt.execute(sql)
+        stmt.close()
+    finally:
+        conn.close()
+
+
+def content_features(content: DataFrame) -> np.ndarray:
     """
-    
-    client.command(query)
-    print(f"User activity aggregated for {date}")
+    Content feature matrix (items x features, float32) in catalog order (`pos`).
+
+    Same features as analytics/ml/features.py: sorted genre multi-hot,
+    then MinMax-scaled emotional_cloud and perception_map keys (missing or
+    invalid JSON -> 0), built with Spark SQL and collected to the driver.
+    """
+    tokens = F.when(
+        F.col("genre").isNull() | (F.col("genre") == ""), F.array().cast("array<string>")
+    ).otherwise(F.transform(F.split("genre", ","), lambda g: F.trim(g)))
+    content = content.withColumn("genre_tokens", tokens)
+
+    labels = sorted(
+        row["label"] for row in
+        content.select(F.explode("genre_tokens").alias("label")).distinct().collect()
+    )
+
+    json_map = MapType(StringType(), DoubleType())
+    numeric = []
+    for column, keys in (("emotional_cloud", EMOTION_KEYS), ("perception_map", PERCEPTION_KEYS)):
+        parsed = F.from_json(F.col(column), json_map)
+        for key in keys:
+            name = f"{column}__{key}"
+            content = content.withColumn(name, F.coalesce(parsed[key], F.lit(0.0)))
+            numeric.append(name)
+
+    # MinMax scaling: (x - min) / (max - min), constant columns become 0
+    stats = content.agg(
+        *[F.min(c).alias(f"min_{i}") for i, c in enumerate(numeric)],
+        *[F.max(c).alias(f"max_{i}") for i, c in enumerate(numeric)],
+    ).first()
+    scaled = []
+    for i, c in enumerate(numeric):
+        lo, hi = stats[f"min_{i}"], stats[f"max_{i}"]
+        span = (hi - lo) if hi is not None and hi > lo else 1.0
+        scaled.append(((F.col(c) - F.lit(lo or 0.0)) / F.lit(span)).alias(f"f{len(labels) + i}"))
+
+    genre_columns = [
+        F.array_contains("genre_tokens", label).cast("double").alias(f"f{i}")
+        for i, label in enumerate(labels)
+    ]
+    pdf = content.select("pos", *genre_columns, *scaled).orderBy("pos").toPandas()
+    return pdf.drop(columns="pos").to_numpy(dtype=np.float32).reshape(len(pdf), len(labels) + len(numeric))
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize rows; all-zero rows stay zero."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+def collaborative_similarity(ratings: DataFrame) -> DataFrame:
+    """
+    Item-item cosine over co-rated pairs: (item, neighbor, collab).
+
+    `ratings` is (user_id, pos, rating) with one mean rating per user and
+    item, the item-user matrix of the single-node recommender. Only pairs
+    with a common rater are produced, through a self-join on user_id.
+    """
+    norms = ratings.groupBy("pos").agg(F.sqrt(F.sum(F.col("rating") * F.col("rating"))).alias("norm"))
+    a = ratings.select("user_id", F.col("pos").alias("item"), F.col("rating").alias("ra"))
+    b = ratings.select("user_id", F.col("pos").alias("neighbor"), F.col("rating").alias("rb"))
+    dots = (
+        a.join(b, "user_id")
+        .where(F.col("item") != F.col("neighbor"))
+        .groupBy("item", "neighbor")
+        .agg(F.sum(F.col("ra") * F.col("rb")).alias("dot"))
+    )
+    return (
+        dots
+        .join(norms.select(F.col("pos").alias("item"), F.col("norm").alias("norm_a")), "item")
+        .join(norms.select(F.col("pos").alias("neighbor"), F.col("norm").alias("norm_b")), "neighbor")
+        .select("item", "neighbor", (F.col("dot") / (F.col("norm_a") * F.col("norm_b"))).alias("collab"))
+        .where(F.col("collab") > 0)
+    )
+
+
+def hybrid_neighbors(spark: SparkSession, features: np.ndarray, collab: Optional[DataFrame],
+                     alpha: float) -> DataFrame:
+    """
+    Top-K hybrid neighbors per item: (item, neighbor, sim) with sim > floor.
+    With RECS_NEIGHBORS_K=0 every neighbor above the floor is kept, which
+    scores exactly like the full items x items matrix.
+
+    hybrid = alpha * collab + (1 - alpha) * content, self excluded. Items are
+    split into blocks of RECS_TILE_ROWS; each block's content tile is
+    computed on an executor from the broadcast normalized features and the
+    block's co-rated pairs are added before the top-K cut.
+    """
+    n_items = features.shape[0]
+    n_blocks = (n_items + RECS_TILE_ROWS - 1) // RECS_TILE_ROWS
+    content_bc = spark.sparkContext.broadcast(normalize_rows(features))
+    k, floor, tile_rows = RECS_NEIGHBORS_K or n_items - 1, RECS_SIM_FLOOR, RECS_TILE_ROWS
+
+    # One marker row per block, so blocks without co-rated pairs still run
+    pairs = spark.range(n_blocks).select(
+        F.col("id").cast("int").alias("block"),
+        F.lit(-1).alias("item"),
+        F.lit(-1).alias("neighbor"),
+        F.lit(0.0).alias("collab"),
+    )
+    if collab is not None and alpha:
+        pairs = pairs.unionByName(
+            collab.select(
+                (F.col("item") / F.lit(tile_rows)).cast("int").alias("block"),
+                "item", "neighbor", "collab",
+            )
+        )
+
+    def top_k_block(pdf: pd.DataFrame) -> pd.DataFrame:
+        content = content_bc.value
+        start = int(pdf["block"].iloc[0]) * tile_rows
+        stop = min(start + tile_rows, n_items)
+        tile = content[start:stop] @ content.T
+        tile *= (1 - alpha)
+        co_rated = pdf[pdf["item"] >= 0]
+        if len(co_rated):
+            tile[co_rated["item"].to_numpy() - start, co_rated["neighbor"].to_numpy()] += (
+                alpha * co_rated["collab"].to_numpy(dtype=np.float32)
+            )
+        rows = np.arange(stop - start)
+        tile[rows, start + rows] = -np.inf
+
+        k_eff = min(k, n_items - 1)
+        if k_eff <= 0:
+            return pd.DataFrame({
+                "item": np.empty(0, np.int32), "neighbor": np.empty(0, np.int32), "sim": np.empty(0),
+            })
+        part = np.argpartition(-tile, k_eff - 1, axis=1)[:, :k_eff]
+        sims = np.take_along_axis(tile, part, axis=1)
+        keep = sims > floor
+        return pd.DataFrame({
+            "item": np.broadcast_to((start + rows)[:, None], part.shape)[keep],
+            "neighbor": part[keep],
+            "sim": sims[keep].astype(np.float64),
+        })
+
+    return (
+        pairs.repartition(min(n_blocks, 1000) or 1, "block")
+        .groupBy("block")
+        .applyInPandas(top_k_block, schema="item int, neighbor int, sim double")
+    )
+
+
+def user_buckets(spark: SparkSession, users: DataFrame) -> int:
+    """Hash buckets for user scoring: RECS_USER_BUCKETS, else sized to the cluster and user count."""
+    if RECS_USER_BUCKETS > 0:
+        return RECS_USER_BUCKETS
+    n_users = users.count()
+    buckets = max(spark.sparkContext.defaultParallelism, -(-n_users // RECS_BUCKET_USERS))
+    return max(1, min(buckets, n_users))
+
+
+def score_users(spark: SparkSession, ratings: DataFrame, users: DataFrame, neighbors: DataFrame,
+                n_items: int) -> DataFrame:
+    """
+    Top-N (user_id, pos, score) per user, ranked like the single-node recommender.
+
+    score(i) = sum(sim(j, i) * r_j) / sum(sim(j, i)) over the user's rated
+    items j that list i as a neighbor, rounded (half-even) to
+    RECS_SCORE_DECIMALS. Contributions are summed with a distributed join;
+    each hash bucket of users is then ranked in one pandas batch: rated
+    items excluded, score desc then catalog position, and users with fewer
+    than N positive scores filled with the lowest-position unrated items at 0.
+    """
+    top_n = RECS_TOP_N
+    candidates = (
+        ratings.alias("r")
+        .join(neighbors.alias("n"), F.col("r.pos") == F.col("n.item"))
+        .groupBy(F.col("r.user_id").alias("user_id"), F.col("n.neighbor").alias("pos"))
+        .agg(
+            F.sum(F.col("n.sim") * F.col("r.rating")).alias("weighted"),
+            F.sum("n.sim").alias("sim_sum"),
+        )
+        .select(
+            "user_id", "pos",
+            F.bround(F.col("weighted") / F.col("sim_sum"), RECS_SCORE_DECIMALS).alias("score"),
+            F.lit("candidate").alias("kind"),
+        )
+    )
+    rows = (
+        candidates
+        .unionByName(ratings.select("user_id", "pos", F.lit(None).cast("double").alias("score"), F.lit("rated").alias("kind")))
+        .unionByName(users.select("user_id", F.lit(-1).alias("pos"), F.lit(None).cast("double").alias("score"), F.lit("user").alias("kind")))
+        .withColumn("bucket", F.pmod(F.hash("user_id"), F.lit(user_buckets(spark, users))))
+    )
+
+    def rank_bucket(pdf: pd.DataFrame) -> pd.DataFrame:
+        rated = pdf.loc[pdf["kind"] == "rated", ["user_id", "pos"]]
+        cands = pdf.loc[pdf["kind"] == "candidate", ["user_id", "pos", "score"]]
+        cands = cands.merge(rated.assign(is_rated=True), on=["user_id", "pos"], how="left")
+        cands = cands[cands["is_rated"].isna() & (cands["score"] > 0)]
+        cands = cands.sort_values(["user_id", "score", "pos"], ascending=[True, False, True], kind="stable")
+        top = cands[cands.groupby("user_id").cumcount() < top_n][["user_id", "pos", "score"]]
+
+        # Rated and already chosen items per user, and how many 0-score fills are needed
+        counts = (
+            pd.DataFrame({"user_id": pdf["user_id"].unique()})
+            .merge(rated.groupby("user_id").size().rename("n_rated").reset_index(), on="user_id", how="left")
+            .merge(top.groupby("user_id").size().rename("chosen").reset_index(), on="user_id", how="left")
+            .fillna({"n_rated": 0, "chosen": 0})
+        )
+        counts["need"] = np.minimum(top_n, n_items - counts["n_rated"]) - counts["chosen"]
+        counts = counts[counts["need"] > 0]
+        if counts.empty:
+            return top
+
+        # The first `need` positions outside rated + chosen lie within need + |excluded|
+        span = (counts["need"] + counts["n_rated"] + counts["chosen"]).to_numpy(dtype=np.int64)
+        starts = np.repeat(np.cumsum(span) - span, span)
+        grid = pd.DataFrame({
+            "user_id": np.repeat(counts["user_id"].to_numpy(), span),
+            "pos": np.arange(span.sum()) - starts,
+            "need": np.repeat(counts["need"].to_numpy(dtype=np.int64), span),
+        })
+        excluded = pd.concat([rated, top[["user_id", "pos"]]]).drop_duplicates()
+        grid = grid.merge(excluded.assign(taken=True), on=["user_id", "pos"], how="left")
+        grid = grid[grid["taken"].isna()]
+        fills = grid[grid.groupby("user_id").cumcount() < grid["need"]][["user_id", "pos"]].assign(score=0.0)
+
+        return pd.concat([top, fills], ignore_index=True)
+
+    return rows.groupBy("bucket").applyInPandas(rank_bucket, schema="user_id int, pos int, score double")
+
+
+def write_recommendations_jdbc(spark: SparkSession, recs: DataFrame) -> int:
+    """
+    Bulk-load recommendations into a staging table over JDBC, then swap it in.
+
+    The staging table gets the canonical schema (AUTO_INCREMENT id, index,
+    foreign keys); executors append to it in parallel batched INSERTs and a
+    single RENAME TABLE replaces the live table atomically.
+    """
+    mysql_execute(
+        spark,
+        f"DROP TABLE IF EXISTS {RECS_STAGING_TABLE}",
+        RECS_MYSQL_DDL.format(table=RECS_STAGING_TABLE),
+    )
+    recs = recs.persist()
+    n_rows = recs.count()
+    (
+        recs.repartition(RECS_WRITE_PARTITIONS)
+        .write.format("jdbc")
+        .option("url", MYSQL_JDBC_URL)
+        .option("driver", MYSQL_JDBC_DRIVER)
+        .option("user", MYSQL_USER)
+        .option("password", MYSQL_PASSWORD)
+        .option("dbtable", RECS_STAGING_TABLE)
+        .option("batchsize", str(RECS_JDBC_BATCH_SIZE))
+        # Ids come from the snapshot just scored; skip per-row FK lookups
+        .option("sessionInitStatement", "SET foreign_key_checks = 0")
+        .mode("append")
+        .save()
+    )
+    recs.unpersist()
+    mysql_execute(
+        spark,
+        RECS_MYSQL_DDL.format(table=RECS_TABLE),
+        f"DROP TABLE IF EXISTS {RECS_OLD_TABLE}",
+        f"RENAME TABLE {RECS_TABLE} TO {RECS_OLD_TABLE}, {RECS_STAGING_TABLE} TO {RECS_TABLE}",
+        f"DROP TABLE IF EXISTS {RECS_OLD_TABLE}",
+    )
+    return n_rows
+
+
+def batch_recommendations(spark: SparkSession):
+    """
+    Distributed version of analytics/ml/recommender.py (full run).
+
+    Hybrid top-K item neighbors (0.7 collaborative + 0.3 content cosine,
+    0.0 / 1.0 without reviews) and the top-20 per user, written to MySQL
+    `recommendations` via a staging table. Produces the same top-20 as the
+    single-node trainer with the same RECS_NEIGHBORS_K (exact mode with the
+    default 0), up to float rounding of tied scores. Runs on local[*] as well as
+    on the cluster; work spreads over item blocks and user buckets.
+    """
+    started = datetime.now()
+    print(f"[{started}] Loading content and reviews from MySQL")
+
+    content = read_mysql(spark, "SELECT id, genre, emotional_cloud, perception_map FROM content", "id")
+    # Catalog order = content id order; ties between equal scores go to the lower position
+    positions = content.select(
+        F.col("id").alias("content_id"),
+        (F.row_number().over(Window.orderBy("id")) - 1).cast("int").alias("pos"),
+    ).persist()
+    content = content.join(positions.withColumnRenamed("content_id", "id"), "id")
+    n_items = positions.count()
+    if n_items == 0:
+        print("No content found. Exiting.")
+        return
+
+    reviews = read_mysql(
+        spark,
+        "SELECT id, user_id, content_id, rating FROM reviews WHERE rating IS NOT NULL",
+        "id",
+    ).withColumn("rating", F.col("rating").cast("double"))
+    users = reviews.select("user_id").distinct().persist()
+    known = reviews.join(positions, "content_id")
+
+    # Last rating wins per (user, item), as in the single-node rating matrix
+    latest = Window.partitionBy("user_id", "pos").orderBy(F.col("id").desc())
+    ratings = (
+        known.withColumn("rn", F.row_number().over(latest))
+        .where(F.col("rn") == 1)
+        .select("user_id", "pos", "rating")
+        .persist()
+    )
+    # Duplicate ratings are averaged in the item-user matrix
+    item_user = known.groupBy("user_id", "pos").agg(F.avg("rating").alias("rating"))
+
+    has_reviews = ratings.limit(1).count() > 0
+    alpha = RECS_ALPHA if has_reviews else 0.0
+
+    features = content_features(content)
+    print(f"[{datetime.now()}] {n_items} items, {features.shape[1]} content features, alpha={alpha}")
+
+    collab = collaborative_similarity(item_user) if has_reviews else None
+    neighbors = hybrid_neighbors(spark, features, collab, alpha).persist()
+    kept = f"top-{RECS_NEIGHBORS_K}" if RECS_NEIGHBORS_K else f"all above {RECS_SIM_FLOOR}"
+    print(f"[{datetime.now()}] {neighbors.count()} neighbor pairs ({kept} per item)")
+
+    if not has_reviews:
+        print("No reviews yet. Nothing to score.")
+        return
+
+    recs = (
+        score_users(spark, ratings, users, neighbors, n_items)
+        .join(positions, "pos")
+        .select(
+            "user_id", "content_id",
+            F.col("score").cast("float").alias("score"),
+            F.lit(RECS_REASON).alias("reason"),
+        )
+    )
+    n_rows = write_recommendations_jdbc(spark, recs)
+    elapsed = (datetime.now() - started).total_seconds()
+    print(f"[{datetime.now()}] Wrote {n_rows} recommendations in {elapsed:.1f}s")
 
 
 # ==================== CLI ====================
 
+def iso_date(value: str) -> str:
+    """argparse type for YYYY-MM-DD dates, normalized (zero-padded) for string comparisons."""
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date {value!r}, expected YYYY-MM-DD")
+
+
 def parse_args():
     parser = argparse.ArgumentParser(description="CineVibe Analytics PySpark Jobs")
     parser.add_argument(
@@ -463,28 +1800,80 @@ def parse_args():
             "stream-reviews",
             "stream-users", 
             "stream-content",
+            "stream-rollups",
             "batch-daily-content",
             "batch-hourly-activity",
             "batch-user-activity",
             "batch-all",
+            "batch-popularity",
+            "migrate-daily-states",
+            "batch-recommendations",
         ],
         default="stream-all",
         help="Job to run"
     )
-    parser.add_argument("--date", help="Date for batch jobs (YYYY-MM-DD)")
-    parser.add_argument("--hours", type=int, default=24, help="Hours back for hourly aggregation")
-    return parser.parse_args()
+    parser.add_argument("--date", type=iso_date, help="Date for batch jobs (YYYY-MM-DD); default: closed days since the last run")
+    parser.add_argument("--from", dest="date_from", type=iso_date, help="Backfill batch jobs from this date (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", type=iso_date, help="Last backfill date, inclusive (default: --from)")
+    parser.add_argument("--workers", type=int, default=BATCH_CONCURRENCY,
+                        help="Days/chunks a backfill runs against ClickHouse at once")
+    parser.add_argument("--hours", type=int, default=24, help="Hours back for the first hourly aggregation run")
+    parser.add_argument(
+        "--multiplex",
+        action="store_true",
+        help="stream-all: one query for all topics instead of one per topic",
+    )
+    parser.add_argument(
+        "--rollups",
+        action="store_true",
+        help="stream-all: also keep the hourly/daily rollup tables up to date in-stream",
+    )
+    parser.add_argument("--trigger", default=STREAM_TRIGGER_INTERVAL,
+                        help="Streaming trigger interval, e.g. '10 seconds' (default: back-to-back)")
+    parser.add_argument("--max-offsets", type=int, default=STREAM_MAX_OFFSETS_PER_TRIGGER,
+                        help="Max Kafka offsets per micro-batch (0 = unbounded)")
+    parser.add_argument("--min-offsets", type=int, default=STREAM_MIN_OFFSETS_PER_TRIGGER,
+                        help="Min Kafka offsets per micro-batch, waited for up to STREAM_MAX_TRIGGER_DELAY")
+    parser.add_argument("--adaptive", action="store_true", default=CLICKHOUSE_ADAPTIVE_INSERTS,
+                        help="Adapt insert block size to CLICKHOUSE_TARGET_INSERT_MS / CLICKHOUSE_TARGET_PART_ROWS")
+    args = parser.parse_args()
+    if args.date_to and not args.date_from:
+        parser.error("--to needs --from")
+    if args.date_from and args.date:
+        parser.error("use either --date or --from/--to")
+    if args.date_from and args.date_to and args.date_to < args.date_from:
+        parser.error(f"--to {args.date_to} is earlier than --from {args.date_from}")
+    return args
+
+
+# Jobs that run on Spark; the batch aggregations are ClickHouse queries only
+SPARK_JOBS = {"stream-all", "stream-reviews", "stream-users", "stream-content", "stream-rollups", "batch-recommendations"}
 
 
 def main():
+    global STREAM_TRIGGER_INTERVAL, STREAM_MAX_OFFSETS_PER_TRIGGER, STREAM_MIN_OFFSETS_PER_TRIGGER
+    global CLICKHOUSE_ADAPTIVE_INSERTS, BATCH_CONCURRENCY
     args = parse_args()
-    spark = build_spark(f"CineVibe_{args.job}")
+    BATCH_CONCURRENCY = args.workers
+    STREAM_TRIGGER_INTERVAL = args.trigger
+    STREAM_MAX_OFFSETS_PER_TRIGGER = args.max_offsets
+    STREAM_MIN_OFFSETS_PER_TRIGGER = args.min_offsets
+    CLICKHOUSE_ADAPTIVE_INSERTS = args.adaptive
+    packages = [MYSQL_JDBC_PACKAGE] if args.job == "batch-recommendations" else None
+    spark = build_spark(f"CineVibe_{args.job}", packages) if args.job in SPARK_JOBS else None
+    date = args.date_from or args.date
+    date_to = args.date_to or date
     
     try:
         if args.job == "stream-all":
-            q1 = stream_reviews_to_clickhouse(spark)
-            q2 = stream_users_to_clickhouse(spark)
-            q3 = stream_content_to_clickhouse(spark)
+            if args.multiplex:
+                stream_all_to_clickhouse(spark)
+            else:
+                stream_reviews_to_clickhouse(spark)
+                stream_users_to_clickhouse(spark)
+                stream_content_to_clickhouse(spark)
+            if args.rollups:
+                stream_rollups_to_clickhouse(spark)
             print("All streams started. Waiting for termination...")
             spark.streams.awaitAnyTermination()
             
@@ -500,23 +1889,38 @@ def main():
             query = stream_content_to_clickhouse(spark)
             query.awaitTermination()
             
+        elif args.job == "stream-rollups":
+            query = stream_rollups_to_clickhouse(spark)
+            query.awaitTermination()
+            
         elif args.job == "batch-daily-content":
-            aggregate_daily_content_stats(spark, args.date)
+            aggregate_daily_content_stats(spark, date, date_to)
             
         elif args.job == "batch-hourly-activity":
-            aggregate_hourly_activity(spark, args.hours)
+            aggregate_hourly_activity(spark, args.hours, date, date_to)
             
         elif args.job == "batch-user-activity":
-            aggregate_user_activity(spark, args.date)
+            aggregate_user_activity(spark, date, date_to)
             
         elif args.job == "batch-all":
-            aggregate_daily_content_stats(spark, args.date)
-            aggregate_hourly_activity(spark, args.hours)
-            aggregate_user_activity(spark, args.date)
+            aggregate_daily_content_stats(spark, date, date_to)
+            aggregate_hourly_activity(spark, args.hours, date, date_to)
+            aggregate_user_activity(spark, date, date_to)
+            compute_content_popularity(spark, date, date_to)
             print("All batch aggregations complete")
             
+        elif args.job == "batch-popularity":
+            compute_content_popularity(spark, date, date_to)
+            
+        elif args.job == "migrate-daily-states":
+            backfill_daily_states(spark, date, date_to)
+            
+        elif args.job == "batch-recommendations":
+            batch_recommendations(spark)
+            
     finally:
-        spark.stop()
+        if spark is not None:
+            spark.stop()
 
 
 if __name__ == "__main__":
@@ -1,17 +1,19 @@
 import argparse
 import json
 import os
+import time
 from typing import Any, Dict
 
 from pyspark.sql import SparkSession
 from pyspark.sql import functions as F
 from pyspark.sql.types import StructType, StructField, StringType, IntegerType, DoubleType, MapType
 
+# The analytics jobs' pooled, fork-safe client (CLICKHOUSE_HOST/PORT/POOL_SIZE)
+from analytics_jobs import get_clickhouse_client
+
 # Minimal PySpark job: Kafka -> parse JSON -> write batches to ClickHouse via HTTP driver
 # Assumes Kafka on localhost:9092 and ClickHouse on localhost:8123
 
-CLICKHOUSE_HOST = os.environ.get("CLICKHOUSE_HOST", "localhost")
-CLICKHOUSE_PORT = int(os.environ.get("CLICKHOUSE_PORT", "8123"))
 CLICKHOUSE_DB = os.environ.get("CLICKHOUSE_DB", "analytics")
 CLICKHOUSE_TABLE = os.environ.get("CLICKHOUSE_TABLE", "reviews_events")
 
@@ -34,14 +36,7 @@ def parse_args():
     return p.parse_args()
 
 
-def to_clickhouse(df, epoch_id: int):
-    import clickhouse_connect
-
-    if df.rdd.isEmpty():
-        return
-
-    pdf = df.toPandas()
-    client = clickhouse_connect.get_client(host=CLICKHOUSE_HOST, port=CLICKHOUSE_PORT)
+def ensure_table(client):
     client.command(f"CREATE DATABASE IF NOT EXISTS {CLICKHOUSE_DB}")
     client.command(f"""
         CREATE TABLE IF NOT EXISTS {CLICKHOUSE_DB}.{CLICKHOUSE_TABLE} (
@@ -58,13 +53,27 @@ def to_clickhouse(df, epoch_id: int):
         ORDER BY (content_id, event_time)
     """)
 
+
+def to_clickhouse(df, epoch_id: int):
+    # The table is created once in main(), before the stream starts
+    if df.rdd.isEmpty():
+        return
+
+    started = time.perf_counter()
+    pdf = df.toPandas()
+    collected = time.perf_counter()
+
     # Insert as DataFrame (clickhouse-connect supports insert_df)
-    client.insert_df(f"{CLICKHOUSE_DB}.{CLICKHOUSE_TABLE}", pdf)
+    get_clickhouse_client().insert_df(f"{CLICKHOUSE_DB}.{CLICKHOUSE_TABLE}", pdf)
+    inserted = time.perf_counter()
+    print(f"batch {epoch_id}: {len(pdf)} rows, collect {(collected - started) * 1000:.0f} ms, "
+          f"insert {(inserted - collected) * 1000:.0f} ms")
 
 
 def main():
     args = parse_args()
     spark = build_spark()
+    ensure_table(get_clickhouse_client())
 
     # Schema for JSON payload inside Kafka value
     json_schema = StructType([
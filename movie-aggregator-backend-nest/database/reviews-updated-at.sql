@@ -0,0 +1,19 @@
+-- =============================================
+-- reviews.updated_at: change watermark for incremental recommender runs
+-- (analytics/ml/recommender.py picks up reviews changed since the last run)
+-- =============================================
+
+SET @c := (SELECT COUNT(*) FROM information_schema.columns
+           WHERE table_schema = DATABASE() AND table_name='reviews' AND column_name='updated_at');
+SET @s := IF(@c = 0, 'ALTER TABLE reviews ADD COLUMN updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP', 'SELECT "column exists"');
+PREPARE stmt FROM @s; EXECUTE stmt; DEALLOCATE PREPARE stmt;
+
+-- Existing rows: treat creation time as the last change
+UPDATE reviews SET updated_at = created_at WHERE created_at IS NOT NULL AND updated_at > created_at;
+
+SET @c := (SELECT COUNT(*) FROM information_schema.statistics
+           WHERE table_schema = DATABASE() AND table_name='reviews' AND index_name='idx_reviews_updated');
+SET @s := IF(@c = 0, 'CREATE INDEX idx_reviews_updated ON reviews (updated_at)', 'SELECT "index exists"');
+PREPARE stmt FROM @s; EXECUTE stmt; DEALLOCATE PREPARE stmt;
+
+SELECT 'reviews.updated_at ready' AS status;
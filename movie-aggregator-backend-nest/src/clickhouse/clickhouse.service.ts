@@ -165,18 +165,21 @@ export class ClickHouseService implements OnModuleInit, OnModuleDestroy {
         `,
       });
 
-      // Content popularity aggregation table
+      // Content popularity (rolling 7 days), filled by the analytics batch-popularity job
+      await this.retireLegacyPopularity(this.client);
       await this.client.command({
         query: `
           CREATE TABLE IF NOT EXISTS ${this.database}.content_popularity (
             date           Date,
             content_id     UInt32,
             content_type   LowCardinality(String),
-            views_count    UInt64,
-            reviews_count  UInt64,
-            avg_rating     Float64,
-            trend_score    Float64
-          ) ENGINE = SummingMergeTree()
+            popularity_score Float64,
+            views_7d       UInt64,
+            reviews_7d     UInt64,
+            avg_rating_7d  Float64,
+            rating_sum_7d  Float64 DEFAULT 0,
+            rating_count_7d UInt64 DEFAULT 0
+          ) ENGINE = ReplacingMergeTree()
           PARTITION BY toYYYYMM(date)
           ORDER BY (date, content_id)
         `,
@@ -188,6 +191,33 @@ export class ClickHouseService implements OnModuleInit, OnModuleDestroy {
     }
   }
 
+  /**
+   * Earlier versions created content_popularity as a SummingMergeTree of
+   * views_count/trend_score; CREATE TABLE IF NOT EXISTS keeps that table and
+   * the batch-popularity job cannot write to it. Move it aside (rows are kept
+   * in content_popularity_legacy_<timestamp>) so the current one is created.
+   */
+  private async retireLegacyPopularity(client: ClickHouseClient) {
+    const result = await client.query({
+      query: `
+        SELECT count() > 0 AND countIf(name = 'popularity_score') = 0 AS legacy
+        FROM system.columns
+        WHERE database = {database:String} AND table = 'content_popularity'
+      `,
+      query_params: { database: this.database },
+      format: 'JSONEachRow',
+    });
+    const rows: any[] = await result.json();
+    if (!Number(rows[0]?.legacy)) return;
+
+    const stamp = new Date().toISOString().replace(/\D/g, '').slice(0, 14);
+    const backup = `content_popularity_legacy_${stamp}`;
+    await client.command({
+      query: `RENAME TABLE ${this.database}.content_popularity TO ${this.database}.${backup}`,
+    });
+    this.logger.warn(`content_popularity had the old layout; moved it to ${this.database}.${backup}`);
+  }
+
   // ==================== Query Methods ====================
 
   async getReviewsAggregation(contentId: number): Promise<ReviewsAggregation | null> {
@@ -290,6 +320,11 @@ export class ClickHouseService implements OnModuleInit, OnModuleDestroy {
         typeFilter = `AND content_type = '${contentType}'`;
       }
 
+      if (days === 7) {
+        const precomputed = await this.getPrecomputedTopContent(typeFilter, limit);
+        if (precomputed.length > 0) return precomputed;
+      }
+
       const result = await this.client.query({
         query: `
           SELECT 
@@ -330,6 +365,41 @@ export class ClickHouseService implements OnModuleInit, OnModuleDestroy {
     }
   }
 
+  /**
+   * Trending list from content_popularity (latest computed day), so the
+   * common 7-day case skips the live aggregation over raw events.
+   */
+  private async getPrecomputedTopContent(typeFilter: string, limit: number): Promise<ContentPopularity[]> {
+    if (!this.client) return [];
+
+    const result = await this.client.query({
+      query: `
+        SELECT
+          content_id,
+          content_type,
+          views_7d,
+          reviews_7d,
+          avg_rating_7d,
+          popularity_score
+        FROM ${this.database}.content_popularity FINAL
+        WHERE date = (SELECT max(date) FROM ${this.database}.content_popularity) ${typeFilter}
+        ORDER BY popularity_score DESC, content_id
+        LIMIT ${limit}
+      `,
+      format: 'JSONEachRow',
+    });
+
+    const rows: any[] = await result.json();
+    return rows.map((r: any) => ({
+      content_id: r.content_id,
+      content_type: r.content_type,
+      views_count: Number(r.views_7d),
+      reviews_count: Number(r.reviews_7d),
+      avg_rating: Number(r.avg_rating_7d) || 0,
+      trend_score: Number(r.popularity_score),
+    }));
+  }
+
   async getUserActivity(userId: number): Promise<UserActivity | null> {
     if (!this.isConnected || !this.client) return null;
 
@@ -1,11 +1,17 @@
 import { Module } from '@nestjs/common';
+import { HttpModule } from '@nestjs/axios';
 import { TypeOrmModule } from '@nestjs/typeorm';
 import { RecommendationsService } from './recommendations.service';
 import { RecommendationsController } from './recommendations.controller';
 import { Recommendation } from './entities/recommendation.entity';
+import { Review } from '../reviews/entities/review.entity';
+import { Content } from '../content/entities/content.entity';
 
 @Module({
-  imports: [TypeOrmModule.forFeature([Recommendation])],
+  imports: [
+    HttpModule.register({ timeout: 2000 }),
+    TypeOrmModule.forFeature([Recommendation, Review, Content]),
+  ],
   controllers: [RecommendationsController],
   providers: [RecommendationsService],
   exports: [RecommendationsService],
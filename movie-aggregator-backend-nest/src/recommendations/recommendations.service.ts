@@ -1,26 +1,90 @@
 import { Injectable, Logger } from '@nestjs/common';
+import { ConfigService } from '@nestjs/config';
+import { HttpService } from '@nestjs/axios';
 import { InjectRepository } from '@nestjs/typeorm';
-import { Repository } from 'typeorm';
+import { In, IsNull, Not, Repository } from 'typeorm';
+import { firstValueFrom } from 'rxjs';
 import { Recommendation } from './entities/recommendation.entity';
+import { Review } from '../reviews/entities/review.entity';
+import { Content } from '../content/entities/content.entity';
 import { exec } from 'child_process';
 import * as path from 'path';
 
+interface ScoredItem {
+  content_id: number;
+  score: number;
+  reason: string;
+}
+
 @Injectable()
 export class RecommendationsService {
   private readonly logger = new Logger(RecommendationsService.name);
+  private readonly scorerUrl: string;
 
   constructor(
     @InjectRepository(Recommendation)
     private recommendationsRepository: Repository<Recommendation>,
-  ) {}
+    @InjectRepository(Review)
+    private reviewsRepository: Repository<Review>,
+    @InjectRepository(Content)
+    private contentRepository: Repository<Content>,
+    private readonly httpService: HttpService,
+    private readonly configService: ConfigService,
+  ) {
+    // analytics/ml/serving.py; empty disables on-demand scoring
+    this.scorerUrl = this.configService.get<string>('RECS_SCORER_URL', 'http://127.0.0.1:8765');
+  }
 
   async getRecommendationsForUser(userId: number, limit: number = 10) {
-    return this.recommendationsRepository.find({
+    const stored = await this.recommendationsRepository.find({
       where: { user_id: userId },
       relations: ['content'],
       order: { score: 'DESC' },
       take: limit,
     });
+    if (stored.length > 0 || !this.scorerUrl) {
+      return stored;
+    }
+    // Not in the nightly batch yet (new user): score the current reviews on demand
+    return (await this.scoreOnDemand(userId, limit)) ?? stored;
+  }
+
+  /**
+   * Top-N from the local scorer for the user's current ratings
+   * (trending content when there are none); null when the scorer is down.
+   */
+  private async scoreOnDemand(userId: number, limit: number): Promise<Partial<Recommendation>[] | null> {
+    const reviews = await this.reviewsRepository.find({
+      where: { user_id: userId, rating: Not(IsNull()) },
+      select: ['content_id', 'rating', 'updated_at'],
+      order: { updated_at: 'ASC' },
+    });
+
+    let items: ScoredItem[];
+    try {
+      const response = await firstValueFrom(
+        this.httpService.post<{ items: ScoredItem[] }>(`${this.scorerUrl}/recommend`, {
+          ratings: reviews.map((r) => [r.content_id, Number(r.rating)]),
+          limit,
+        }),
+      );
+      items = response.data.items;
+    } catch (error) {
+      this.logger.warn(`On-demand scorer unavailable: ${error.message}`);
+      return null;
+    }
+
+    const contents = await this.contentRepository.findBy({ id: In(items.map((i) => i.content_id)) });
+    const byId = new Map(contents.map((c) => [c.id, c]));
+    return items
+      .filter((i) => byId.has(i.content_id))
+      .map((i) => ({
+        user_id: userId,
+        content_id: i.content_id,
+        score: i.score,
+        reason: i.reason,
+        content: byId.get(i.content_id),
+      }));
   }
 
   async generateRecommendations() {
@@ -1,4 +1,4 @@
-import { Entity, Column, PrimaryGeneratedColumn, CreateDateColumn, ManyToOne, JoinColumn } from 'typeorm';
+import { Entity, Column, PrimaryGeneratedColumn, CreateDateColumn, UpdateDateColumn, ManyToOne, JoinColumn } from 'typeorm';
 import { Content } from '../../content/entities/content.entity';
 import { User } from '../../users/user.entity';
 
@@ -31,6 +31,9 @@ export class Review {
   @CreateDateColumn()
   created_at: Date;
 
+  @UpdateDateColumn()
+  updated_at: Date;
+
   @ManyToOne(() => Content)
   @JoinColumn({ name: 'content_id' })
   contentEntity: Content;
@@ -142,8 +142,10 @@ export class ReviewsService implements OnModuleInit {
         emotions JSON NULL,
         rating DECIMAL(3,1) NULL,
         created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
         INDEX idx_reviews_content (content_id),
-        INDEX idx_reviews_user (user_id)
+        INDEX idx_reviews_user (user_id),
+        INDEX idx_reviews_updated (updated_at)
       ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
     `;
     try {
@@ -170,6 +172,8 @@ export class ReviewsService implements OnModuleInit {
       await addIfMissing('emotions', 'emotions JSON NULL');
       await addIfMissing('rating', 'rating DECIMAL(3,1) NULL');
       await addIfMissing('created_at', 'created_at DATETIME DEFAULT CURRENT_TIMESTAMP');
+      // Change watermark for incremental recommender runs (analytics/ml/incremental.py)
+      await addIfMissing('updated_at', 'updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP');
     } catch (_) {
       // ignore DDL failures
     }